@@ -1,77 +1,141 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from dotenv import load_dotenv
+import click
+from sqlalchemy.engine import make_url
+import logging
 import os
+import sys
+import time
 from config import DevelopmentConfig, config  # Import the DevelopmentConfig and config dictionary
+from app.logging_setup import configure_logging
+from app.db_pool import InstrumentedQueuePool
+from app.db_sqlite import configure_sqlite
 
 load_dotenv()  # Load environment variables from .env file
 
 db = SQLAlchemy()
-migrate = Migrate()
+migrate = None
+logger = logging.getLogger(__name__)
+
+def _init_migrate(app):
+    """Register Flask-Migrate and its ``flask db`` commands.
+
+    Importing Flask-Migrate pulls in Alembic, which only the CLI needs and which is a
+    large share of a web worker's boot time, so it is loaded when the app is created
+    by the ``flask`` command (inside a click context) or when DB_MIGRATE_EAGER is set.
+    """
+    global migrate
+    if not app.config.get('DB_MIGRATE_EAGER') and click.get_current_context(silent=True) is None:
+        return
+    from flask_migrate import Migrate
+    if migrate is None:
+        migrate = Migrate()
+    migrate.init_app(app, db)
+
+def _log_diagnostics(app, config_class, env_config_name):
+    """Log configuration details and the URL map (STARTUP_DIAGNOSTICS only)."""
+    database_uri = app.config.get('SQLALCHEMY_DATABASE_URI')
+    logger.info('startup diagnostics', extra={
+        'flask_config': env_config_name,
+        'config_class': config_class.__name__,
+        'template_folder': app.template_folder,
+        'static_folder': app.static_folder,
+        'database_uri': make_url(database_uri).render_as_string(hide_password=True),
+        'engine_options': {key: str(value) for key, value in app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).items()},
+        'routes': sorted(f"{rule} -> {rule.endpoint}" for rule in app.url_map.iter_rules()),
+    })
 
 def create_app(config_class=DevelopmentConfig):
+    started = time.perf_counter()
+    phases = {}
+
+    def mark(phase):
+        nonlocal started
+        now = time.perf_counter()
+        phases[phase] = round((now - started) * 1000, 3)
+        started = now
+
     try:
         # Ensure config_class defaults to DevelopmentConfig if FLASK_CONFIG is not set
         env_config_name = os.getenv('FLASK_CONFIG', 'development')
-        print(f"Environment variable FLASK_CONFIG: {env_config_name}")
 
         # Update config_class to use the correct configuration from the config dictionary
         config_class = config.get(env_config_name, config_class)
-        print(f"Final config class being used: {config_class}")
 
         template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'templates'))
         static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'static'))
 
-        print(f"Template directory: {template_dir}")
-        print(f"Static directory: {static_dir}")
-
         app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
         app.config.from_object(config_class)
 
-        env = app.config.get('ENV', 'default')
-        print(f"Loaded configuration: {config_class}")
-        print(f"Environment: {env}")
-        print(f"Database URI: {app.config.get('SQLALCHEMY_DATABASE_URI')}")
-
         # Ensure SQLALCHEMY_DATABASE_URI is set
         if not app.config.get('SQLALCHEMY_DATABASE_URI'):
             raise RuntimeError("Either 'SQLALCHEMY_DATABASE_URI' or 'SQLALCHEMY_BINDS' must be set.")
 
-        db.init_app(app)
-        print("Database initialized.")
+        configure_logging(app)
+        mark('config')
 
+        engine_options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        if app.config.get('DB_POOL_STATS') and 'pool_size' in engine_options:
+            engine_options.setdefault('poolclass', InstrumentedQueuePool)
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+        db.init_app(app)
+        _init_migrate(app)
         with app.app_context():
-            try:
-                connection = db.engine.connect()
-                connection.close()
-                print("Database connection successful.")
-            except Exception as e:
-                print(f"Database connection failed: {e}")
-                print("Exiting application due to database connection failure.")
-                sys.exit(1)
-
-        migrate.init_app(app, db)
-        print("Migration initialized.")
+            configure_sqlite(app, db.engine)
+        from app.cache import init_cache
+        init_cache(app)
+        if app.config.get('CAPTURE_JOURNAL'):
+            from app.capture.journal import init_journal
+            # `flask db ...` must not start a flusher against a schema being migrated.
+            init_journal(app, start=click.get_current_context(silent=True) is None)
+        if app.config.get('CAPTURE_ARCHIVE_INTERVAL') and click.get_current_context(silent=True) is None:
+            from app.capture.archive import init_archiver
+            init_archiver(app)
+        if app.config.get('METRICS_ENABLED'):
+            from app.metrics import configure_metrics
+            configure_metrics(app)
+        mark('db_init')
+
+        if app.config.get('DB_STARTUP_CHECK'):
+            with app.app_context():
+                try:
+                    connection = db.engine.connect()
+                    connection.close()
+                except Exception:
+                    logger.critical('Database connection failed; exiting', exc_info=True)
+                    sys.exit(1)
+            mark('db_check')
 
         from .main import main as main_blueprint
         from .capture import capture as capture_blueprint
         from .projects import projects as projects_blueprint
         from .tasks import tasks as tasks_blueprint
-        print("Imported blueprints")
+        from .search import search as search_blueprint
+        from .sync import sync as sync_blueprint
+        from .agenda import agenda as agenda_blueprint
 
         app.register_blueprint(main_blueprint)
         app.register_blueprint(capture_blueprint, url_prefix='/capture')
         app.register_blueprint(projects_blueprint, url_prefix='/projects')
         app.register_blueprint(tasks_blueprint, url_prefix='/tasks')
-        print("Registered blueprints")
-
-        print("Registered routes:")
-        for rule in app.url_map.iter_rules():
-            print(f"{rule} -> {rule.endpoint}")
-
+        app.register_blueprint(search_blueprint, url_prefix='/search')
+        app.register_blueprint(sync_blueprint, url_prefix='/sync')
+        app.register_blueprint(agenda_blueprint, url_prefix='/agenda')
+        mark('blueprints')
+
+        if app.config.get('STARTUP_DIAGNOSTICS'):
+            _log_diagnostics(app, config_class, env_config_name)
+
+        logger.info('startup', extra={
+            'config_class': config_class.__name__,
+            'phases_ms': phases,
+            'total_ms': round(sum(phases.values()), 3),
+        })
         return app
 
-    except Exception as e:
-        print(f"Error during app initialization: {e}")
+    except Exception:
+        logger.exception('Error during app initialization')
         raise
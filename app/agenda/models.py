@@ -0,0 +1,13 @@
+from app import db
+
+class AgendaDay(db.Model):
+    """Open projects or tasks due on one day; rows are kept up to date by database
+    triggers (see migration f6c2a9e4b178), never by the app."""
+    __tablename__ = 'agenda_day'
+    kind = db.Column(db.String(16), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    # Days whose items were all closed or moved stay behind with a count of 0.
+    open_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AgendaDay {self.kind} {self.day} {self.open_count}>'
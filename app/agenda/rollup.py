@@ -0,0 +1,82 @@
+"""Due dates of open projects and tasks, and the per-day rollup that counts them.
+
+Items in a date range are read through the ``due_date`` indexes. Counts, including
+the overdue count that spans all history, come from ``agenda_day``, which holds one
+row per kind and day and is kept current by triggers on ``project`` and ``task``.
+``rebuild_rollup`` recomputes it from scratch.
+"""
+
+from datetime import timedelta
+
+from sqlalchemy import delete, func, insert, literal, or_, select
+
+from app import db
+from app.agenda.models import AgendaDay
+from app.projects.models import Project, Task, PROJECT_CLOSED_STATUSES
+
+# kind -> (model, JSON keys of an item, condition for an item still to be done)
+SOURCES = {
+    'project': (Project, ('id', 'name', 'status', 'due_date'),
+                or_(Project.status.is_(None), func.lower(Project.status).notin_(PROJECT_CLOSED_STATUSES))),
+    'task': (Task, ('id', 'content', 'project_id', 'status', 'priority', 'due_date'),
+             Task.status != 'done'),
+}
+KINDS = tuple(SOURCES)
+
+
+def due_items(kind, start, end):
+    """Open items of ``kind`` due between ``start`` and ``end`` inclusive, by due date."""
+    model, fields, is_open = SOURCES[kind]
+    return db.session.execute(
+        select(*(getattr(model, name) for name in fields))
+        .where(model.due_date.between(start, end), is_open)
+        .order_by(model.due_date, model.id)
+    ).all()
+
+
+def day_counts(kinds, start, end):
+    """``{day: {kind: count}}`` for the days between ``start`` and ``end`` with open items."""
+    rows = db.session.execute(
+        select(AgendaDay.day, AgendaDay.kind, AgendaDay.open_count)
+        .where(AgendaDay.kind.in_(kinds), AgendaDay.day.between(start, end), AgendaDay.open_count > 0)
+        .order_by(AgendaDay.day)
+    )
+    counts = {}
+    for day, kind, count in rows:
+        counts.setdefault(day, {})[kind] = count
+    return counts
+
+
+def due_counts(kinds, today, upcoming_days):
+    """Open items due before ``today`` and in the ``upcoming_days`` days from it, per kind."""
+    upcoming_end = today + timedelta(days=upcoming_days - 1)
+    overdue = func.sum(AgendaDay.open_count).filter(AgendaDay.day < today)
+    upcoming = func.sum(AgendaDay.open_count).filter(AgendaDay.day.between(today, upcoming_end))
+    rows = db.session.execute(
+        select(AgendaDay.kind, overdue, upcoming)
+        .where(AgendaDay.kind.in_(kinds), AgendaDay.day <= upcoming_end)
+        .group_by(AgendaDay.kind)
+    ).all()
+    found = {kind: (overdue or 0, upcoming or 0) for kind, overdue, upcoming in rows}
+    return {
+        'overdue': {kind: found.get(kind, (0, 0))[0] for kind in kinds},
+        'upcoming': {kind: found.get(kind, (0, 0))[1] for kind in kinds},
+    }
+
+
+def rebuild_rollup():
+    """Recompute ``agenda_day`` from the projects and tasks; returns the rows written."""
+    db.session.execute(delete(AgendaDay))
+    written = 0
+    for kind, (model, _, is_open) in SOURCES.items():
+        result = db.session.execute(
+            insert(AgendaDay).from_select(
+                ['kind', 'day', 'open_count'],
+                select(literal(kind, AgendaDay.kind.type), model.due_date, func.count())
+                .where(model.due_date.isnot(None), is_open)
+                .group_by(model.due_date),
+            )
+        )
+        written += result.rowcount
+    db.session.commit()
+    return written
@@ -0,0 +1,90 @@
+from flask import current_app, request, jsonify
+from app.agenda import agenda
+from app.agenda.rollup import KINDS, SOURCES, day_counts, due_counts, due_items, rebuild_rollup
+from app.serialization import json_response, row_dicts
+from datetime import date, timedelta
+import click
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _parse_date(name, default=None):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value!r} (expected YYYY-MM-DD)")
+
+def _parse_kinds():
+    kinds = tuple(kind for kind in request.args.get('kind', ','.join(KINDS)).split(',') if kind)
+    unknown = [kind for kind in kinds if kind not in KINDS]
+    if unknown or not kinds:
+        raise ValueError(f"Invalid kind: {', '.join(unknown)} (expected {', '.join(KINDS)})")
+    return kinds
+
+def _parse_range(max_days):
+    today = _parse_date('today', date.today())
+    start = _parse_date('from', today)
+    end = _parse_date('to', start + timedelta(days=current_app.config['AGENDA_DAYS'] - 1))
+    if end < start:
+        raise ValueError('to must not be before from')
+    if max_days and (end - start).days >= max_days:
+        raise ValueError(f'At most {max_days} days per request')
+    return today, start, end
+
+@agenda.route('/', methods=['GET'])
+@agenda.route('', methods=['GET'])
+def get_agenda():
+    """Open projects and tasks due between ``from`` and ``to``, bucketed by day.
+
+    The range defaults to ``AGENDA_DAYS`` days from ``today`` (the server's date unless
+    given) and may span at most ``AGENDA_MAX_DAYS`` days. Only days with items are
+    listed. ``counts`` holds the overdue items and those due in the
+    ``AGENDA_UPCOMING_DAYS`` days from ``today``, read from the per-day rollup.
+    ``kind`` narrows the result to ``project`` or ``task``.
+    """
+    config = current_app.config
+    try:
+        kinds = _parse_kinds()
+        today, start, end = _parse_range(config['AGENDA_MAX_DAYS'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    days = {}
+    for kind in kinds:
+        rows = due_items(kind, start, end)
+        for row, item in zip(rows, row_dicts(rows, SOURCES[kind][1])):
+            days.setdefault(row.due_date, {name: [] for name in kinds})[kind].append(item)
+    return json_response({
+        'from': start,
+        'to': end,
+        'today': today,
+        'counts': due_counts(kinds, today, config['AGENDA_UPCOMING_DAYS']),
+        'days': [{'date': day, **items} for day, items in sorted(days.items())],
+    })
+
+@agenda.route('/days', methods=['GET'])
+def get_agenda_days():
+    """Per-day counts of open projects and tasks due between ``from`` and ``to``.
+
+    Served from the rollup alone, so ranges of any length are allowed; days without
+    open items are left out.
+    """
+    try:
+        kinds = _parse_kinds()
+        _, start, end = _parse_range(None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    counts = day_counts(kinds, start, end)
+    return json_response([
+        {'date': day, **{kind: by_kind.get(kind, 0) for kind in kinds}} for day, by_kind in counts.items()
+    ])
+
+@agenda.cli.command('rebuild')
+def rebuild_command():
+    """Recompute the agenda's per-day rollup from projects and tasks."""
+    written = rebuild_rollup()
+    logger.info('Agenda rollup rebuilt', extra={'day_count': written})
+    click.echo(f'Wrote {written} agenda days.')
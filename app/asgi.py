@@ -0,0 +1,442 @@
+"""ASGI application: the capture JSON API on async handlers, everything else on Flask.
+
+``uvicorn asgi:app`` serves this instead of ``gunicorn wsgi:app``. Requests matched
+by ``app.capture.async_routes`` run as coroutines on one event loop, with database
+I/O through SQLAlchemy's asyncio extension (aiosqlite or asyncpg), so a worker can
+hold many of them while they wait on the database. Everything else, including the
+HTML pages, exports and event streams, is passed to the Flask app in a thread pool
+of ``ASGI_WSGI_THREADS`` threads. One thread produces the whole response, which is
+streamed back chunk by chunk, and the request body is streamed in the same way.
+
+Both halves share the models, the configuration and the SQLite connection profile;
+each has its own connection pool.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import io
+import json
+import logging
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import ClientDisconnected, RequestEntityTooLarge
+
+from app.db_sqlite import apply_sqlite_profile, sqlite_pragmas
+from app.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+_END = object()
+# Response chunks the WSGI thread may produce ahead of the client.
+WSGI_CHUNKS_AHEAD = 8
+# How often a WSGI thread waiting on the event loop checks whether it was abandoned.
+WSGI_STOP_POLL_SECONDS = 0.5
+
+
+def async_database_url(database_uri):
+    """Map a configured (sync) database URL to the async driver for its backend."""
+    url = make_url(database_uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver for {backend!r} databases (expected one of {', '.join(ASYNC_DRIVERS)})")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def async_engine_options(url, engine_options):
+    """Adapt SQLALCHEMY_ENGINE_OPTIONS to the async drivers.
+
+    aiosqlite defaults to opening a connection per checkout, so SQLite databases get a
+    queue pool like the sync engine has. The psycopg2 ``options`` string that sets the
+    statement timeout becomes asyncpg's ``server_settings``.
+    """
+    options = {key: value for key, value in engine_options.items() if key not in ('poolclass', 'connect_args')}
+    if url.get_backend_name() == 'sqlite' and 'pool_size' in options:
+        options['poolclass'] = AsyncAdaptedQueuePool
+    connect_options = engine_options.get('connect_args', {}).get('options', '')
+    settings = dict(re.findall(r'-c\s*(\w+)=(\S+)', connect_options))
+    if settings:
+        options['connect_args'] = {'server_settings': settings}
+    return options
+
+
+class Request:
+    """The parts of an ASGI HTTP request the async handlers use."""
+
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.method = scope['method']
+        self.path = scope['path']
+        self.body = body
+        self.args = MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+    @property
+    def is_json(self):
+        mimetype = self.headers.get('content-type', '').split(';', 1)[0].strip()
+        return mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))
+
+    def get_json(self):
+        """The parsed JSON body, or ``None`` when it is not valid JSON."""
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+
+class Response:
+    def __init__(self, body=b'', status=200, content_type='application/json', headers=None):
+        self.body = body
+        self.status = status
+        self.headers = dict(headers or {})
+        self.headers.setdefault('Content-Type', content_type)
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status)
+
+
+class AsgiApp:
+    """Dispatch to the async routes, falling back to the Flask app."""
+
+    def __init__(self, flask_app, routes, engine, wsgi_threads=8):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.routes = [(method, re.compile(pattern + '$'), handler) for method, pattern, handler in routes]
+        self.engine = engine
+        self.session = async_sessionmaker(engine, expire_on_commit=False)
+        self.executor = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix='wsgi')
+
+    def match(self, method, path):
+        for route_method, pattern, handler in self.routes:
+            if route_method == method:
+                found = pattern.match(path)
+                if found:
+                    return handler, {key: int(value) for key, value in found.groupdict().items()}
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        handler, params = self.match(scope['method'], scope['path'])
+        if handler is None:
+            await self._call_wsgi(scope, receive, send)
+            return
+        # The async routes take small JSON bodies, so theirs is read up front.
+        try:
+            body = await _read_body(receive, self.config['ASGI_MAX_BODY_BYTES'])
+        except RequestEntityTooLarge:
+            await _send_response(send, json_response({'error': 'Request body too large'}, 413))
+            return
+        try:
+            response = await handler(self, Request(scope, body), **params)
+        except Exception:
+            logger.exception('Unhandled error in async handler', extra={'path': scope['path']})
+            response = json_response({'error': 'Internal server error'}, 500)
+        if response is None:
+            await self._call_wsgi(scope, receive, send, body)
+            return
+        await _send_response(send, response)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # -- Flask fallback --------------------------------------------------------
+
+    def _environ(self, scope, stream):
+        server_name, server_port = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'],
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server_name,
+            'SERVER_PORT': str(server_port),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': stream,
+            # The stream ends with the body, so Werkzeug may read bodies sent without a
+            # Content-Length (chunked uploads) to the end.
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[name] = value
+                continue
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    def _run_wsgi(self, loop, environ, output, stop):
+        """Run the Flask app and iterate its response, all on this one thread.
+
+        Flask's request context lives in context variables, and views that stream with
+        ``stream_with_context`` need it for every chunk and for ``close()``, so the whole
+        response is produced here. Chunks go to ``output``, whose size bounds how far
+        this thread runs ahead of the client; ``stop`` is set when the client leaves or the
+        request is abandoned.
+        """
+        def emit(item):
+            _on_loop(loop, output.put(item), stop)
+
+        started = {}
+        announced = False
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        iterable = None
+        try:
+            iterable = self.flask_app(environ, start_response)
+            # A WSGI app may call start_response lazily, up to its first chunk.
+            for chunk in iterable:
+                if stop.is_set():
+                    break
+                if not announced:
+                    emit((started['status'], started['headers']))
+                    announced = True
+                if chunk:
+                    emit(chunk)
+            if not announced and started:
+                emit((started['status'], started['headers']))
+                announced = True
+        except Exception:
+            logger.exception('Unhandled error in WSGI app', extra={'path': environ['PATH_INFO']})
+            if not announced:
+                emit((500, [('Content-Type', 'text/plain; charset=utf-8')]))
+                emit(b'Internal Server Error')
+        finally:
+            try:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+            except Exception:
+                logger.exception('Closing the WSGI response failed', extra={'path': environ['PATH_INFO']})
+            emit(_END)
+
+    async def _call_wsgi(self, scope, receive, send, body=None):
+        """Serve the request with the Flask app; ``body`` is given when already read."""
+        limit = self.config.get('MAX_CONTENT_LENGTH')
+        length = dict(scope['headers']).get(b'content-length', b'')
+        if limit and length.isdigit() and int(length) > limit:
+            await _send_response(send, Response(b'Request Entity Too Large', 413, 'text/plain; charset=utf-8'))
+            return
+
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        receiver = _Receiver(receive, stop, body)
+        pump = asyncio.ensure_future(receiver.run())
+        output = asyncio.Queue(maxsize=WSGI_CHUNKS_AHEAD)
+        environ = self._environ(scope, io.BufferedReader(_WsgiInput(loop, receiver, limit)))
+        worker = loop.run_in_executor(self.executor, contextvars.copy_context().run,
+                                      self._run_wsgi, loop, environ, output, stop)
+        started = False
+        try:
+            # Drain until the end marker even after a disconnect: the thread waits on
+            # every chunk it hands over. If this task is cancelled instead, ``stop`` in
+            # the finally clause lets the thread give up on the chunk it is waiting on.
+            while True:
+                item = await output.get()
+                if item is _END:
+                    break
+                if stop.is_set():
+                    continue
+                try:
+                    if isinstance(item, tuple):
+                        status, headers = item
+                        await send({
+                            'type': 'http.response.start',
+                            'status': status,
+                            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                        for name, value in headers],
+                        })
+                        started = True
+                    else:
+                        await send({'type': 'http.response.body', 'body': item, 'more_body': True})
+                except OSError:
+                    stop.set()
+            if started and not stop.is_set():
+                await send({'type': 'http.response.body', 'body': b''})
+            await worker
+        finally:
+            stop.set()
+            pump.cancel()
+
+
+class _Receiver:
+    """Owns ``receive()`` while Flask serves a request.
+
+    Body chunks are queued for ``_WsgiInput`` as Flask reads them, a few at a time, so a
+    large upload is never held in memory whole; ``None`` marks the end of the body.
+    Afterwards it waits for the client to disconnect and then sets ``stop``.
+    """
+
+    def __init__(self, receive, stop, body=None):
+        self.receive = receive
+        self.stop = stop
+        self.chunks = asyncio.Queue(maxsize=2)
+        self.complete = body is not None
+        self.disconnected = False
+        if body is not None:
+            self.chunks.put_nowait(body)
+            self.chunks.put_nowait(None)
+
+    async def run(self):
+        if not self.complete:
+            while True:
+                message = await self.receive()
+                if message['type'] == 'http.disconnect':
+                    self._disconnect()
+                    return
+                await self.chunks.put(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            self.complete = True
+            await self.chunks.put(None)
+        while (await self.receive())['type'] != 'http.disconnect':
+            pass
+        self._disconnect()
+
+    def _disconnect(self):
+        self.disconnected = True
+        self.stop.set()
+        if not self.chunks.full():
+            self.chunks.put_nowait(None)
+
+    async def next_chunk(self):
+        if self.disconnected and self.chunks.empty():
+            return None
+        return await self.chunks.get()
+
+
+class _WsgiInput(io.RawIOBase):
+    """``wsgi.input`` read from the WSGI thread, pulling body chunks off the event loop."""
+
+    def __init__(self, loop, receiver, limit=None):
+        self.loop = loop
+        self.receiver = receiver
+        self.limit = limit
+        self.received = 0
+        self.pending = b''
+        self.done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            if self.done:
+                return 0
+            chunk = _on_loop(self.loop, self.receiver.next_chunk(), self.receiver.stop)
+            if chunk is None:
+                self.done = True
+                if not self.receiver.complete:
+                    raise ClientDisconnected()
+                return 0
+            self.received += len(chunk)
+            if self.limit and self.received > self.limit:
+                self.done = True
+                raise RequestEntityTooLarge()
+            self.pending = chunk
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def _on_loop(loop, coroutine, stop):
+    """Run ``coroutine`` on ``loop`` from a WSGI thread and wait for its result.
+
+    Returns ``None`` without the result once ``stop`` is set and the coroutine has not
+    finished, or when the loop is closed: nothing may be left to consume a chunk or
+    produce one when the request was cancelled or the server is shutting down.
+    """
+    try:
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+    except RuntimeError:
+        coroutine.close()
+        return None
+    while True:
+        try:
+            return future.result(timeout=WSGI_STOP_POLL_SECONDS)
+        except concurrent.futures.CancelledError:
+            return None
+        except concurrent.futures.TimeoutError:
+            if stop.is_set():
+                future.cancel()
+                return None
+
+
+async def _send_response(send, response):
+    response.headers['Content-Length'] = len(response.body)
+    await send({
+        'type': 'http.response.start',
+        'status': response.status,
+        'headers': [(name.lower().encode('latin-1'), str(value).encode('latin-1'))
+                    for name, value in response.headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': response.body})
+
+
+async def _read_body(receive, limit):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            raise RequestEntityTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def create_asgi_app(flask_app=None):
+    """Build the ASGI app around ``flask_app`` (created from the environment by default)."""
+    if flask_app is None:
+        from app import create_app
+        flask_app = create_app()
+    from app.capture.async_routes import ROUTES
+
+    config = flask_app.config
+    url = async_database_url(config['SQLALCHEMY_DATABASE_URI'])
+    engine = create_async_engine(url, **async_engine_options(url, config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}))
+    if url.get_backend_name() == 'sqlite':
+        apply_sqlite_profile(engine.sync_engine,
+                             sqlite_pragmas(config.get('SQLITE_PROFILE', 'default'), config.get('SQLITE_BUSY_TIMEOUT_MS')))
+    return AsgiApp(flask_app, ROUTES, engine, wsgi_threads=config.get('ASGI_WSGI_THREADS', 8))
@@ -0,0 +1,138 @@
+"""Chunked, resumable data backfills for migrations.
+
+A migration that rewrites a column in one ``UPDATE`` holds one long transaction and
+locks every row it touches until deploy finishes. ``backfill`` walks the table in
+primary key order instead, ``BACKFILL_BATCH_SIZE`` rows per batch with
+``BACKFILL_PAUSE`` seconds between batches. Each batch commits on its own, so it only
+locks its own rows and only for a moment.
+
+After every batch the last key reached is saved in ``backfill_progress`` under the
+backfill's name. If ``flask db upgrade`` is interrupted, running it again continues
+from that key; a finished backfill is skipped. A batch and its checkpoint are separate
+commits, so a crash between them repeats the batch. Transforms must therefore be
+idempotent, which they are when ``where`` selects only the rows still to do.
+
+The batches commit as they go, which also commits the migrations run before them.
+Give a backfill a revision of its own, between the revision that adds the new
+column (expand) and the one that tightens or drops the old (contract); the contract
+revision can check with ``ensure_backfilled`` that nothing was left behind.
+"""
+
+import logging
+import time
+from datetime import datetime
+
+import sqlalchemy as sa
+from alembic import op
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_TABLE = 'backfill_progress'
+
+progress = sa.Table(
+    PROGRESS_TABLE, sa.MetaData(),
+    sa.Column('name', sa.String(128), primary_key=True),
+    sa.Column('last_key', sa.BigInteger),
+    sa.Column('rows_done', sa.BigInteger, nullable=False, default=0),
+    sa.Column('updated_at', sa.DateTime),
+    sa.Column('finished_at', sa.DateTime),
+)
+
+
+def _checkpoint(bind, name, **values):
+    values['updated_at'] = datetime.utcnow()
+    if not bind.execute(progress.update().where(progress.c.name == name).values(**values)).rowcount:
+        bind.execute(progress.insert().values(name=name, **values))
+
+
+def _key_range_end(bind, table, key, lower, where, batch_size):
+    statement = sa.select(key)
+    if lower is not None:
+        statement = statement.where(key > lower)
+    if where is not None:
+        statement = statement.where(where)
+    batch = statement.order_by(key).limit(batch_size).subquery()
+    return bind.execute(sa.select(sa.func.max(batch.c[key.name]))).scalar()
+
+
+def _run(bind, name, table, apply, key, where, batch_size, pause):
+    progress.create(bind, checkfirst=True)
+    state = bind.execute(sa.select(progress).where(progress.c.name == name)).first()
+    if state is not None and state.finished_at is not None:
+        logger.info('Backfill already finished', extra={'backfill': name})
+        return 0
+    lower = state.last_key if state is not None else None
+    done = state.rows_done if state is not None else 0
+    key = table.c[key]
+    total = 0
+    while True:
+        upper = _key_range_end(bind, table, key, lower, where, batch_size)
+        if upper is None:
+            break
+        in_range = key <= upper if lower is None else sa.and_(key > lower, key <= upper)
+        rows = apply(bind, in_range) or 0
+        total += rows
+        lower = upper
+        _checkpoint(bind, name, last_key=lower, rows_done=done + total)
+        logger.info('Backfill batch done', extra={'backfill': name, 'last_key': lower, 'rows_done': done + total})
+        if pause:
+            time.sleep(pause)
+    _checkpoint(bind, name, last_key=lower, rows_done=done + total, finished_at=datetime.utcnow())
+    return total
+
+
+def backfill(name, table, apply, key='id', where=None, batch_size=None, pause=None, bind=None):
+    """Call ``apply(bind, in_range)`` for each batch of ``table`` rows matching ``where``.
+
+    ``in_range`` is a condition on ``key`` that selects the batch; ``apply`` writes the
+    batch and returns how many rows it changed. ``name`` identifies the checkpoint and
+    must be unique, e.g. the revision id. Returns the rows changed by this run.
+
+    Inside a migration the batches run in an autocommit block on the migration's
+    connection. Anywhere else pass ``bind``, a connection in ``AUTOCOMMIT`` mode.
+    """
+    if batch_size is None:
+        batch_size = current_app.config['BACKFILL_BATCH_SIZE']
+    if pause is None:
+        pause = current_app.config['BACKFILL_PAUSE']
+    if bind is not None:
+        return _run(bind, name, table, apply, key, where, batch_size, pause)
+    context = op.get_context()
+    if context.as_sql:
+        raise RuntimeError(f'Backfill {name} needs a database connection; it cannot run in offline (--sql) mode')
+    with context.autocommit_block():
+        return _run(op.get_bind(), name, table, apply, key, where, batch_size, pause)
+
+
+def backfill_update(name, table, values, key='id', where=None, **options):
+    """``UPDATE table SET values`` for the rows matching ``where``, batch by batch.
+
+    ``values`` may hold SQL expressions of the row's columns. Returns the rows updated.
+    """
+    def apply(bind, in_range):
+        statement = table.update().where(in_range).values(values)
+        if where is not None:
+            statement = statement.where(where)
+        return bind.execute(statement).rowcount
+
+    return backfill(name, table, apply, key=key, where=where, **options)
+
+
+def reset_backfill(name, bind=None):
+    """Forget the checkpoint of ``name`` so it runs again; for ``downgrade``."""
+    bind = bind if bind is not None else op.get_bind()
+    if sa.inspect(bind).has_table(PROGRESS_TABLE):
+        bind.execute(progress.delete().where(progress.c.name == name))
+
+
+def ensure_backfilled(table, where, bind=None):
+    """Raise ``RuntimeError`` if rows of ``table`` still match ``where``.
+
+    For the contract step: call it before making a backfilled column NOT NULL or
+    dropping the column it replaced.
+    """
+    bind = bind if bind is not None else op.get_bind()
+    remaining = bind.execute(sa.select(sa.func.count()).select_from(table).where(where)).scalar()
+    if remaining:
+        raise RuntimeError(f'{remaining} rows of {table.name} have not been backfilled yet')
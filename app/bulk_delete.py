@@ -0,0 +1,61 @@
+"""Set-based deletes behind the bulk delete endpoints.
+
+A bulk delete removes its rows with one ``DELETE ... WHERE`` instead of loading and
+deleting them one at a time. Rows that depend on them are left to the database: the
+tasks of a deleted project are detached or deleted by the ON DELETE rule the
+migrations installed (``PROJECT_DELETE_TASKS``), and the search, change log and agenda
+triggers follow along.
+"""
+
+from sqlalchemy import delete
+
+from app import db
+
+
+def parse_ids(ids, max_ids):
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise ValueError('ids must be a list of integers')
+    if len(ids) > max_ids:
+        raise ValueError(f'At most {max_ids} ids per request')
+    return list(dict.fromkeys(ids))
+
+
+def selection(model, data, max_ids, filter_conditions=None):
+    """``(ids, conditions)``: the SQL conditions for the rows a bulk request body names.
+
+    The body is ``{"ids": [...]}`` or, where ``filter_conditions`` is given,
+    ``{"filter": {...}}``, which it turns into conditions; ``ids`` is the validated,
+    de-duplicated id list, or ``None`` for a filter. Raises ``ValueError`` for an
+    invalid body and for a filter that would match every row.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Request must be a JSON object')
+    ids = data.get('ids')
+    filters = data.get('filter')
+    if filter_conditions is None:
+        if ids is None:
+            raise ValueError('Provide ids')
+    elif (ids is None) == (filters is None):
+        raise ValueError('Provide either ids or filter')
+    if ids is not None:
+        ids = parse_ids(ids, max_ids)
+        return ids, [model.id.in_(ids)]
+    if not isinstance(filters, dict):
+        raise ValueError('filter must be an object')
+    conditions = filter_conditions(filters)
+    if not conditions:
+        raise ValueError('filter must match on at least one field')
+    return None, conditions
+
+
+def delete_matching(model, conditions, session=None):
+    """Delete every ``model`` row matching ``conditions``; returns how many went.
+
+    ``session`` defaults to ``db.session``; the caller commits.
+    """
+    if session is None:
+        session = db.session
+    return session.execute(
+        delete(model).where(*conditions),
+        execution_options={'synchronize_session': False},
+    ).rowcount
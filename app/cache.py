@@ -0,0 +1,246 @@
+"""Read-through cache for list views.
+
+``cached(key, loader)`` returns the value stored under ``key`` or calls ``loader``,
+stores its result for ``CACHE_DEFAULT_TTL`` seconds and returns it. Writers call
+``invalidate(*keys)`` after they commit, so the keys a view reads from must be deleted
+by every handler that changes those rows; the TTL only bounds staleness from writes
+that bypass the handlers. Views behind ``conditional_list`` also store the state of
+their tables with each value and reload when it no longer matches, so a stale entry
+is never served with a fresh ETag.
+
+Backends, chosen with ``CACHE_BACKEND``:
+
+* ``memory``: an LRU of at most ``CACHE_MAX_ENTRIES`` entries inside each process.
+  An invalidation only reaches the worker that handled the write; other workers
+  notice the write through the version check, or serve the old value until it
+  expires where no version is given.
+* ``redis``: a shared Redis (``CACHE_REDIS_URL``, falling back to ``REDIS_URL``) that
+  every worker reads and invalidates. Values are stored as JSON.
+* ``none``: every lookup is a miss.
+
+A backend error is logged and treated as a miss; the cache never fails a request.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from app.export import json_default
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKENDS = ('memory', 'redis', 'none')
+
+
+class MemoryBackend:
+    """Thread-safe LRU with per-entry expiry."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return ``(found, value)``."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return False, None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+class RedisBackend:
+    """Shared backend on a Redis client (``redis.Redis`` or a compatible stand-in)."""
+
+    name = 'redis'
+
+    def __init__(self, client, prefix='make-life:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, prefix='make-life:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND 'redis' requires the 'redis' package")
+        return cls(redis.Redis.from_url(url), prefix)
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return False, None
+        return True, json.loads(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value, default=json_default, separators=(',', ':')),
+                        ex=max(1, int(ttl)))
+
+    def delete(self, keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self):
+        names = list(self.client.scan_iter(match=self.prefix + '*'))
+        if names:
+            self.client.delete(*names)
+
+    def stats(self):
+        # Server-wide figures; Redis does not break evictions down by key prefix.
+        info = self.client.info('stats')
+        return {
+            'evictions': info.get('evicted_keys', 0),
+            'expirations': info.get('expired_keys', 0),
+        }
+
+
+class NullBackend:
+    name = 'none'
+
+    def get(self, key):
+        return False, None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, keys):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+class Cache:
+    """Read-through front end over a backend, with hit/miss counters."""
+
+    def __init__(self, backend, default_ttl=60):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get_or_set(self, key, loader, ttl=None, version=None):
+        """Return the cached value for ``key``, loading and storing it on a miss.
+
+        A value stored with a different ``version`` counts as a miss. ``None`` results
+        are returned but not stored.
+        """
+        try:
+            found, item = self.backend.get(key)
+        except Exception:
+            logger.warning('Cache read failed', exc_info=True, extra={'key': key})
+            self._count('errors')
+            found, item = False, None
+        if found and item.get('version') == version:
+            self._count('hits')
+            return item['value']
+
+        self._count('misses')
+        value = loader()
+        if value is not None:
+            try:
+                self.backend.set(key, {'version': version, 'value': value}, ttl or self.default_ttl)
+            except Exception:
+                logger.warning('Cache write failed', exc_info=True, extra={'key': key})
+                self._count('errors')
+        return value
+
+    def delete(self, *keys):
+        try:
+            self.backend.delete(keys)
+        except Exception:
+            # A failed invalidation leaves the entry to expire with its TTL.
+            logger.error('Cache invalidation failed', exc_info=True, extra={'keys': list(keys)})
+            self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            result = {'backend': self.backend.name, 'hits': self.hits, 'misses': self.misses,
+                      'errors': self.errors, 'default_ttl': self.default_ttl}
+        try:
+            result.update(self.backend.stats())
+        except Exception:
+            logger.warning('Cache stats unavailable', exc_info=True)
+        return result
+
+
+def init_cache(app):
+    """Create the cache configured for ``app`` and store it in ``app.extensions``."""
+    name = app.config.get('CACHE_BACKEND', 'memory')
+    if name == 'memory':
+        backend = MemoryBackend(app.config.get('CACHE_MAX_ENTRIES', 1024))
+    elif name == 'redis':
+        url = app.config.get('CACHE_REDIS_URL')
+        if not url:
+            raise RuntimeError("CACHE_BACKEND 'redis' requires CACHE_REDIS_URL or REDIS_URL")
+        backend = RedisBackend.from_url(url, app.config.get('CACHE_KEY_PREFIX', 'make-life:'))
+    elif name == 'none':
+        backend = NullBackend()
+    else:
+        raise RuntimeError(f"Invalid CACHE_BACKEND: {name!r} (expected one of {', '.join(CACHE_BACKENDS)})")
+    app.extensions['cache'] = Cache(backend, app.config.get('CACHE_DEFAULT_TTL', 60))
+    return app.extensions['cache']
+
+
+def get_cache():
+    return current_app.extensions['cache']
+
+
+def cached(key, loader, ttl=None, version=None):
+    """``version`` identifies the data the value was loaded from; list views pass
+    ``list_version()`` so that a worker whose entry missed another worker's write
+    reloads instead of serving the old body under the new ETag."""
+    return get_cache().get_or_set(key, loader, ttl, version)
+
+
+def invalidate(*keys):
+    get_cache().delete(*keys)
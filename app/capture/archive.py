@@ -0,0 +1,160 @@
+"""Archival of processed capture entries.
+
+Entries handled or organized more than ``CAPTURE_ARCHIVE_AFTER_DAYS`` ago are moved
+from ``capture_entries`` to ``capture_archive`` so the inbox queries, indexes and
+triggers only deal with live entries. The move runs in batches of
+``CAPTURE_ARCHIVE_BATCH_SIZE`` entries, each one ``INSERT ... SELECT`` plus one
+``DELETE`` in its own short transaction, with a pause between batches so other
+writers get the database. On Postgres a batch skips rows another archiver has locked,
+so several processes can archive at once.
+
+``flask capture archive`` runs it once (for a scheduler); with
+``CAPTURE_ARCHIVE_INTERVAL`` set, a thread in each process runs it periodically.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, literal, or_, select, text, true
+
+from app import db
+from app.capture.models import CaptureArchive, CaptureEntry
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_COLUMNS = ('id', 'content', 'handled', 'organized', 'created_at', 'processed_at')
+
+
+def _archivable(cutoff):
+    return (CaptureEntry.processed_at < cutoff,
+            or_(CaptureEntry.handled == true(), CaptureEntry.organized == true()))
+
+
+def archive_batch(cutoff, batch_size):
+    """Move up to ``batch_size`` entries processed before ``cutoff``; returns how many."""
+    ids = db.session.execute(
+        select(CaptureEntry.id).where(*_archivable(cutoff))
+        .order_by(CaptureEntry.processed_at, CaptureEntry.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        db.session.rollback()
+        return 0
+    now = datetime.utcnow()
+    db.session.execute(
+        insert(CaptureArchive).from_select(
+            [*ARCHIVED_COLUMNS, 'archived_at'],
+            select(*(getattr(CaptureEntry, name) for name in ARCHIVED_COLUMNS),
+                   literal(now, CaptureArchive.archived_at.type))
+            .where(CaptureEntry.id.in_(ids), *_archivable(cutoff)),
+        )
+    )
+    moved = db.session.execute(
+        delete(CaptureEntry).where(CaptureEntry.id.in_(ids), *_archivable(cutoff)),
+        execution_options={'synchronize_session': False},
+    ).rowcount
+    db.session.commit()
+    return moved
+
+
+def archive_processed(older_than, batch_size=500, pause=0.0, max_batches=None, now=None):
+    """Archive every entry processed more than ``older_than`` ago, batch by batch.
+
+    Returns the number of entries moved. ``max_batches`` bounds one run.
+    """
+    cutoff = (now or datetime.utcnow()) - older_than
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(cutoff, batch_size)
+        total += moved
+        batches += 1
+        if moved < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    if total:
+        logger.info('Capture entries archived', extra={'archived_count': total, 'batch_count': batches})
+    return total
+
+
+def _row_count(model):
+    if db.engine.dialect.name == 'postgresql':
+        # The planner's estimate; count(*) would scan the whole table on every scrape.
+        return db.session.execute(
+            text('SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)'),
+            {'table': model.__tablename__},
+        ).scalar()
+    return db.session.execute(select(func.count()).select_from(model)).scalar()
+
+
+def archive_stats():
+    """Sizes of the hot table and the archive, and the age of the oldest processed
+    entry still in the hot table (0 when there is none)."""
+    oldest = db.session.execute(select(func.min(CaptureEntry.processed_at))).scalar()
+    return {
+        'hot_rows': _row_count(CaptureEntry),
+        'archive_rows': _row_count(CaptureArchive),
+        'oldest_processed_age_s': round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else 0,
+    }
+
+
+class CaptureArchiver:
+    """Runs ``archive_processed`` every ``interval`` seconds in a thread of each process."""
+
+    def __init__(self, app, interval, older_than, batch_size=500, pause=0.0):
+        self.app = app
+        self.interval = interval
+        self.older_than = older_than
+        self.batch_size = batch_size
+        self.pause = pause
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pid = None
+        self.archived = 0
+        self.failures = 0
+
+    def check_process(self):
+        """(Re)start the thread in this process; threads do not survive a fork."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop = threading.Event()
+            threading.Thread(target=self._run, name='capture-archiver', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    self.archived += archive_processed(self.older_than, self.batch_size, self.pause)
+            except Exception:
+                self.failures += 1
+                logger.exception('Capture archival failed; will retry')
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {'archived': self.archived, 'failures': self.failures}
+
+
+def init_archiver(app):
+    """Archive in the background of every process serving ``app``."""
+    config = app.config
+    archiver = CaptureArchiver(
+        app,
+        config['CAPTURE_ARCHIVE_INTERVAL'],
+        timedelta(days=config['CAPTURE_ARCHIVE_AFTER_DAYS']),
+        batch_size=config['CAPTURE_ARCHIVE_BATCH_SIZE'],
+        pause=config['CAPTURE_ARCHIVE_PAUSE'],
+    )
+    app.extensions['capture_archiver'] = archiver
+    # Started by the first request each worker serves, after gunicorn has forked it.
+    app.before_request(archiver.check_process)
+    return archiver
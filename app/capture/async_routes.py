@@ -0,0 +1,153 @@
+"""Async handlers for the capture JSON API, served by ``app.asgi``.
+
+They answer the same requests as the JSON branches of ``app.capture.routes``, with
+the same bodies and status codes, reusing its filters, triage and pagination helpers.
+A handler returns ``None`` for requests only the Flask views serve (HTML pages and
+form posts, and submissions while the capture journal is enabled) and for those Flask
+answers with an error page (a missing entry, or a body that is not a JSON object),
+and the ASGI app passes those on to Flask.
+"""
+
+import logging
+from urllib.parse import urlencode
+
+from sqlalchemy import delete, select
+
+from app.asgi import json_response
+from app.capture.models import CaptureEntry, CAPTURE_JSON_FIELDS
+from app.capture.routes import _capture_filters, bulk_triage
+from app.capture.triage import triage_ids
+from app.logging_setup import log_payload
+from app.pagination import keyset_query, keyset_result, parse_limit
+from app.projects.cache import invalidate_tasks
+from app.serialization import parse_fields, row_dicts
+
+logger = logging.getLogger(__name__)
+
+TRIAGE_MESSAGES = {
+    'handled': 'Capture entry marked as handled!',
+    'organized': 'Capture entry organized and converted to a task!',
+}
+
+
+def _invalidate_tasks(asgi, *project_ids):
+    with asgi.flask_app.app_context():
+        invalidate_tasks(*project_ids)
+
+
+async def list_entries(asgi, request):
+    if request.headers.get('accept') != 'application/json':
+        return None
+    args = request.args
+    try:
+        fields = parse_fields(args.get('fields'), CAPTURE_JSON_FIELDS)
+        conditions = _capture_filters(args, default_pending=False)
+        limit = parse_limit(args.get('limit'), asgi.config['CAPTURE_PAGE_SIZE'], asgi.config['CAPTURE_PAGE_SIZE_MAX'])
+        ordering = [CaptureEntry.created_at, CaptureEntry.id]
+        names = dict.fromkeys([*fields, 'created_at', 'id'])
+        statement = keyset_query(select(*(getattr(CaptureEntry, name) for name in names)).where(*conditions),
+                                 ordering, args.get('cursor'), limit)
+    except ValueError as e:
+        logger.info('Invalid capture listing parameters', extra={'error': str(e)})
+        return json_response({'error': str(e)}, 400)
+
+    async with asgi.session() as session:
+        rows = (await session.execute(statement)).all()
+    rows, next_cursor = keyset_result(rows, ordering, limit)
+    response = json_response(row_dicts(rows, fields))
+    if next_cursor:
+        query = urlencode([*((key, value) for key, value in args.items(multi=True) if key != 'cursor'),
+                           ('cursor', next_cursor)])
+        response.headers['Link'] = f'<{request.scope.get("root_path", "")}{request.path}?{query}>; rel="next"'
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
+async def add_entry(asgi, request):
+    if not request.is_json or asgi.config.get('CAPTURE_JOURNAL'):
+        return None
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return None
+    log_payload(logger, 'Capture entry payload', data, asgi.config.get('LOG_PAYLOAD_SAMPLE_RATE', 0.0))
+    content = data.get('content')
+    if not content:
+        logger.info('Capture entry rejected: content is required')
+        return json_response({'error': 'Content is required!'}, 400)
+    async with asgi.session() as session:
+        session.add(CaptureEntry(content=content))
+        await session.commit()
+    logger.info('Capture entry added')
+    return json_response({'message': 'Entry added successfully!'}, 201)
+
+
+async def edit_entry(asgi, request, id):
+    data = request.get_json() if request.is_json else None
+    if not isinstance(data, dict):
+        return None
+    async with asgi.session() as session:
+        entry = await session.get(CaptureEntry, id)
+        if entry is None:
+            return None
+        entry.content = data.get('content', entry.content)
+        await session.commit()
+    return json_response({'message': 'Capture entry updated successfully!'})
+
+
+async def delete_entry(asgi, request, id):
+    async with asgi.session() as session:
+        result = await session.execute(delete(CaptureEntry).where(CaptureEntry.id == id))
+        if not result.rowcount:
+            return None
+        await session.commit()
+    logger.info('Capture entry deleted', extra={'entry_id': id})
+    return json_response({'message': 'Entry deleted successfully!'})
+
+
+def _triage_one(action):
+    async def triage_entry(asgi, request, id):
+        async with asgi.session() as session:
+            outcome = (await session.run_sync(lambda sync_session: triage_ids([id], action, session=sync_session)))[id]
+            await session.commit()
+        if action == 'organized' and outcome['status'] == 'updated':
+            _invalidate_tasks(asgi)
+        if outcome['status'] == 'not_found':
+            return None
+        body = {'message': TRIAGE_MESSAGES[action]}
+        if 'task_id' in outcome:
+            body['task_id'] = outcome['task_id']
+        return json_response(body)
+    return triage_entry
+
+
+def _triage_many(action):
+    async def triage_entries(asgi, request):
+        data = request.get_json() if request.is_json else None
+        max_ids = asgi.config['CAPTURE_TRIAGE_MAX_IDS']
+        async with asgi.session() as session:
+            try:
+                body = await session.run_sync(lambda sync_session: bulk_triage(data, action, sync_session, max_ids))
+                await session.commit()
+            except ValueError as e:
+                await session.rollback()
+                return json_response({'error': str(e)}, 400)
+            except Exception:
+                await session.rollback()
+                logger.exception('Bulk triage failed', extra={'action': action})
+                return json_response({'error': 'Bulk triage failed'}, 500)
+        if action == 'organized' and body['updated']:
+            _invalidate_tasks(asgi, data.get('project_id'))
+        logger.info('Capture entries triaged', extra={'action': action, 'updated_count': body['updated']})
+        return json_response(body)
+    return triage_entries
+
+
+# (method, path pattern, handler); integer groups are passed as keyword arguments.
+ROUTES = [
+    ('GET', r'/capture/?', list_entries),
+    ('POST', r'/capture/?', add_entry),
+    ('PUT', r'/capture/(?P<id>\d+)', edit_entry),
+    ('DELETE', r'/capture/(?P<id>\d+)', delete_entry),
+    *(('POST', rf'/capture/(?P<id>\d+)/{action}', _triage_one(action)) for action in TRIAGE_MESSAGES),
+    *(('POST', rf'/capture/{action}/?', _triage_many(action)) for action in TRIAGE_MESSAGES),
+]
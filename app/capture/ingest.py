@@ -0,0 +1,219 @@
+"""Batch ingest of capture entries for importers.
+
+Items are parsed incrementally from the request body (a JSON array or NDJSON), inserted
+in chunks with one multi-row INSERT and one commit per chunk, and a result is recorded
+for every item. Results are spooled to a temporary file so memory use does not grow
+with the size of the upload.
+"""
+
+import codecs
+import json
+import tempfile
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app import db
+from app.capture.models import CaptureEntry
+
+READ_SIZE = 64 * 1024
+RESULT_SPOOL_SIZE = 1024 * 1024
+MAX_ITEM_BYTES = 1024 * 1024
+# A value cut off by the end of the buffer fails to parse at, or just before, the end:
+# a literal such as -Infinity or a \uXXXX escape is reported from its start. An
+# unterminated string is reported from its opening quote.
+TRUNCATION_MARGIN = 10
+
+
+class MalformedInput(ValueError):
+    """Raised when the request body stops being a valid JSON array or NDJSON stream."""
+
+
+def _truncated(error, buf):
+    return error.pos >= len(buf) - TRUNCATION_MARGIN or error.msg.startswith('Unterminated string')
+
+
+def iter_json_array(stream, read_size=READ_SIZE, max_item_bytes=MAX_ITEM_BYTES):
+    """Yield the elements of a JSON array read from ``stream`` without loading it whole.
+
+    An element split across reads is parsed again as more of it arrives, so elements
+    longer than ``max_item_bytes`` (measured on the decoded text) are rejected.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    eof = False
+    started = False
+    expect_value = True
+    count = 0
+
+    def too_large():
+        return MalformedInput(f'Array element larger than {max_item_bytes} bytes')
+
+    def fill():
+        nonlocal buf, pos, eof
+        if len(buf) - pos > max_item_bytes:
+            raise too_large()
+        chunk = stream.read(read_size)
+        buf = buf[pos:] + utf8.decode(chunk or b'', final=not chunk)
+        pos = 0
+        eof = not chunk
+
+    while True:
+        while pos < len(buf) and buf[pos].isspace():
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise MalformedInput('Unexpected end of JSON array')
+            fill()
+            continue
+
+        char = buf[pos]
+        if not started:
+            if char != '[':
+                raise MalformedInput('Request body must be a JSON array')
+            started = True
+            pos += 1
+        elif char == ']' and (not expect_value or count == 0):
+            return
+        elif char == ',' and not expect_value:
+            expect_value = True
+            pos += 1
+        elif expect_value:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if eof or not _truncated(e, buf):
+                    raise MalformedInput(f'Malformed JSON: {e.msg}')
+                fill()
+                continue
+            if end == len(buf) and not eof:
+                # A scalar such as a number may continue in the next read.
+                fill()
+                continue
+            if end - pos > max_item_bytes:
+                raise too_large()
+            pos = end
+            expect_value = False
+            count += 1
+            yield value
+        else:
+            raise MalformedInput(f'Unexpected character {char!r} in JSON array')
+
+
+def iter_ndjson(stream, max_item_bytes=MAX_ITEM_BYTES):
+    """Yield one decoded value per non-blank line of an NDJSON stream.
+
+    Lines longer than ``max_item_bytes`` are rejected.
+    """
+    while True:
+        raw_line = stream.readline(max_item_bytes + 1)
+        if not raw_line:
+            return
+        if len(raw_line) > max_item_bytes and not raw_line.endswith(b'\n'):
+            raise MalformedInput(f'NDJSON line longer than {max_item_bytes} bytes')
+        line = raw_line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise MalformedInput(f'Malformed NDJSON line: {e}')
+
+
+def _entry_values(item, now):
+    if not isinstance(item, dict):
+        raise ValueError('Item must be a JSON object')
+    content = item.get('content')
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError('Content is required!')
+    created_at = item.get('created_at')
+    if created_at is None:
+        created_at = now
+    else:
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid created_at: {created_at!r}')
+    return {'content': content, 'handled': False, 'organized': False, 'created_at': created_at}
+
+
+def _insert_chunk(chunk):
+    """Insert one chunk in its own transaction and return the new ids in input order."""
+    statement = insert(CaptureEntry)
+    dialect = db.engine.dialect
+    rows = [values for _, values, _ in chunk if values is not None]
+    try:
+        if getattr(dialect, 'insert_executemany_returning_sort_by_parameter_order', False):
+            result = db.session.execute(
+                statement.returning(CaptureEntry.id, sort_by_parameter_order=True), rows
+            )
+            ids = list(result.scalars())
+        else:
+            db.session.execute(statement, rows)
+            ids = [None] * len(rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return ids
+
+
+def ingest(items, chunk_size):
+    """Insert ``items`` in chunks and spool one result per item.
+
+    Returns ``(results_file, created, failed)``; ``results_file`` holds one compact JSON
+    result object per line, rewound to the start. A malformed body stops the ingest
+    after flushing the entries parsed so far and is reported as a final error result.
+    """
+    results = tempfile.SpooledTemporaryFile(max_size=RESULT_SPOOL_SIZE, mode='w+', encoding='utf-8')
+    created = failed = 0
+    chunk = []
+    index = 0
+
+    def write(result):
+        results.write(json.dumps(result, separators=(',', ':')))
+        results.write('\n')
+
+    def flush():
+        nonlocal created, failed
+        if not chunk:
+            return
+        database_error = None
+        ids = iter(())
+        try:
+            if any(values is not None for _, values, _ in chunk):
+                ids = iter(_insert_chunk(chunk))
+        except Exception as e:
+            database_error = f'Database error: {e.__class__.__name__}'
+        # Results are written in input order, invalid items in place.
+        for item_index, values, error in chunk:
+            if values is not None and database_error is None:
+                write({'index': item_index, 'status': 'created', 'id': next(ids)})
+                created += 1
+            else:
+                write({'index': item_index, 'status': 'error', 'error': error or database_error})
+                failed += 1
+        chunk.clear()
+
+    now = datetime.utcnow()
+    try:
+        for item in items:
+            try:
+                chunk.append((index, _entry_values(item, now), None))
+            except ValueError as e:
+                chunk.append((index, None, str(e)))
+            index += 1
+            if len(chunk) >= chunk_size:
+                flush()
+                now = datetime.utcnow()
+    except MalformedInput as e:
+        flush()
+        write({'index': index, 'status': 'error', 'error': str(e)})
+        failed += 1
+    else:
+        flush()
+
+    results.seek(0)
+    return results, created, failed
@@ -0,0 +1,326 @@
+"""Write-behind journal for capture submissions.
+
+With ``CAPTURE_JOURNAL`` enabled, ``POST /capture/`` appends the entry to a local
+journal file, syncs it to disk and answers ``202 Accepted`` without waiting for the
+database. A flusher thread in each process moves journalled entries into
+``capture_entries`` in batches.
+
+Journal files live in ``CAPTURE_JOURNAL_DIR`` and go through three states, each
+change being an atomic rename:
+
+* ``<pid>-<ns>.open``: the segment a process is appending to, one JSON record per
+  line.
+* ``<pid>-<ns>.ready``: a closed segment waiting to be written to the database.
+* ``<pid>-<ns>.flushing-<pid>``: a segment claimed by the flusher of that process.
+
+A segment is deleted only after its entries are committed. Every record carries an
+idempotency key stored in a unique column, so a segment that is replayed after a crash
+(an ``.open`` or ``.flushing`` file whose process is gone) never creates an entry
+twice. The journal survives a crashed worker but not the loss of the disk, so on
+hosts with ephemeral filesystems it covers database outages, not machine loss.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+from app import db
+from app.capture.models import CaptureEntry
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_LENGTH = CaptureEntry.__table__.c.idempotency_key.type.length
+MAX_RETRY_INTERVAL = 30.0
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OverflowError, ValueError):
+        return True
+    return True
+
+
+def _fsync_directory(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_datasync = getattr(os, 'fdatasync', os.fsync)
+
+
+def _insert_ignoring_conflicts():
+    """An INSERT that skips rows whose idempotency key is already present."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return insert(CaptureEntry)
+    return dialect_insert(CaptureEntry).on_conflict_do_nothing(index_elements=['idempotency_key'])
+
+
+class CaptureJournal:
+    """The journal of one app in one process, with its flusher thread."""
+
+    def __init__(self, app, directory, flush_interval=0.2, batch_size=500):
+        self.app = app
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._fd = None
+        self._path = None
+        self._segment_records = 0
+        self.appended = 0
+        self.flushed = 0
+        self.duplicates = 0
+        self.corrupt = 0
+        self.failures = 0
+        self.last_error = None
+        os.makedirs(directory, exist_ok=True)
+
+    # -- appending -------------------------------------------------------------
+
+    def append(self, content, key=None):
+        """Durably record an entry and return its idempotency key."""
+        self._check_process()
+        key = key or uuid.uuid4().hex
+        record = json.dumps({'key': key, 'content': content, 'created_at': datetime.utcnow().isoformat()},
+                            separators=(',', ':'))
+        data = (record + '\n').encode('utf-8')
+        with self._lock:
+            if self._fd is None:
+                self._open_segment()
+            view = memoryview(data)
+            while view:
+                written = os.write(self._fd, view)
+                view = view[written:]
+            _datasync(self._fd)
+            self._segment_records += 1
+            self.appended += 1
+        return key
+
+    def _open_segment(self):
+        self._path = os.path.join(self.directory, f'{os.getpid()}-{time.time_ns()}.open')
+        self._fd = os.open(self._path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self._segment_records = 0
+        _fsync_directory(self.directory)
+
+    def _rotate(self):
+        """Close the active segment, if it has records, and mark it ready."""
+        with self._lock:
+            if self._fd is None or not self._segment_records:
+                return
+            os.close(self._fd)
+            os.rename(self._path, self._path[:-len('.open')] + '.ready')
+            _fsync_directory(self.directory)
+            self._fd = None
+            self._path = None
+
+    # -- flushing --------------------------------------------------------------
+
+    def _recover_orphans(self):
+        """Make segments left behind by dead processes ready again."""
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            stem, _, state = name.partition('.')
+            if state == 'open':
+                owner = int(stem.split('-', 1)[0])
+                if path == self._path or (owner != os.getpid() and _pid_alive(owner)):
+                    continue
+            elif state.startswith('flushing-'):
+                owner = int(state[len('flushing-'):])
+                # Our own claims are only held inside flush(), under _flush_lock.
+                if owner != os.getpid() and _pid_alive(owner):
+                    continue
+            else:
+                continue
+            try:
+                os.rename(path, os.path.join(self.directory, stem + '.ready'))
+                logger.warning('Recovered capture journal segment', extra={'segment': name})
+            except FileNotFoundError:
+                pass
+
+    def _ready_segments(self):
+        names = [name for name in os.listdir(self.directory) if name.endswith('.ready')]
+        # Oldest first: names are <pid>-<creation time in ns>.
+        return sorted(names, key=lambda name: int(name.split('.', 1)[0].split('-', 1)[1]))
+
+    def _read_records(self, path):
+        records = []
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    records.append({
+                        'idempotency_key': record['key'],
+                        'content': record['content'],
+                        'created_at': datetime.fromisoformat(record['created_at']),
+                    })
+                except (ValueError, KeyError, TypeError):
+                    # Only a write torn by a crash can end up here, and it was never
+                    # acknowledged to the client.
+                    self.corrupt += 1
+                    logger.warning('Skipped corrupt capture journal record', extra={'segment': path})
+        return records
+
+    def _write_batch(self, records):
+        keys = list(dict.fromkeys(record['idempotency_key'] for record in records))
+        existing = set(db.session.execute(
+            select(CaptureEntry.idempotency_key).where(CaptureEntry.idempotency_key.in_(keys))
+        ).scalars())
+        rows = []
+        for record in records:
+            if record['idempotency_key'] in existing:
+                continue
+            existing.add(record['idempotency_key'])
+            rows.append(dict(record, handled=False, organized=False))
+        if rows:
+            db.session.execute(_insert_ignoring_conflicts(), rows)
+        db.session.commit()
+        return len(rows), len(records) - len(rows)
+
+    def flush(self):
+        """Write every ready segment to the database; return the number of new entries.
+
+        Must run inside an app context. A segment that fails is put back to be retried
+        and the error is re-raised.
+        """
+        with self._flush_lock:
+            self._rotate()
+            self._recover_orphans()
+            inserted = 0
+            for name in self._ready_segments():
+                ready = os.path.join(self.directory, name)
+                claimed = f'{ready[:-len(".ready")]}.flushing-{os.getpid()}'
+                try:
+                    os.rename(ready, claimed)
+                except FileNotFoundError:
+                    continue  # claimed by another process
+                try:
+                    records = self._read_records(claimed)
+                    for start in range(0, len(records), self.batch_size):
+                        created, duplicates = self._write_batch(records[start:start + self.batch_size])
+                        inserted += created
+                        self.flushed += created
+                        self.duplicates += duplicates
+                except Exception as e:
+                    db.session.rollback()
+                    os.rename(claimed, ready)
+                    self.failures += 1
+                    self.last_error = f'{e.__class__.__name__}: {e}'
+                    raise
+                os.remove(claimed)
+            if inserted:
+                logger.info('Capture journal flushed', extra={'inserted_count': inserted})
+            return inserted
+
+    # -- background thread -----------------------------------------------------
+
+    def _check_process(self):
+        """(Re)start the flusher in this process; threads do not survive a fork."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._fd = None
+            self._path = None
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='capture-journal-flusher', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def start(self):
+        self._check_process()
+        atexit.register(self.close)
+
+    def _run(self):
+        delay = self.flush_interval
+        while not self._stop.wait(delay):
+            try:
+                with self.app.app_context():
+                    self.flush()
+                delay = self.flush_interval
+            except Exception:
+                logger.exception('Capture journal flush failed; will retry')
+                delay = min(max(delay, self.flush_interval) * 2, MAX_RETRY_INTERVAL)
+
+    def close(self):
+        """Stop the flusher and make a last attempt to write the backlog."""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception:
+            # Whatever is left is replayed by the next process that starts.
+            logger.exception('Capture journal flush on shutdown failed')
+
+    # -- introspection ---------------------------------------------------------
+
+    def stats(self):
+        """Backlog of the whole journal directory plus this process's counters."""
+        backlog_records = backlog_bytes = 0
+        segments = {'open': 0, 'ready': 0, 'flushing': 0}
+        oldest = None
+        for name in os.listdir(self.directory):
+            stem, _, state = name.partition('.')
+            state = state.split('-', 1)[0]
+            if state not in segments:
+                continue
+            segments[state] += 1
+            try:
+                with open(os.path.join(self.directory, name), 'rb') as f:
+                    for block in iter(lambda: f.read(64 * 1024), b''):
+                        backlog_bytes += len(block)
+                        backlog_records += block.count(b'\n')
+            except FileNotFoundError:
+                continue
+            created_ns = int(stem.split('-', 1)[1])
+            oldest = created_ns if oldest is None else min(oldest, created_ns)
+        return {
+            'backlog_records': backlog_records,
+            'backlog_bytes': backlog_bytes,
+            'segments': segments,
+            'oldest_segment_age_s': round((time.time_ns() - oldest) / 1e9, 3) if oldest else 0.0,
+            'appended': self.appended,
+            'flushed': self.flushed,
+            'duplicates': self.duplicates,
+            'corrupt': self.corrupt,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
+
+
+def init_journal(app, start=True):
+    """Create the journal for ``app`` from its config and start its flusher."""
+    journal = CaptureJournal(
+        app,
+        app.config['CAPTURE_JOURNAL_DIR'],
+        flush_interval=app.config.get('CAPTURE_JOURNAL_FLUSH_INTERVAL', 0.2),
+        batch_size=app.config.get('CAPTURE_JOURNAL_BATCH_SIZE', 500),
+    )
+    app.extensions['capture_journal'] = journal
+    if start:
+        journal.start()
+    return journal
@@ -1,14 +1,43 @@
 from app import db
 from datetime import datetime
 
+# Columns of the JSON listing, in output order; ``?fields=`` selects a subset.
+CAPTURE_JSON_FIELDS = ('id', 'content', 'handled', 'organized', 'created_at', 'processed_at')
+ARCHIVE_JSON_FIELDS = CAPTURE_JSON_FIELDS + ('archived_at',)
+
 class CaptureEntry(db.Model):
     __tablename__ = 'capture_entries'
+    __table_args__ = (
+        # Keyset pagination of the inbox walks (created_at, id) in order.
+        db.Index('ix_capture_entries_created_at_id', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     handled = db.Column(db.Boolean, default=False)
     organized = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    processed_at = db.Column(db.DateTime)
+    # Archival finds the entries processed longest ago through this index.
+    processed_at = db.Column(db.DateTime, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # Set for entries written through the capture journal; makes replays idempotent.
+    idempotency_key = db.Column(db.String(64), index=True, unique=True)
 
     def __repr__(self):
         return f'<CaptureEntry {self.id}>'
+
+class CaptureArchive(db.Model):
+    """A processed entry moved out of ``capture_entries`` by ``app.capture.archive``.
+
+    It keeps its original id, so links and exports stay stable.
+    """
+    __tablename__ = 'capture_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    content = db.Column(db.Text, nullable=False)
+    handled = db.Column(db.Boolean)
+    organized = db.Column(db.Boolean)
+    created_at = db.Column(db.DateTime)
+    processed_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<CaptureArchive {self.id}>'
@@ -1,96 +1,391 @@
-from flask import request, jsonify, render_template, redirect, url_for, flash
+from flask import request, jsonify, render_template, redirect, url_for, flash, current_app, Response, abort
 from app.capture import capture
-from app.capture.models import db, CaptureEntry
-from datetime import datetime
-import os
+from app.capture.models import db, CaptureEntry, CaptureArchive, CAPTURE_JSON_FIELDS, ARCHIVE_JSON_FIELDS
+from app.capture.archive import archive_processed
+from app.bulk_delete import delete_matching, selection
+from app.capture.ingest import ingest, iter_json_array, iter_ndjson
+from app.capture.triage import triage_ids, triage_matching
+from app.capture.journal import IDEMPOTENCY_KEY_LENGTH
+from app.projects.models import Project
+from app.projects.cache import invalidate_tasks
+from app.export import export_response
+from app.conditional import conditional_list
+from app.pagination import keyset_page, parse_bool, parse_datetime, parse_limit
+from app.logging_setup import log_payload
+from app.serialization import json_response, parse_fields, row_dicts
+from app.search.queries import ARCHIVE_KIND, search as run_search
+from datetime import datetime, timedelta
+from sqlalchemy import select
+import click
+import logging
 
-print("Loading capture routes...")  # Debug print statement
+logger = logging.getLogger(__name__)
 
 @capture.route('/', methods=['POST'])
 def add_capture_entry():
-    print("POST request received")  # Debug print statement
     if request.is_json:
         data = request.get_json()
     else:
         data = request.form
 
-    print(f"Received data: {data}")  # Debug print statement
+    log_payload(logger, 'Capture entry payload', data.to_dict() if hasattr(data, 'to_dict') else data)
     content = data.get('content')
     if content:
+        journal = current_app.extensions.get('capture_journal')
+        if journal is not None:
+            accepted = _journal_capture_entry(journal, content)
+            if accepted is not None:
+                return accepted
         entry = CaptureEntry(content=content)
         db.session.add(entry)
         db.session.commit()
-        print("Entry added to database")  # Debug print statement
+        logger.info('Capture entry added')
         if request.is_json:
             return jsonify({'message': 'Entry added successfully!'}), 201
         else:
             flash('Entry added successfully!')
             return redirect(url_for('capture.get_capture_entries'))
-    print("Content is required")  # Debug print statement
+    logger.info('Capture entry rejected: content is required')
     if request.is_json:
         return jsonify({'error': 'Content is required!'}), 400
     else:
         flash('Content is required')
         return redirect(url_for('capture.get_capture_entries'))
 
+def _journal_capture_entry(journal, content):
+    """Append to the capture journal; returns None to fall back to a direct insert."""
+    key = request.headers.get('Idempotency-Key', '').strip() or None
+    if key is not None and len(key) > IDEMPOTENCY_KEY_LENGTH:
+        return jsonify({'error': f'Idempotency-Key must be at most {IDEMPOTENCY_KEY_LENGTH} characters'}), 400
+    try:
+        key = journal.append(content, key)
+    except OSError:
+        logger.exception('Capture journal append failed; writing to the database directly')
+        return None
+    logger.info('Capture entry journalled')
+    if request.is_json:
+        return jsonify({'message': 'Entry accepted', 'idempotency_key': key}), 202
+    flash('Entry added successfully!')
+    return redirect(url_for('capture.get_capture_entries'))
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-lines')
+
+@capture.route('/bulk', methods=['POST'])
+def bulk_add_capture_entries():
+    """Ingest many entries from a JSON array or an NDJSON stream.
+
+    Every item is an object with ``content`` and an optional ISO-8601 ``created_at``.
+    The response has one result per item, in the same format as the request body,
+    and is ``201`` when every item was stored or ``207`` when some failed.
+    """
+    ndjson = request.mimetype in NDJSON_MIMETYPES
+    if not ndjson and request.mimetype != 'application/json':
+        return jsonify({'error': 'Request must be a JSON array or NDJSON'}), 415
+
+    max_item_bytes = current_app.config['CAPTURE_BULK_MAX_ITEM_BYTES']
+    if ndjson:
+        items = iter_ndjson(request.stream, max_item_bytes=max_item_bytes)
+    else:
+        items = iter_json_array(request.stream, max_item_bytes=max_item_bytes)
+    results, created, failed = ingest(items, current_app.config['CAPTURE_BULK_CHUNK_SIZE'])
+    logger.info('Bulk capture ingest finished', extra={'created_count': created, 'failed_count': failed})
+
+    def generate():
+        try:
+            if ndjson:
+                for line in results:
+                    yield line
+                return
+            yield f'{{"created":{created},"failed":{failed},"results":['
+            separator = ''
+            for line in results:
+                yield separator + line.rstrip('\n')
+                separator = ','
+            yield ']}\n'
+        finally:
+            results.close()
+
+    status = 201 if failed == 0 else 207
+    response = Response(generate(), status=status,
+                        mimetype='application/x-ndjson' if ndjson else 'application/json')
+    response.headers['X-Created-Count'] = str(created)
+    response.headers['X-Failed-Count'] = str(failed)
+    return response
+
+def _capture_filters(args, default_pending):
+    """Build SQL conditions from the request's capture filters.
+
+    Filters are ``handled``, ``organized`` (true/false/any), ``created_from``
+    (inclusive) and ``created_to`` (exclusive). When ``default_pending`` is set and
+    no flag filter is given, only entries that are neither handled nor organized
+    are matched, which is what the inbox page shows.
+    """
+    handled = parse_bool(args.get('handled'))
+    organized = parse_bool(args.get('organized'))
+    if default_pending:
+        if 'handled' not in args:
+            handled = False
+        if 'organized' not in args:
+            organized = False
+    created_from = parse_datetime(args.get('created_from'), 'created_from')
+    created_to = parse_datetime(args.get('created_to'), 'created_to')
+
+    conditions = []
+    if handled is not None:
+        conditions.append(CaptureEntry.handled == handled)
+    if organized is not None:
+        conditions.append(CaptureEntry.organized == organized)
+    if created_from is not None:
+        conditions.append(CaptureEntry.created_at >= created_from)
+    if created_to is not None:
+        conditions.append(CaptureEntry.created_at < created_to)
+    return conditions
+
+def _capture_entries_page(default_pending, fields=None):
+    """Read one page of capture entries using the request's filters and cursor.
+
+    With ``fields`` the page is read as plain rows of just those columns (plus the
+    ordering columns the cursor needs) instead of ``CaptureEntry`` objects.
+    """
+    args = request.args
+    conditions = _capture_filters(args, default_pending)
+    limit = parse_limit(args.get('limit'), current_app.config['CAPTURE_PAGE_SIZE'],
+                        current_app.config['CAPTURE_PAGE_SIZE_MAX'])
+    ordering = [CaptureEntry.created_at, CaptureEntry.id]
+    if fields is None:
+        query = CaptureEntry.query.filter(*conditions)
+    else:
+        names = dict.fromkeys([*fields, 'created_at', 'id'])
+        query = select(*(getattr(CaptureEntry, name) for name in names)).where(*conditions)
+    return keyset_page(query, ordering, args.get('cursor'), limit)
+
+@capture.route('/export', methods=['GET'])
+def export_capture_entries():
+    """Stream every capture entry matching the listing filters (no paging).
+
+    ``format`` is one of ``json`` (default), ``ndjson``, ``csv`` or ``csv.gz``.
+    """
+    try:
+        statement = (
+            select(CaptureEntry.id, CaptureEntry.content, CaptureEntry.handled, CaptureEntry.organized,
+                   CaptureEntry.created_at, CaptureEntry.processed_at)
+            .where(*_capture_filters(request.args, default_pending=False))
+            .order_by(CaptureEntry.id)
+        )
+        return export_response(statement, request.args.get('format', 'json'), 'capture_entries')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 @capture.route('/', methods=['GET'])
+@conditional_list(CaptureEntry)
 def get_capture_entries():
+    wants_json = request.headers.get('Accept') == 'application/json'
     try:
-        print("GET request received")  # Debug print statement
-        entries = CaptureEntry.query.all()
-        print(f"Entries retrieved: {[entry.content for entry in entries]}")  # Debug print statement
-        
-        if request.headers.get('Accept') == 'application/json':
-            entries_data = [
-                {
-                    'id': entry.id,
-                    'content': entry.content,
-                    'handled': entry.handled,
-                    'organized': entry.organized,
-                    'created_at': entry.created_at,
-                    'processed_at': entry.processed_at
-                }
-                for entry in entries
-            ]
-            return jsonify(entries_data)
-        
-        template_path = os.path.join(os.path.dirname(__file__), 'templates', 'capture.html')
-        print(f"Rendering template at path: {template_path}")  # Debug print statement
-        return render_template('capture.html', messages=entries)
+        fields = parse_fields(request.args.get('fields'), CAPTURE_JSON_FIELDS) if wants_json else None
+        sync_cursor = None
+        if not wants_json:
+            # Taken before the page is read, so the page's live stream replays anything
+            # written in between. app.sync imports the capture models, hence the late import.
+            from app.sync.changelog import head_cursor
+            sync_cursor = head_cursor()
+        entries, next_cursor = _capture_entries_page(default_pending=not wants_json, fields=fields)
+        logger.debug('Capture entries retrieved', extra={'count': len(entries)})
+        next_url = None
+        if next_cursor:
+            next_url = url_for('capture.get_capture_entries', **dict(request.args, cursor=next_cursor))
+
+        if wants_json:
+            response = json_response(row_dicts(entries, fields))
+            if next_cursor:
+                response.headers['Link'] = f'<{next_url}>; rel="next"'
+                response.headers['X-Next-Cursor'] = next_cursor
+            return response
+
+        return render_template('capture.html', messages=entries, next_url=next_url, sync_cursor=sync_cursor)
+    except ValueError as e:
+        logger.info('Invalid capture listing parameters', extra={'error': str(e)})
+        if wants_json:
+            return jsonify({'error': str(e)}), 400
+        return str(e), 400
     except Exception as e:
-        print(f"Error retrieving entries: {e}")  # Debug print statement
+        logger.exception('Error retrieving capture entries')
         return str(e), 500
 
 @capture.route('/<int:id>', methods=['DELETE'])
 def delete_capture_entry(id):
-    print("DELETE request received")  # Debug print statement
-    entry = CaptureEntry.query.get_or_404(id)
+    entry = db.get_or_404(CaptureEntry, id)
     db.session.delete(entry)
     db.session.commit()
-    print("Entry deleted from database")  # Debug print statement
+    logger.info('Capture entry deleted', extra={'entry_id': id})
     return jsonify({'message': 'Entry deleted successfully!'}), 200
 
+def _json_capture_filters(filters):
+    """``_capture_filters`` for a JSON ``filter`` object of a bulk request."""
+    args = {key: str(value).lower() if isinstance(value, bool) else value
+            for key, value in filters.items() if value is not None}
+    return _capture_filters(args, default_pending=False)
+
+@capture.route('/delete', methods=['POST'])
+def bulk_delete_capture_entries():
+    """Delete many entries with one statement.
+
+    The body is ``{"ids": [...]}`` or ``{"filter": {...}}`` with the listing filters
+    (``handled``, ``organized``, ``created_from``, ``created_to``); an empty filter is
+    rejected. Returns the number of entries deleted.
+    """
+    try:
+        _, conditions = selection(CaptureEntry, request.get_json(silent=True),
+                                  current_app.config['BULK_DELETE_MAX_IDS'], _json_capture_filters)
+        deleted = delete_matching(CaptureEntry, conditions)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    logger.info('Capture entries deleted', extra={'deleted_count': deleted})
+    return jsonify({'deleted': deleted}), 200
+
 @capture.route('/<int:id>', methods=['PUT'])
 def edit_capture_entry(id):
     data = request.get_json()
-    entry = CaptureEntry.query.get_or_404(id)
+    entry = db.get_or_404(CaptureEntry, id)
     entry.content = data.get('content', entry.content)
     db.session.commit()
     return jsonify({'message': 'Capture entry updated successfully!'})
 
+def _triage_response(id, action, message):
+    try:
+        outcome = triage_ids([id], action)[id]
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if action == 'organized' and outcome['status'] == 'updated':
+        invalidate_tasks()
+    if outcome['status'] == 'not_found':
+        abort(404)
+    body = {'message': message}
+    if 'task_id' in outcome:
+        body['task_id'] = outcome['task_id']
+    return jsonify(body)
+
 @capture.route('/<int:id>/handled', methods=['POST'])
 def handle_capture_entry(id):
-    entry = CaptureEntry.query.get_or_404(id)
-    entry.handled = True
-    entry.processed_at = datetime.utcnow()
-    db.session.commit()
-    return jsonify({'message': 'Capture entry marked as handled!'})
+    return _triage_response(id, 'handled', 'Capture entry marked as handled!')
 
 @capture.route('/<int:id>/organized', methods=['POST'])
 def organize_capture_entry(id):
-    entry = CaptureEntry.query.get_or_404(id)
-    entry.organized = True
-    entry.processed_at = datetime.utcnow()
-    # Additional logic to create a task from this entry
-    db.session.commit()
-    return jsonify({'message': 'Capture entry organized and converted to a task!'})
+    return _triage_response(id, 'organized', 'Capture entry organized and converted to a task!')
+
+@capture.route('/handled', methods=['POST'])
+@capture.route('/organized', methods=['POST'])
+def bulk_triage_capture_entries():
+    """Mark many entries handled or organized at once.
+
+    The body is ``{"ids": [...]}`` for a per-id outcome, or ``{"filter": {...}}`` with
+    the listing filters (``handled``, ``organized``, ``created_from``, ``created_to``)
+    to update matching entries and get back a count; an empty filter is rejected. A
+    filter updates at most ``CAPTURE_TRIAGE_MAX_IDS`` entries per request and answers
+    ``"more": true`` while matching entries are left, so repeat it until that is
+    false. Organizing creates one task per changed entry, optionally in ``project_id``.
+    """
+    action = request.path.rstrip('/').rsplit('/', 1)[-1]
+    data = request.get_json(silent=True)
+    try:
+        body = bulk_triage(data, action, db.session, current_app.config['CAPTURE_TRIAGE_MAX_IDS'])
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception:
+        db.session.rollback()
+        logger.exception('Bulk triage failed', extra={'action': action})
+        return jsonify({'error': 'Bulk triage failed'}), 500
+    if action == 'organized' and body['updated']:
+        invalidate_tasks(data.get('project_id'))
+    logger.info('Capture entries triaged', extra={'action': action, 'updated_count': body['updated']})
+    return jsonify(body)
+
+def bulk_triage(data, action, session, max_ids):
+    """Validate a bulk triage request body and apply it in ``session``.
+
+    Raises ``ValueError`` for an invalid body; the caller commits. Shared with the
+    async API in ``app.capture.async_routes``.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Request must be a JSON object')
+
+    project_id = data.get('project_id')
+    if project_id is not None:
+        if action != 'organized':
+            raise ValueError('project_id only applies when organizing')
+        if not isinstance(project_id, int) or session.get(Project, project_id) is None:
+            raise ValueError('Invalid project ID')
+
+    ids, conditions = selection(CaptureEntry, data, max_ids, _json_capture_filters)
+    if ids is not None:
+        outcomes = triage_ids(ids, action, project_id, session=session)
+        body = {'results': [dict(outcome, id=entry_id) for entry_id, outcome in outcomes.items()]}
+        body['updated'] = sum(1 for outcome in outcomes.values() if outcome['status'] == 'updated')
+    else:
+        updated, more = triage_matching(conditions, action, max_ids, project_id, session=session)
+        body = {'updated': updated, 'more': more}
+    return body
+
+@capture.route('/archive', methods=['GET'])
+def get_archived_entries():
+    """Archived capture entries as JSON.
+
+    Without ``q`` the archive is listed by id and paged with ``limit``/``cursor``.
+    With ``q`` the entries matching that full-text query are returned best match
+    first, paged with ``limit``/``offset``. ``fields`` selects a subset of the keys.
+    """
+    args = request.args
+    try:
+        fields = parse_fields(args.get('fields'), ARCHIVE_JSON_FIELDS)
+        columns = [getattr(CaptureArchive, name) for name in dict.fromkeys([*fields, 'id'])]
+        query = args.get('q', '').strip()
+        if not query:
+            limit = parse_limit(args.get('limit'), current_app.config['CAPTURE_PAGE_SIZE'],
+                                current_app.config['CAPTURE_PAGE_SIZE_MAX'])
+            rows, next_cursor = keyset_page(select(*columns), [CaptureArchive.id], args.get('cursor'), limit)
+            next_args = dict(args, cursor=next_cursor) if next_cursor else None
+        else:
+            limit = parse_limit(args.get('limit'), current_app.config['SEARCH_PAGE_SIZE'],
+                                current_app.config['SEARCH_PAGE_SIZE_MAX'])
+            offset = max(0, int(args.get('offset', 0)))
+            hits = run_search(query, (ARCHIVE_KIND,), limit=limit + 1, offset=offset)
+            ids = [hit['id'] for hit in hits[:limit]]
+            found = {row.id: row for row in db.session.execute(select(*columns).where(CaptureArchive.id.in_(ids)))}
+            rows = [found[entry_id] for entry_id in ids if entry_id in found]
+            next_args = dict(args, offset=offset + limit) if len(hits) > limit else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except NotImplementedError as e:
+        return jsonify({'error': str(e)}), 501
+
+    response = json_response(row_dicts(rows, fields))
+    if next_args:
+        response.headers['Link'] = f'<{url_for("capture.get_archived_entries", **next_args)}>; rel="next"'
+    return response
+
+@capture.route('/archive/export', methods=['GET'])
+def export_archived_entries():
+    """Stream the whole archive; ``format`` is ``json``, ``ndjson``, ``csv`` or ``csv.gz``."""
+    try:
+        statement = select(*(getattr(CaptureArchive, name) for name in ARCHIVE_JSON_FIELDS)).order_by(CaptureArchive.id)
+        return export_response(statement, request.args.get('format', 'json'), 'capture_archive')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@capture.cli.command('archive')
+@click.option('--older-than-days', type=float, default=None,
+              help='Archive entries processed longer ago than this (default: CAPTURE_ARCHIVE_AFTER_DAYS).')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches.')
+def archive_command(older_than_days, max_batches):
+    """Move processed capture entries to the archive table."""
+    config = current_app.config
+    if older_than_days is None:
+        older_than_days = config['CAPTURE_ARCHIVE_AFTER_DAYS']
+    archived = archive_processed(timedelta(days=older_than_days), config['CAPTURE_ARCHIVE_BATCH_SIZE'],
+                                 config['CAPTURE_ARCHIVE_PAUSE'], max_batches)
+    click.echo(f'Archived {archived} capture entries.')
@@ -0,0 +1,132 @@
+"""Set-based triage of capture entries.
+
+Marking entries handled or organized is done with one ``UPDATE ... WHERE`` for the
+whole selection rather than a load/mutate/commit per entry. Organizing also creates a
+``Task`` for every entry it changes, in the same transaction; the ``UPDATE`` itself
+decides which entries those are, so concurrent requests cannot both organize one.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import false, insert, select, update
+
+from app import db
+from app.capture.models import CaptureEntry
+from app.projects.models import DEFAULT_TASK_PRIORITY, Task
+from app.tasks.queue import append_ranks
+
+ACTIONS = ('handled', 'organized')
+TASK_CONTENT_LENGTH = Task.__table__.c.content.type.length
+
+
+def _flag(action):
+    if action not in ACTIONS:
+        raise ValueError(f'Invalid action: {action!r}')
+    return getattr(CaptureEntry, action)
+
+
+def _claim(session, action, conditions, now):
+    """Set ``action`` on the entries matching ``conditions`` that do not have it yet.
+
+    Returns the ``(id, content)`` rows this call changed, in id order. The flag is
+    checked by the ``UPDATE`` itself, so of two concurrent calls only one gets each
+    entry. Where the database cannot return rows from an ``UPDATE``, the rows are
+    locked with ``SELECT ... FOR UPDATE`` first.
+    """
+    target = [_flag(action) == false(), *conditions]
+    values = {action: True, 'processed_at': now}
+    options = {'synchronize_session': False}
+    if session.get_bind().dialect.update_returning:
+        statement = update(CaptureEntry).where(*target).values(values)
+        rows = session.execute(statement.returning(CaptureEntry.id, CaptureEntry.content),
+                               execution_options=options).all()
+    else:
+        rows = session.execute(
+            select(CaptureEntry.id, CaptureEntry.content).where(*target).with_for_update()
+        ).all()
+        if rows:
+            session.execute(
+                update(CaptureEntry).where(CaptureEntry.id.in_([row[0] for row in rows])).values(values),
+                execution_options=options,
+            )
+    return sorted(rows)
+
+
+def triage_ids(ids, action, project_id=None, session=None):
+    """Apply ``action`` to the entries in ``ids`` and return a per-id outcome.
+
+    Outcomes are ``{'status': 'updated'}`` (plus ``task_id`` when organizing),
+    ``{'status': 'unchanged'}`` for entries already in that state and
+    ``{'status': 'not_found'}``. Only the entries this call changed get a task, so
+    concurrent calls never organize an entry twice. ``session`` defaults to
+    ``db.session``; the caller commits.
+    """
+    if session is None:
+        session = db.session
+    ids = list(dict.fromkeys(ids))
+    now = datetime.utcnow()
+    claimed = _claim(session, action, [CaptureEntry.id.in_(ids)], now)
+    task_ids = {}
+    if claimed and action == 'organized':
+        ranks = append_ranks('open', DEFAULT_TASK_PRIORITY, len(claimed), session=session)
+        task_ids = _create_tasks(session, claimed, project_id, now, ranks)
+
+    updated = {row[0] for row in claimed}
+    others = [entry_id for entry_id in ids if entry_id not in updated]
+    existing = set()
+    if others:
+        existing = set(session.execute(select(CaptureEntry.id).where(CaptureEntry.id.in_(others))).scalars())
+
+    outcomes = {}
+    for entry_id in ids:
+        if entry_id in updated:
+            outcomes[entry_id] = {'status': 'updated'}
+            if entry_id in task_ids:
+                outcomes[entry_id]['task_id'] = task_ids[entry_id]
+        elif entry_id in existing:
+            outcomes[entry_id] = {'status': 'unchanged'}
+        else:
+            outcomes[entry_id] = {'status': 'not_found'}
+    return outcomes
+
+
+def _create_tasks(session, entries, project_id, now, ranks):
+    rows = [
+        {'content': content[:TASK_CONTENT_LENGTH], 'project_id': project_id, 'updated_at': now, 'rank': rank}
+        for (_, content), rank in zip(entries, ranks)
+    ]
+    statement = insert(Task)
+    if getattr(session.get_bind().dialect, 'insert_executemany_returning_sort_by_parameter_order', False):
+        result = session.execute(statement.returning(Task.id, sort_by_parameter_order=True), rows)
+        return {entry[0]: task_id for entry, task_id in zip(entries, result.scalars())}
+    session.execute(statement, rows)
+    return {}
+
+
+def triage_matching(conditions, action, limit, project_id=None, session=None):
+    """Apply ``action`` to the first ``limit`` entries, by id, matching ``conditions``.
+
+    Returns ``(updated, more)``: the number of entries changed and whether matching
+    entries are left for another call. When organizing, the ``UPDATE`` returns the
+    entries it flagged and a task is created for each of those only; the tasks share
+    one rank at the end of the next-actions queue and keep id order among themselves.
+    The caller commits.
+    """
+    if session is None:
+        session = db.session
+    pending = [_flag(action) == false(), *conditions]
+    batch = CaptureEntry.id.in_(select(CaptureEntry.id).where(*pending).order_by(CaptureEntry.id).limit(limit))
+    now = datetime.utcnow()
+    if action == 'organized':
+        rank = append_ranks('open', DEFAULT_TASK_PRIORITY, session=session)[0]
+        claimed = _claim(session, action, [batch], now)
+        if claimed:
+            _create_tasks(session, claimed, project_id, now, [rank] * len(claimed))
+        updated = len(claimed)
+    else:
+        updated = session.execute(
+            update(CaptureEntry).where(_flag(action) == false(), batch).values({action: True, 'processed_at': now}),
+            execution_options={'synchronize_session': False},
+        ).rowcount
+    more = updated >= limit and session.execute(select(CaptureEntry.id).where(*pending).limit(1)).first() is not None
+    return updated, more
@@ -0,0 +1,83 @@
+"""Conditional GET for list endpoints.
+
+A list's validators are derived from ``max(updated_at)`` and ``count(*)`` of the tables
+it is built from, read in a single aggregate query. Any insert or update moves the
+maximum timestamp and any delete changes the count, so an unchanged pair means the
+list is unchanged and the view can answer ``304 Not Modified`` without loading rows.
+Only the ETag carries both; ``Last-Modified`` misses deletes, so it never yields a 304.
+"""
+
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from flask import current_app, g, make_response, request
+from sqlalchemy import func, select
+
+from app import db
+
+
+def list_state(*models):
+    """Return ``(max_updated_at, total_count)`` over ``models`` in one query."""
+    columns = []
+    for model in models:
+        columns.append(select(func.max(model.updated_at)).scalar_subquery())
+        columns.append(select(func.count()).select_from(model).scalar_subquery())
+    row = db.session.execute(select(*columns)).one()
+    timestamps = [value for value in row[0::2] if value is not None]
+    return (max(timestamps) if timestamps else None), sum(row[1::2])
+
+
+def list_version():
+    """The state ``conditional_list`` read for this request, as a cache version."""
+    return g.get('list_version')
+
+
+def _etag(last_updated, count):
+    key = '|'.join([
+        current_app.config.get('ETAG_VERSION', ''),
+        request.endpoint or '',
+        request.query_string.decode('latin-1'),
+        request.headers.get('Accept', ''),
+        last_updated.isoformat() if last_updated else '',
+        str(count),
+    ])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _not_modified(etag):
+    # If-Modified-Since alone is not honoured: a delete leaves max(updated_at), and so
+    # Last-Modified, where it was, and only the count in the ETag notices it.
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
+
+def conditional_list(*models):
+    """Decorate a list view so that it honours ``If-None-Match``.
+
+    ``Last-Modified`` is sent for information; ``If-Modified-Since`` gets a full response.
+
+    ``models`` are every model whose rows the view renders; each needs an indexed
+    ``updated_at`` column.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            last_updated, count = list_state(*models)
+            g.list_version = f"{last_updated.isoformat() if last_updated else ''}|{count}"
+            etag = _etag(last_updated, count)
+            last_modified = last_updated.replace(tzinfo=timezone.utc) if last_updated else None
+
+            if _not_modified(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Accept')
+            return response
+        return wrapper
+    return decorator
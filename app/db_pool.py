@@ -0,0 +1,127 @@
+"""Connection pool instrumentation.
+
+``InstrumentedQueuePool`` is a ``QueuePool`` that also records how many checkouts it
+served, how long callers waited for a connection, how often they timed out and how
+long connections stayed checked out, so pool and gunicorn worker sizing can be based
+on measurements.
+"""
+
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+
+class PoolStats:
+    """Thread-safe counters for one pool.
+
+    ``checked_out`` and ``checked_in`` are the pool's checkout and checkin listeners.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.checkins = 0
+        self.hold_seconds_total = 0.0
+        self.hold_seconds_max = 0.0
+
+    def waited(self, seconds, timed_out=False):
+        with self._lock:
+            self.waits += 1
+            if timed_out:
+                self.timeouts += 1
+            self.wait_seconds_total += seconds
+            if seconds > self.wait_seconds_max:
+                self.wait_seconds_max = seconds
+
+    def checked_out(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checked_out_at'] = time.perf_counter()
+        with self._lock:
+            self.checkouts += 1
+
+    def checked_in(self, dbapi_connection, connection_record):
+        started = connection_record.info.pop('checked_out_at', None)
+        if started is None:
+            return
+        held = time.perf_counter() - started
+        with self._lock:
+            self.checkins += 1
+            self.hold_seconds_total += held
+            if held > self.hold_seconds_max:
+                self.hold_seconds_max = held
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_ms_total': round(self.wait_seconds_total * 1000, 3),
+                'wait_ms_avg': round(self.wait_seconds_total * 1000 / self.waits, 3) if self.waits else 0.0,
+                'wait_ms_max': round(self.wait_seconds_max * 1000, 3),
+                'hold_ms_avg': round(self.hold_seconds_total * 1000 / self.checkins, 3) if self.checkins else 0.0,
+                'hold_ms_max': round(self.hold_seconds_max * 1000, 3),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """``QueuePool`` that times every checkout."""
+
+    # Log under SQLAlchemy's own pool logger rather than the ``app`` namespace.
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.QueuePool'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        for name, listener in self._listeners():
+            event.listen(self, name, listener)
+
+    def _listeners(self):
+        return (('checkout', self.stats.checked_out), ('checkin', self.stats.checked_in))
+
+    def connect(self):
+        # The checkout event only fires once a connection is in hand, so the wait is
+        # timed around the whole call.
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.waited(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.waited(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() replaces the pool with one that copies this pool's listeners,
+        # so it keeps counting into these stats rather than adding listeners of its own.
+        pool = super().recreate()
+        for name, listener in pool._listeners():
+            event.remove(pool, name, listener)
+        pool.stats = self.stats
+        return pool
+
+
+def pool_stats(engine, engine_options=None):
+    """Return the current state of ``engine``'s pool as a dict.
+
+    ``engine_options`` is the SQLALCHEMY_ENGINE_OPTIONS the engine was created with.
+    """
+    pool = engine.pool
+    data = {'pool': pool.__class__.__name__, 'status': pool.status()}
+    if isinstance(pool, QueuePool):
+        data.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            # QueuePool counts overflow from -pool_size until the pool is full.
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': (engine_options or {}).get('max_overflow'),
+        })
+    stats = getattr(pool, 'stats', None)
+    if stats is not None:
+        data.update(stats.snapshot())
+    return data
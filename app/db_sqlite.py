@@ -0,0 +1,109 @@
+"""SQLite connection profiles.
+
+SQLite's defaults (rollback journal, ``synchronous=FULL``, no busy timeout) make every
+writer lock the whole file, so several gunicorn workers sharing one database fail with
+``database is locked`` as soon as two requests write at once. The ``concurrent``
+profile switches the database to WAL, where readers never block the writer and vice
+versa, and makes a blocked writer wait instead of failing.
+
+Pragmas are applied to every new DBAPI connection from a ``connect`` event. WAL mode
+is stored in the database file; the other settings are per connection.
+"""
+
+import logging
+import threading
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+SQLITE_PROFILES = {
+    # Leave SQLite's defaults untouched.
+    'default': {},
+    'concurrent': {
+        'journal_mode': 'WAL',
+        # In WAL mode NORMAL only syncs at checkpoints: a power loss can drop the last
+        # commits but never corrupts the database.
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        # Negative means KiB: a 64 MiB page cache per connection.
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 1000,
+    },
+}
+
+
+def sqlite_pragmas(profile, busy_timeout_ms=None):
+    """Return the pragmas of ``profile``, with an optional busy timeout override."""
+    if profile not in SQLITE_PROFILES:
+        raise RuntimeError(f"Invalid SQLITE_PROFILE: {profile!r} (expected one of {', '.join(SQLITE_PROFILES)})")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    if busy_timeout_ms is not None:
+        pragmas['busy_timeout'] = busy_timeout_ms
+    return pragmas
+
+
+def apply_sqlite_profile(engine, pragmas):
+    """Run ``pragmas`` on every connection ``engine`` opens from now on."""
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+class Checkpointer:
+    """Periodically checkpoint the WAL so it does not grow while readers are active.
+
+    ``wal_autocheckpoint`` only runs on commit and gives up while a reader holds an old
+    snapshot; a timed ``PASSIVE`` checkpoint catches up once readers move on, without
+    blocking anyone.
+    """
+
+    def __init__(self, engine, interval, mode='PASSIVE'):
+        self.engine = engine
+        self.interval = interval
+        self.mode = mode
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sqlite-checkpoint', daemon=True)
+        self.last_result = None
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def checkpoint(self):
+        with self.engine.connect() as connection:
+            # (busy, wal pages, pages checkpointed)
+            self.last_result = tuple(connection.exec_driver_sql(f'PRAGMA wal_checkpoint({self.mode})').one())
+        return self.last_result
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.checkpoint()
+            except Exception:
+                logger.warning('WAL checkpoint failed', exc_info=True)
+
+
+def configure_sqlite(app, engine):
+    """Apply the app's SQLITE_PROFILE to ``engine`` and start its checkpointer."""
+    if engine.dialect.name != 'sqlite':
+        return None
+    pragmas = sqlite_pragmas(app.config.get('SQLITE_PROFILE', 'default'), app.config.get('SQLITE_BUSY_TIMEOUT_MS'))
+    apply_sqlite_profile(engine, pragmas)
+    interval = app.config.get('SQLITE_CHECKPOINT_INTERVAL')
+    if pragmas.get('journal_mode') == 'WAL' and interval:
+        return Checkpointer(engine, interval, app.config.get('SQLITE_CHECKPOINT_MODE', 'PASSIVE')).start()
+    return None
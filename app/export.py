@@ -0,0 +1,128 @@
+"""Streaming exports shared by the blueprints.
+
+Rows are read in batches through ``yield_per`` (a server-side cursor on Postgres) and
+written to the client as they arrive, so an export of any size runs in bounded memory
+and the first bytes go out before the last row has been read.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+from flask import Response, stream_with_context
+
+from app import db
+
+EXPORT_FORMATS = ('json', 'ndjson', 'csv', 'csv.gz')
+YIELD_PER = 1000
+FLUSH_SIZE = 64 * 1024
+
+_MIMETYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'csv.gz': 'application/gzip',
+}
+
+
+def json_default(value):
+    """``json.dumps`` hook that writes dates and datetimes as ISO-8601."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {value.__class__.__name__} is not JSON serializable')
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _iter_rows(statement):
+    result = db.session.execute(statement.execution_options(yield_per=YIELD_PER))
+    try:
+        for partition in result.partitions():
+            for row in partition:
+                yield row
+    finally:
+        result.close()
+
+
+def _buffered(pieces):
+    """Coalesce many small string pieces into chunks of roughly ``FLUSH_SIZE`` bytes."""
+    buf = []
+    size = 0
+    for piece in pieces:
+        buf.append(piece)
+        size += len(piece)
+        if size >= FLUSH_SIZE:
+            yield ''.join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf)
+
+
+def _json_pieces(rows, keys):
+    yield '['
+    separator = ''
+    for row in rows:
+        yield separator + json.dumps(dict(zip(keys, row)), default=json_default, separators=(',', ':'))
+        separator = ','
+    yield ']\n'
+
+
+def _ndjson_pieces(rows, keys):
+    for row in rows:
+        yield json.dumps(dict(zip(keys, row)), default=json_default, separators=(',', ':')) + '\n'
+
+
+def _csv_pieces(rows, keys):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(keys)
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+        if out.tell() >= FLUSH_SIZE:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(statement, fmt, filename):
+    """Stream the rows of a Core ``select`` as a download in format ``fmt``.
+
+    The column labels of ``statement`` become the JSON keys and the CSV header.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid format: {fmt!r} (expected one of {', '.join(EXPORT_FORMATS)})")
+    keys = [column.key for column in statement.selected_columns]
+
+    def generate():
+        rows = _iter_rows(statement)
+        if fmt == 'json':
+            chunks = _buffered(_json_pieces(rows, keys))
+        elif fmt == 'ndjson':
+            chunks = _buffered(_ndjson_pieces(rows, keys))
+        else:
+            chunks = _csv_pieces(rows, keys)
+        if fmt == 'csv.gz':
+            chunks = _gzip(chunks)
+        for chunk in chunks:
+            yield chunk
+
+    response = Response(stream_with_context(generate()), mimetype=_MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
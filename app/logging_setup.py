@@ -0,0 +1,159 @@
+"""Application-wide logging.
+
+Records from the ``app`` logger namespace (``app.logger`` and every module logger under
+``app.``) are formatted as one JSON object per line, tagged with the id of the request
+that produced them, and handed to a ``QueueHandler``. A single ``QueueListener`` thread
+per process does the actual I/O, so request handlers never block on stdout.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app, g, has_request_context, request
+
+LOGGER_NAME = 'app'
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Attributes every LogRecord has; anything else was passed through ``extra=``.
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_listener = None
+_listener_pid = None
+_traceback_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as a single-line JSON object."""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            data['request_id'] = request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc_info'] = record.exc_text
+        return json.dumps(data, default=str, separators=(',', ':'))
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request's correlation id to records logged inside a request."""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """``QueueHandler`` that keeps a record's traceback out of its message.
+
+    The stock ``prepare`` formats the traceback into ``msg`` and clears ``exc_info``,
+    which would leave ``JsonFormatter`` no ``exc_info`` key to write. This one renders
+    the message and the traceback separately, the latter as ``exc_text``, which both
+    formatters print; the traceback object itself does not go on the queue.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def _start_listener(formatter):
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        return _listener
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+    # After a fork the parent's listener thread no longer exists in this process.
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+    _listener_pid = os.getpid()
+    atexit.register(_listener.stop)
+    return _listener
+
+
+def configure_logging(app):
+    """Set up the ``app`` logger for this process and install the request-id hooks on ``app``."""
+    level = app.config.get('LOG_LEVEL', 'INFO')
+    if app.config.get('LOG_FORMAT', 'json') == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    listener = _start_listener(formatter)
+    for handler in listener.handlers:
+        handler.setFormatter(formatter)
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    logger.propagate = False
+    if not any(getattr(handler, 'queue', None) is listener.queue for handler in logger.handlers):
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        queue_handler = StructuredQueueHandler(listener.queue)
+        queue_handler.addFilter(RequestIdFilter())
+        logger.addHandler(queue_handler)
+
+    app.before_request(_assign_request_id)
+    app.after_request(_log_request)
+
+
+def _assign_request_id():
+    incoming = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = incoming[:64] if incoming else uuid.uuid4().hex
+    g.request_started = time.perf_counter()
+
+
+def _log_request(response):
+    response.headers[REQUEST_ID_HEADER] = g.get('request_id', '')
+    started = g.get('request_started')
+    logger = logging.getLogger(LOGGER_NAME)
+    if started is not None and logger.isEnabledFor(logging.INFO):
+        logger.info('request', extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+        })
+    return response
+
+
+def log_payload(logger, message, payload, sample_rate=None):
+    """Log a request payload at DEBUG level for a sampled fraction of calls.
+
+    Nothing is formatted unless DEBUG is enabled for ``logger`` and the call is sampled,
+    so payload dumps cost nothing in production.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if sample_rate is None:
+        sample_rate = current_app.config.get('LOG_PAYLOAD_SAMPLE_RATE', 0.0)
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return
+    logger.debug(message, extra={'payload': payload})
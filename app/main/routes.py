@@ -1,8 +1,50 @@
  # app/main/routes.py
-from flask import render_template
+from flask import current_app, render_template, jsonify
+from app import db
+from app.db_pool import pool_stats
+from app.cache import get_cache
+from app.capture.archive import archive_stats
 from . import main
 
 @main.route('/')
 def index():
     return render_template('index.html')
 
+def _pool_stats():
+    return pool_stats(db.engine, current_app.config.get('SQLALCHEMY_ENGINE_OPTIONS'))
+
+@main.route('/pool-stats')
+def get_pool_stats():
+    return jsonify(_pool_stats())
+
+@main.route('/cache-stats')
+def get_cache_stats():
+    return jsonify(get_cache().stats())
+
+@main.route('/journal-stats')
+def get_journal_stats():
+    journal = current_app.extensions.get('capture_journal')
+    if journal is None:
+        return jsonify({'error': 'The capture journal is disabled'}), 404
+    return jsonify(journal.stats())
+
+def _archive_stats():
+    stats = archive_stats()
+    archiver = current_app.extensions.get('capture_archiver')
+    if archiver is not None:
+        stats.update(archiver.stats())
+    return stats
+
+@main.route('/archive-stats')
+def get_archive_stats():
+    return jsonify(_archive_stats())
+
+@main.route('/metrics')
+def get_metrics():
+    from app.metrics import registry
+    if not current_app.config.get('METRICS_ENABLED'):
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    journal = current_app.extensions.get('capture_journal')
+    body = registry.render(_pool_stats(), get_cache().stats(), journal.stats() if journal else None,
+                           _archive_stats())
+    return current_app.response_class(body, mimetype='text/plain; version=0.0.4; charset=utf-8')
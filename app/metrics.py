@@ -0,0 +1,244 @@
+"""Per-request latency and SQL instrumentation.
+
+Flask request hooks time every request and SQLAlchemy cursor events count the
+statements it issues and the time spent in them. The numbers are aggregated per
+endpoint in process memory and rendered in the Prometheus text format by
+``/metrics``; each gunicorn worker keeps its own registry, so scrape every worker or
+run the exporter behind a single worker.
+
+A request that executes the same statement shape more than
+``METRICS_REPEATED_STATEMENT_THRESHOLD`` times (the signature of a query issued in a
+Python loop) is logged with the offending SQL and counted in
+``app_repeated_statement_requests_total``.
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_WHITESPACE = re.compile(r'\s+')
+# "IN (?, ?, ?)" and friends, so expanding IN lists of any length share one shape.
+_PARAM_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+
+
+def statement_shape(statement):
+    """Normalise a SQL string so that repeats of one query compare equal."""
+    return _PARAM_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            running += count
+            yield bound, running
+
+
+class MetricsRegistry:
+    """Thread-safe per-endpoint request metrics for one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.latency = {}
+        self.queries = {}
+        self.sql_seconds = Counter()
+        self.requests = Counter()
+        self.repeated = Counter()
+
+    def record(self, endpoint, method, status, duration, query_count, sql_seconds, repeated=False):
+        key = (endpoint, method)
+        with self._lock:
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.queries[key] = Histogram(QUERY_BUCKETS)
+            self.latency[key].observe(duration)
+            self.queries[key].observe(query_count)
+            self.sql_seconds[key] += sql_seconds
+            self.requests[(endpoint, method, str(status))] += 1
+            if repeated:
+                self.repeated[key] += 1
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+
+    def render(self, pool=None, cache=None, journal=None, archive=None):
+        """Return every metric in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self._lock:
+            _histogram(lines, 'app_request_duration_seconds', 'Request latency by endpoint.', self.latency)
+            _histogram(lines, 'app_request_queries', 'SQL statements executed per request.', self.queries)
+            _counter(lines, 'app_request_sql_seconds_total', 'Time spent executing SQL.',
+                     self.sql_seconds, ('endpoint', 'method'))
+            _counter(lines, 'app_requests_total', 'Requests served.', self.requests,
+                     ('endpoint', 'method', 'status'))
+            _counter(lines, 'app_repeated_statement_requests_total',
+                     'Requests that repeated one statement shape above the threshold.',
+                     self.repeated, ('endpoint', 'method'))
+        if pool:
+            for name in ('size', 'checked_out', 'overflow'):
+                if name in pool:
+                    lines.append(f'# TYPE app_db_pool_{name} gauge')
+                    lines.append(f'app_db_pool_{name} {pool[name]}')
+            for name in ('checkouts', 'timeouts'):
+                if name in pool:
+                    lines.append(f'# TYPE app_db_pool_{name}_total counter')
+                    lines.append(f'app_db_pool_{name}_total {pool[name]}')
+        if cache:
+            for name in ('hits', 'misses', 'evictions', 'expirations', 'errors'):
+                if name in cache:
+                    lines.append(f'# TYPE app_cache_{name}_total counter')
+                    lines.append(f'app_cache_{name}_total {cache[name]}')
+            if 'entries' in cache:
+                lines.append('# TYPE app_cache_entries gauge')
+                lines.append(f"app_cache_entries {cache['entries']}")
+        if journal:
+            for name in ('backlog_records', 'backlog_bytes', 'oldest_segment_age_s'):
+                lines.append(f'# TYPE app_capture_journal_{name} gauge')
+                lines.append(f'app_capture_journal_{name} {journal[name]}')
+            for name in ('flushed', 'duplicates', 'failures'):
+                lines.append(f'# TYPE app_capture_journal_{name}_total counter')
+                lines.append(f'app_capture_journal_{name}_total {journal[name]}')
+        if archive:
+            for name in ('hot_rows', 'archive_rows', 'oldest_processed_age_s'):
+                lines.append(f'# TYPE app_capture_{name} gauge')
+                lines.append(f'app_capture_{name} {archive[name]}')
+            for name in ('archived', 'failures'):
+                if name in archive:
+                    lines.append(f'# TYPE app_capture_archive_{name}_total counter')
+                    lines.append(f'app_capture_archive_{name}_total {archive[name]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(names, values):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram(lines, name, help_text, histograms):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key, histogram in sorted(histograms.items()):
+        labels = _labels(('endpoint', 'method'), key)
+        for bound, count in histogram.cumulative():
+            lines.append(f'{name}_bucket{{{labels},le="{_number(bound)}"}} {count}')
+        lines.append(f'{name}_sum{{{labels}}} {_number(histogram.total)}')
+        lines.append(f'{name}_count{{{labels}}} {sum(histogram.counts)}')
+
+
+def _counter(lines, name, help_text, values, label_names):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for key, value in sorted(values.items()):
+        lines.append(f'{name}{{{_labels(label_names, key)}}} {_number(value)}')
+
+
+registry = MetricsRegistry()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_shapes' in g:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _statement_finished(conn, statement):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if has_request_context() and 'sql_shapes' in g:
+        g.sql_seconds += elapsed
+        g.sql_shapes[statement_shape(statement)] += 1
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _statement_finished(conn, statement)
+
+
+def _handle_error(context):
+    # A statement that raises gets no after_cursor_execute; without this its start time
+    # would stay on the connection, which outlives the request in the pool.
+    if context.connection is not None and context.statement is not None:
+        _statement_finished(context.connection, context.statement)
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.sql_seconds = 0.0
+    g.sql_shapes = Counter()
+
+
+def _finish_request(response):
+    started = g.get('metrics_started')
+    if started is None:
+        return response
+    duration = time.perf_counter() - started
+    endpoint = request.url_rule.endpoint if request.url_rule else 'unmatched'
+    shapes = g.sql_shapes
+    query_count = sum(shapes.values())
+
+    repeated = False
+    threshold = current_app.config.get('METRICS_REPEATED_STATEMENT_THRESHOLD', 0)
+    if threshold and shapes:
+        shape, count = shapes.most_common(1)[0]
+        if count > threshold:
+            repeated = True
+            logger.warning('repeated statement', extra={
+                'endpoint': endpoint,
+                'statement': shape[:500],
+                'count': count,
+                'query_count': query_count,
+            })
+
+    registry.record(endpoint, request.method, response.status_code, duration, query_count,
+                    g.sql_seconds, repeated)
+
+    if current_app.config.get('SERVER_TIMING'):
+        response.headers.add('Server-Timing', f'app;dur={duration * 1000:.1f}, '
+                                              f'db;dur={g.sql_seconds * 1000:.1f};desc="{query_count} queries"')
+    return response
+
+
+def configure_metrics(app):
+    """Install the request hooks on ``app`` and the cursor events on its engine."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    with app.app_context():
+        engine = db.engine
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
@@ -0,0 +1,117 @@
+"""Keyset (cursor) pagination helpers shared by the blueprints. A page is read with
+``ORDER BY <columns>`` and the cursor holds the ordering values of the last row of
+the previous page, so the database seeks straight to the next page through an index
+instead of counting and skipping rows with OFFSET.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import Date, DateTime, Select, tuple_
+
+from app import db
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor that cannot be decoded."""
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _decode_value(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value)
+    return value
+
+
+def encode_cursor(values):
+    """Encode the ordering values of a row into an opaque, URL-safe cursor."""
+    payload = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Decode a cursor produced by ``encode_cursor`` back into typed column values."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError('cursor does not match the ordering columns')
+        return [_decode_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+
+def keyset_query(query, columns, cursor=None, limit=50):
+    """Narrow ``query`` to the page after ``cursor``, plus one row to detect a next page."""
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        query = query.filter(tuple_(*columns) > tuple_(*values))
+    return query.order_by(*columns).limit(limit + 1)
+
+
+def keyset_result(rows, columns, limit):
+    """Split the rows of a ``keyset_query`` into ``(rows, next_cursor)``."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return rows, next_cursor
+
+
+def keyset_page(query, columns, cursor=None, limit=50):
+    """Fetch one page of ``query`` ordered ascending by ``columns``.
+
+    ``query`` is an ORM ``Query`` or a Core ``select`` that includes ``columns``.
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is ``None`` on the last page.
+    One extra row is fetched to find out whether another page exists.
+    """
+    query = keyset_query(query, columns, cursor, limit)
+    if isinstance(query, Select):
+        rows = db.session.execute(query).all()
+    else:
+        rows = query.all()
+    return keyset_result(rows, columns, limit)
+
+
+def parse_limit(value, default, maximum):
+    """Parse a ``limit`` query argument, clamped to ``1..maximum``."""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid limit: {value!r}")
+    return max(1, min(limit, maximum))
+
+
+def parse_bool(value):
+    """Parse a boolean query argument; ``None`` means the filter is not applied."""
+    if value in (None, '', 'any', 'all'):
+        return None
+    lowered = value.lower()
+    if lowered in ('1', 'true', 'yes', 'on'):
+        return True
+    if lowered in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError(f"Invalid boolean value: {value!r}")
+
+
+def parse_datetime(value, name):
+    """Parse an ISO-8601 date or datetime query argument."""
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value!r} (expected ISO-8601)")
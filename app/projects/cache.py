@@ -0,0 +1,25 @@
+"""Cache keys for the project and task listings and the writes that invalidate them."""
+
+from app.cache import invalidate
+
+PROJECTS_PAGE = 'projects:page'
+PROJECTS_API = 'projects:api'
+TASKS_PAGE = 'tasks:page'
+
+
+def project_tasks_key(project_id):
+    return f'projects:{project_id}:tasks'
+
+
+def invalidate_projects(*project_ids):
+    """Call after committing an insert, update or delete of projects."""
+    invalidate(PROJECTS_PAGE, PROJECTS_API, *(project_tasks_key(project_id) for project_id in project_ids))
+
+
+def invalidate_tasks(*project_ids):
+    """Call after committing a change to tasks belonging to ``project_ids``.
+
+    The projects page is included because it shows each project's task count.
+    """
+    invalidate(TASKS_PAGE, PROJECTS_PAGE,
+               *(project_tasks_key(project_id) for project_id in project_ids if project_id))
@@ -0,0 +1,96 @@
+"""What the database does to the tasks of a deleted project.
+
+``PROJECT_DELETE_TASKS`` ('set-null' or 'cascade') picks the rule. On Postgres it is
+the ON DELETE action of task.project_id's foreign key. SQLite can only change a
+foreign key by rebuilding task, which would drop its search, change log and agenda
+triggers, and the app does not enable SQLite's foreign key enforcement, so there an
+AFTER DELETE trigger on project applies the rule instead.
+
+Detached tasks get a new updated_at, as the ETags of the task lists depend on it: in
+the SQLite trigger itself, on Postgres from a BEFORE UPDATE trigger on task, which
+the SET NULL action fires.
+
+Migration 7c1e4b9d2a58 installs the rule; ``flask projects delete-rule`` switches an
+existing database to the configured one.
+"""
+
+import sqlalchemy as sa
+
+from app.projects.models import TASK_ON_PROJECT_DELETE
+
+# Same format as the timestamps SQLAlchemy writes, so max(updated_at) compares them right.
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000'"
+SQLITE_TRIGGERS = {
+    'set-null': f'UPDATE task SET project_id = NULL, updated_at = {SQLITE_NOW} WHERE project_id = old.id',
+    'cascade': 'DELETE FROM task WHERE project_id = old.id',
+}
+FOREIGN_KEY = 'task_project_id_fkey'
+
+
+def _check(mode):
+    if mode not in TASK_ON_PROJECT_DELETE:
+        raise RuntimeError(f"Invalid PROJECT_DELETE_TASKS: {mode!r} (expected one of {', '.join(TASK_ON_PROJECT_DELETE)})")
+
+
+def _replace_foreign_key(bind, action):
+    # Its name depends on which early revision created it, and 4c976d2c62d2 may have
+    # added a second one.
+    for foreign_key in sa.inspect(bind).get_foreign_keys('task'):
+        if foreign_key['referred_table'] == 'project' and foreign_key['constrained_columns'] == ['project_id']:
+            bind.execute(sa.text(f'ALTER TABLE task DROP CONSTRAINT "{foreign_key["name"]}"'))
+    on_delete = f' ON DELETE {action}' if action else ''
+    # NOT VALID skips the scan of existing rows; validate_foreign_key does it later.
+    bind.execute(sa.text(
+        f'ALTER TABLE task ADD CONSTRAINT {FOREIGN_KEY} FOREIGN KEY (project_id) '
+        f'REFERENCES project (id){on_delete} NOT VALID'
+    ))
+
+
+def install_rule(bind, mode):
+    """Make deleting a project apply ``mode`` to its tasks; see ``remove_rule``."""
+    _check(mode)
+    dialect = bind.dialect.name
+    if dialect == 'sqlite':
+        bind.execute(sa.text(f'CREATE TRIGGER project_tasks_ad AFTER DELETE ON project BEGIN {SQLITE_TRIGGERS[mode]}; END'))
+    elif dialect == 'postgresql':
+        _replace_foreign_key(bind, TASK_ON_PROJECT_DELETE[mode])
+        if mode == 'set-null':
+            bind.execute(sa.text(
+                "CREATE FUNCTION task_touch_detached() RETURNS trigger AS $$ "
+                "BEGIN NEW.updated_at := clock_timestamp() AT TIME ZONE 'utc'; RETURN NEW; END "
+                "$$ LANGUAGE plpgsql"
+            ))
+            bind.execute(sa.text(
+                "CREATE TRIGGER task_touch_detached BEFORE UPDATE OF project_id ON task FOR EACH ROW "
+                "WHEN (OLD.project_id IS NOT NULL AND NEW.project_id IS NULL) "
+                "EXECUTE PROCEDURE task_touch_detached()"
+            ))
+
+
+def remove_rule(bind):
+    """Undo ``install_rule``: deleting a project leaves its tasks alone again."""
+    dialect = bind.dialect.name
+    if dialect == 'sqlite':
+        bind.execute(sa.text('DROP TRIGGER IF EXISTS project_tasks_ad'))
+    elif dialect == 'postgresql':
+        bind.execute(sa.text('DROP TRIGGER IF EXISTS task_touch_detached ON task'))
+        bind.execute(sa.text('DROP FUNCTION IF EXISTS task_touch_detached()'))
+        _replace_foreign_key(bind, None)
+
+
+def replace_rule(bind, mode):
+    """Switch an installed rule to ``mode``; the foreign key still needs validating."""
+    _check(mode)
+    remove_rule(bind)
+    install_rule(bind, mode)
+
+
+def validate_foreign_key(bind):
+    """Check the existing rows against the foreign key added NOT VALID.
+
+    Run it in a transaction of its own: the check then holds only a SHARE UPDATE
+    EXCLUSIVE lock on task, which lets reads and writes through, instead of the ACCESS
+    EXCLUSIVE lock that replacing the key took.
+    """
+    if bind.dialect.name == 'postgresql':
+        bind.execute(sa.text(f'ALTER TABLE task VALIDATE CONSTRAINT {FOREIGN_KEY}'))
@@ -1,16 +1,52 @@
 from app import db
+from config import Config
+from datetime import datetime
+
+# Keys of the JSON project and task objects, in output order; ``?fields=`` selects a subset.
+PROJECT_FIELDS = ('id', 'name', 'description', 'status', 'due_date')
+TASK_FIELDS = ('id', 'content', 'project_id', 'status', 'priority', 'rank', 'due_date')
+
+# Task states; only 'open' tasks are next actions.
+TASK_STATUSES = ('open', 'waiting', 'someday', 'done')
+# 0 is the most urgent; the next-actions queue is ordered by priority, then rank.
+TASK_PRIORITIES = (0, 1, 2, 3)
+DEFAULT_TASK_PRIORITY = 2
+# Project statuses are free text; these (compared case-insensitively) are not on the agenda.
+PROJECT_CLOSED_STATUSES = ('done', 'completed', 'cancelled')
+# PROJECT_DELETE_TASKS -> ON DELETE action of task.project_id (installed by migration 7c1e4b9d2a58).
+TASK_ON_PROJECT_DELETE = {'set-null': 'SET NULL', 'cascade': 'CASCADE'}
+
+def _task_on_project_delete():
+    mode = Config.PROJECT_DELETE_TASKS
+    if mode not in TASK_ON_PROJECT_DELETE:
+        raise RuntimeError(f"Invalid PROJECT_DELETE_TASKS: {mode!r} (expected one of {', '.join(TASK_ON_PROJECT_DELETE)})")
+    return TASK_ON_PROJECT_DELETE[mode]
 
 class Project(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
     description = db.Column(db.Text)
     status = db.Column(db.String(64))
-    due_date = db.Column(db.Date)
-    tasks = db.relationship('Task', backref='project', lazy=True)
+    due_date = db.Column(db.Date, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # The database detaches or deletes the tasks of a deleted project (the ON DELETE rule
+    # chosen by PROJECT_DELETE_TASKS), so the ORM neither loads nor updates them.
+    tasks = db.relationship('Task', backref='project', lazy=True, passive_deletes='all')
 
 class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.String(256), nullable=False)
-    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete=_task_on_project_delete()),
+                           nullable=True, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    status = db.Column(db.String(16), nullable=False, default='open', server_default='open')
+    priority = db.Column(db.SmallInteger, nullable=False, default=DEFAULT_TASK_PRIORITY,
+                         server_default=str(DEFAULT_TASK_PRIORITY))
+    # Fractional sort key within a (status, priority) bucket, see app.ranking.
+    rank = db.Column(db.String(255).with_variant(db.String(255, collation='C'), 'postgresql'), nullable=False)
+    due_date = db.Column(db.Date, index=True)
+
+    # The next-actions queue is one range scan of this index.
+    __table_args__ = (db.Index('ix_task_next_actions', 'status', 'priority', 'rank', 'id'),)
     # Remove the 'project' relationship defined in Task as it is already defined via the backref in Project
     # other fields...
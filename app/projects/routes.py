@@ -1,26 +1,33 @@
-from flask import request, jsonify, render_template
+from flask import current_app, request, jsonify, render_template, url_for
 from app.projects import projects
-from app.projects.models import db, Project, Task
-import os
+from app.projects.models import db, Project, Task, PROJECT_FIELDS, TASK_FIELDS
+from app.projects.cache import PROJECTS_API, PROJECTS_PAGE, invalidate_projects, invalidate_tasks, project_tasks_key
+from app.cache import cached
+from app.serialization import json_response, parse_fields, row_dicts
+from app.logging_setup import log_payload
+from app.export import export_response
+from app.conditional import conditional_list, list_version
+from app.pagination import keyset_page, parse_limit
+from app.bulk_delete import delete_matching, selection
+from app.projects.delete_rule import replace_rule, validate_foreign_key
+from app.tasks.queue import LIST_ORDER
+from sqlalchemy import func, select
+import click
 import json
+import logging
 from datetime import datetime
 
-print("Loading projects routes...")  # Debug print statement
+logger = logging.getLogger(__name__)
 
 @projects.route('/', methods=['POST'])
 @projects.route('', methods=['POST'])
 def add_project():
-    print("POST request received")  # Debug print statement
-    print(f"Request Content-Type: {request.content_type}")  # Debug print statement
-    print(f"Request data: {request.data}")  # Debug print statement
-    print(f"Request form data: {request.form}")  # Debug print statement
-
     if request.is_json:
         try:
             data = json.loads(request.data.decode('utf-8'))
-            print(f"Manually parsed JSON data: {data}")  # Debug print statement
+            log_payload(logger, 'Project payload', data)
         except Exception as e:
-            print(f"Error manually parsing JSON: {e}")  # Debug print statement
+            logger.info('Project rejected: invalid JSON', extra={'error': str(e)})
             return jsonify({'error': f"Error manually parsing JSON: {e}"}), 400
 
         name = data.get('name')
@@ -32,7 +39,7 @@ def add_project():
             try:
                 due_date = datetime.strptime(due_date_str, '%Y-%m-%d').date()
             except ValueError as e:
-                print(f"Error parsing due_date: {e}")  # Debug print statement
+                logger.info('Project rejected: invalid due_date', extra={'error': str(e)})
                 return jsonify({'error': f"Error parsing due_date: {e}"}), 400
         else:
             due_date = None
@@ -41,45 +48,186 @@ def add_project():
             project = Project(name=name, description=description, status=status, due_date=due_date)
             db.session.add(project)
             db.session.commit()
-            print("Project added to database")  # Debug print statement
+            invalidate_projects()
+            logger.info('Project added')
             return jsonify({'message': 'Project added successfully!'}), 201
-        print("Name is required")  # Debug print statement
+        logger.info('Project rejected: name is required')
         return jsonify({'error': 'Name is required!'}), 400
 
-    print("Request must be JSON")  # Debug print statement
+    logger.info('Project rejected: request must be JSON')
     return jsonify({'error': 'Request must be JSON'}), 400
 
 @projects.route('/', methods=['GET'])
 @projects.route('', methods=['GET'])
+@conditional_list(Project, Task)
 def get_projects():
     try:
-        print("GET request received")  # Debug print statement
-        projects = Project.query.all()
-        for project in projects:
-            project.tasks = Task.query.filter_by(project_id=project.id).all()
-        print(f"Projects retrieved: {[project.name for project in projects]}")  # Debug print statement
+        projects = cached(PROJECTS_PAGE, _load_projects_page, version=list_version())
+        logger.debug('Projects retrieved', extra={'count': len(projects)})
         return render_template('projects.html', projects=projects)
     except Exception as e:
-        print(f"Error retrieving projects: {e}")  # Debug print statement
+        logger.exception('Error retrieving projects')
         return str(e), 500
 
+def _load_projects_page():
+    # One grouped query for projects and their task counts; the task lists
+    # themselves are fetched per project by the page when a project is expanded.
+    rows = db.session.execute(
+        select(*_project_columns(), func.count(Task.id).label('task_count'))
+        .outerjoin(Task, Task.project_id == Project.id)
+        .group_by(Project.id)
+        .order_by(Project.id)
+    ).mappings()
+    return [_plain_project(row) for row in rows]
+
+def _project_columns():
+    return [getattr(Project, name) for name in PROJECT_FIELDS]
+
+def _plain_project(row):
+    # Cached values must survive a JSON round trip through a shared cache unchanged.
+    project = dict(row)
+    project['due_date'] = project['due_date'].isoformat() if project['due_date'] else None
+    return project
+
+@projects.route('/<int:id>/tasks', methods=['GET'])
+@conditional_list(Project, Task)
+def get_project_tasks(id):
+    try:
+        fields = parse_fields(request.args.get('fields'), TASK_FIELDS)
+        tasks = cached(project_tasks_key(id), lambda: _load_project_tasks(id), version=list_version())
+        if tasks is None:
+            return jsonify({'error': 'Project not found'}), 404
+        return json_response(row_dicts(tasks, fields))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.exception('Error retrieving project tasks', extra={'project_id': id})
+        return jsonify({'error': str(e)}), 500
+
+def _load_project_tasks(id):
+    if db.session.query(Project.id).filter_by(id=id).first() is None:
+        return None
+    rows = db.session.execute(
+        select(*(getattr(Task, name) for name in TASK_FIELDS)).where(Task.project_id == id)
+        .order_by(*LIST_ORDER)
+    ).mappings()
+    return [dict(row) for row in rows]
+
+# What ``/projects/api?include=`` can embed in each project.
+PROJECT_INCLUDES = ('tasks', 'counts')
+
 @projects.route('/api', methods=['GET'])
+@conditional_list(Project, Task)
 def get_projects_api():
+    """List projects as JSON.
+
+    Without ``include``, ``limit`` or ``cursor`` every project is returned. Otherwise
+    the list is paginated by project id (``Link``/``X-Next-Cursor`` headers), and
+    ``include=tasks`` nests each project's tasks while ``include=counts`` adds its
+    ``task_count``. A page takes two queries however many projects it holds.
+    """
     try:
-        print("API GET request received")  # Debug print statement
-        projects = Project.query.all()
-        projects_list = [{'id': project.id, 'name': project.name, 'description': project.description, 'status': project.status, 'due_date': project.due_date} for project in projects]
-        print(f"Projects retrieved: {projects_list}")  # Debug print statement
-        return jsonify(projects_list), 200
+        args = request.args
+        fields = parse_fields(args.get('fields'), PROJECT_FIELDS)
+        include = parse_fields(args.get('include'), PROJECT_INCLUDES, 'include') if args.get('include') is not None else ()
+        if not include and 'limit' not in args and 'cursor' not in args:
+            return json_response(row_dicts(cached(PROJECTS_API, _load_projects_api, version=list_version()), fields))
+        return _projects_api_page(fields, include)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Error retrieving projects: {e}")  # Debug print statement
+        logger.exception('Error retrieving projects')
         return jsonify({'error': str(e)}), 500
 
+def _projects_api_page(fields, include):
+    limit = parse_limit(request.args.get('limit'), current_app.config['PROJECTS_PAGE_SIZE'],
+                        current_app.config['PROJECTS_PAGE_SIZE_MAX'])
+    statement = select(*_project_columns())
+    keys = fields
+    if 'counts' in include:
+        statement = (
+            statement.add_columns(func.count(Task.id).label('task_count'))
+            .outerjoin(Task, Task.project_id == Project.id)
+            .group_by(Project.id)
+        )
+        keys = fields + ('task_count',)
+    rows, next_cursor = keyset_page(statement, [Project.id], request.args.get('cursor'), limit)
+    projects_list = row_dicts(rows, keys)
+
+    if 'tasks' in include:
+        # One batched query for the tasks of every project on the page.
+        tasks_by_project = {row.id: [] for row in rows}
+        if tasks_by_project:
+            tasks = db.session.execute(
+                select(*(getattr(Task, name) for name in TASK_FIELDS))
+                .where(Task.project_id.in_(list(tasks_by_project)))
+                .order_by(Task.project_id, *LIST_ORDER)
+            ).mappings()
+            for task in tasks:
+                tasks_by_project[task['project_id']].append(dict(task))
+        for row, project in zip(rows, projects_list):
+            project['tasks'] = tasks_by_project[row.id]
+
+    response = json_response(projects_list)
+    if next_cursor:
+        next_url = url_for('projects.get_projects_api', **dict(request.args, cursor=next_cursor))
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+def _load_projects_api():
+    rows = db.session.execute(select(*_project_columns()).order_by(Project.id)).mappings()
+    projects_list = [_plain_project(row) for row in rows]
+    logger.debug('Projects retrieved', extra={'count': len(projects_list)})
+    return projects_list
+
+@projects.route('/export', methods=['GET'])
+def export_projects():
+    """Stream all projects; ``format`` is ``json``, ``ndjson``, ``csv`` or ``csv.gz``."""
+    try:
+        statement = select(Project.id, Project.name, Project.description, Project.status,
+                           Project.due_date).order_by(Project.id)
+        return export_response(statement, request.args.get('format', 'json'), 'projects')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 @projects.route('/<int:id>', methods=['DELETE'])
 def delete_project(id):
-    print("DELETE request received")  # Debug print statement
-    project = Project.query.get_or_404(id)
+    project = db.get_or_404(Project, id)
     db.session.delete(project)
     db.session.commit()
-    print("Project deleted from database")  # Debug print statement
+    # Deleting a project detaches its tasks, which the task listings show.
+    invalidate_projects(id)
+    invalidate_tasks()
+    logger.info('Project deleted', extra={'project_id': id})
     return jsonify({'message': 'Project deleted successfully!'}), 200
+
+@projects.route('/delete', methods=['POST'])
+def bulk_delete_projects():
+    """Delete the projects in ``{"ids": [...]}`` with one statement.
+
+    Their tasks are detached or deleted by the database, as ``PROJECT_DELETE_TASKS``
+    was set when migrating. Returns the number of projects deleted.
+    """
+    try:
+        ids, conditions = selection(Project, request.get_json(silent=True), current_app.config['BULK_DELETE_MAX_IDS'])
+        deleted = delete_matching(Project, conditions)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    invalidate_projects(*ids)
+    invalidate_tasks()
+    logger.info('Projects deleted', extra={'deleted_count': deleted})
+    return jsonify({'deleted': deleted}), 200
+
+@projects.cli.command('delete-rule')
+def delete_rule_command():
+    """Switch the database to the PROJECT_DELETE_TASKS rule for a deleted project's tasks."""
+    mode = current_app.config['PROJECT_DELETE_TASKS']
+    with db.engine.begin() as connection:
+        replace_rule(connection, mode)
+    with db.engine.begin() as connection:
+        validate_foreign_key(connection)
+    invalidate_tasks()
+    click.echo(f'Deleting a project now applies {mode!r} to its tasks.')
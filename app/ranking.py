@@ -0,0 +1,154 @@
+"""Fractional ranks: string sort keys that leave room between any two neighbours.
+
+A list ordered by ``rank`` is reordered by giving the moved row a key that sorts
+between its new neighbours, so a move is a one-row update instead of renumbering
+everything after it. Keys are made of an integer part, whose first character encodes
+its length, and an optional fraction, in the base-62 digits below. Appending keeps
+keys short (``a0``, ``a1`` ... ``az``, ``b00`` ...); repeatedly inserting between the
+same two rows grows them by about one character per six moves.
+
+Keys compare byte by byte, so the column must use a binary collation (``C`` on
+Postgres; SQLite's default already is).
+"""
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+FIRST_KEY = 'a' + DIGITS[0]
+_SMALLEST_INTEGER = 'A' + DIGITS[0] * 26
+
+
+class InvalidRank(ValueError):
+    """Raised for a key that is malformed or out of order."""
+
+
+def _integer_length(head):
+    if 'a' <= head <= 'z':
+        return ord(head) - ord('a') + 2
+    if 'A' <= head <= 'Z':
+        return ord('Z') - ord(head) + 2
+    raise InvalidRank(f'Invalid rank head: {head!r}')
+
+
+def _split(key):
+    if not key:
+        raise InvalidRank('Empty rank')
+    length = _integer_length(key[0])
+    if length > len(key) or key == _SMALLEST_INTEGER:
+        raise InvalidRank(f'Invalid rank: {key!r}')
+    fraction = key[length:]
+    if fraction.endswith(DIGITS[0]):
+        raise InvalidRank(f'Invalid rank: {key!r}')
+    return key[:length], fraction
+
+
+def _midpoint(low, high):
+    """A fraction strictly between ``low`` and ``high`` (``None`` means no upper bound)."""
+    if high is not None:
+        common = 0
+        while (low[common] if common < len(low) else DIGITS[0]) == high[common]:
+            common += 1
+        if common:
+            return high[:common] + _midpoint(low[common:], high[common:])
+    digit_low = DIGITS.index(low[0]) if low else 0
+    digit_high = DIGITS.index(high[0]) if high is not None else len(DIGITS)
+    if digit_high - digit_low > 1:
+        return DIGITS[(digit_low + digit_high + 1) // 2]
+    if high is not None and len(high) > 1:
+        return high[:1]
+    return DIGITS[digit_low] + _midpoint(low[1:], None)
+
+
+def _increment(integer):
+    head, digits = integer[0], list(integer[1:])
+    for position in range(len(digits) - 1, -1, -1):
+        value = DIGITS.index(digits[position]) + 1
+        if value < len(DIGITS):
+            digits[position] = DIGITS[value]
+            return head + ''.join(digits)
+        digits[position] = DIGITS[0]
+    if head == 'Z':
+        return FIRST_KEY
+    if head == 'z':
+        return None
+    head = chr(ord(head) + 1)
+    if head > 'a':
+        digits.append(DIGITS[0])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def _decrement(integer):
+    head, digits = integer[0], list(integer[1:])
+    for position in range(len(digits) - 1, -1, -1):
+        value = DIGITS.index(digits[position]) - 1
+        if value >= 0:
+            digits[position] = DIGITS[value]
+            return head + ''.join(digits)
+        digits[position] = DIGITS[-1]
+    if head == 'a':
+        return 'Z' + DIGITS[-1]
+    if head == 'A':
+        return None
+    head = chr(ord(head) - 1)
+    if head < 'Z':
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def rank_between(before=None, after=None):
+    """A key sorting strictly between ``before`` and ``after``.
+
+    Either bound may be ``None``: ``rank_between(last)`` appends, ``rank_between(None,
+    first)`` prepends and ``rank_between()`` starts an empty list.
+    """
+    if before is not None and after is not None and before >= after:
+        raise InvalidRank(f'Rank {before!r} does not sort before {after!r}')
+    if before is None:
+        if after is None:
+            return FIRST_KEY
+        integer, fraction = _split(after)
+        if integer == _SMALLEST_INTEGER:
+            return integer + _midpoint('', fraction)
+        if integer < after:
+            return integer
+        lower = _decrement(integer)
+        if lower is None:
+            raise InvalidRank('Cannot rank before the smallest key')
+        return lower
+    integer, fraction = _split(before)
+    if after is None:
+        higher = _increment(integer)
+        return integer + _midpoint(fraction, None) if higher is None else higher
+    after_integer, after_fraction = _split(after)
+    if integer == after_integer:
+        return integer + _midpoint(fraction, after_fraction)
+    higher = _increment(integer)
+    if higher is not None and higher < after:
+        return higher
+    return integer + _midpoint(fraction, None)
+
+
+def ranks_after(before, count):
+    """``count`` increasing keys that sort after ``before`` (``None`` for an empty list)."""
+    ranks = []
+    for _ in range(count):
+        before = rank_between(before)
+        ranks.append(before)
+    return ranks
+
+
+def ranks_between(before, after, count):
+    """``count`` increasing keys strictly between ``before`` and ``after``.
+
+    The interval is bisected evenly, so the keys grow by about one character per six
+    doublings of ``count`` rather than one per key.
+    """
+    if count <= 0:
+        return []
+    if after is None:
+        return ranks_after(before, count)
+    middle = rank_between(before, after)
+    below = (count - 1) // 2
+    return ranks_between(before, middle, below) + [middle] + ranks_between(middle, after, count - 1 - below)
@@ -0,0 +1,78 @@
+"""Full-text search over capture entries, tasks and projects, and archived entries.
+
+The index lives in the database and is maintained there, so every insert, update and
+delete (including bulk Core statements) is reflected immediately:
+
+* SQLite: one FTS5 table, ``search_index``, kept in sync by triggers on the source
+  tables. Its rowid is ``id * 4 + kind code`` so a trigger can find a document's row
+  by rowid.
+* Postgres: a stored generated ``search_vector`` tsvector column with a GIN index on
+  each source table.
+
+Both are created by the ``c2e8d4a6f913`` migration; ``b5d8e3f7a046`` adds the capture
+archive, which is searched only when asked for with ``ARCHIVE_KIND``.
+"""
+
+from sqlalchemy import text
+
+from app import db
+
+KINDS = ('capture', 'task', 'project')
+ARCHIVE_KIND = 'archive'
+TS_CONFIG = 'english'
+
+_SQLITE_SEARCH = """
+    SELECT kind, ref_id AS id, title, body AS text, -bm25(search_index, 2.0, 1.0) AS score
+    FROM search_index
+    WHERE search_index MATCH :query AND kind IN ({kinds})
+    ORDER BY bm25(search_index, 2.0, 1.0), rowid
+    LIMIT :limit OFFSET :offset
+"""
+
+_POSTGRES_BRANCHES = {
+    'capture': "SELECT 'capture' AS kind, id, NULL AS title, content AS text, "
+               "ts_rank(search_vector, q) AS score FROM capture_entries, query WHERE search_vector @@ q",
+    'task': "SELECT 'task' AS kind, id, NULL AS title, content AS text, "
+            "ts_rank(search_vector, q) AS score FROM task, query WHERE search_vector @@ q",
+    'project': "SELECT 'project' AS kind, id, name AS title, description AS text, "
+               "ts_rank(search_vector, q) AS score FROM project, query WHERE search_vector @@ q",
+    ARCHIVE_KIND: "SELECT 'archive' AS kind, id, NULL AS title, content AS text, "
+                  "ts_rank(search_vector, q) AS score FROM capture_archive, query WHERE search_vector @@ q",
+}
+
+_POSTGRES_SEARCH = """
+    WITH query AS (SELECT websearch_to_tsquery('{config}', :query) AS q)
+    SELECT kind, id, title, text, score FROM (
+        {branches}
+    ) AS hits
+    ORDER BY score DESC, kind, id
+    LIMIT :limit OFFSET :offset
+"""
+
+
+def fts5_query(query):
+    """Turn free text into an FTS5 query that matches documents containing every word.
+
+    Each word is quoted so that FTS5 operators and punctuation in user input are taken
+    literally instead of raising a syntax error.
+    """
+    words = [word.replace('"', '""') for word in query.split()]
+    return ' '.join(f'"{word}"' for word in words)
+
+
+def search(query, kinds=KINDS, limit=20, offset=0):
+    """Return ranked hits as dicts with ``kind``, ``id``, ``title``, ``text`` and ``score``."""
+    dialect = db.engine.dialect.name
+    params = {'limit': limit, 'offset': offset}
+    if dialect == 'sqlite':
+        params['query'] = fts5_query(query)
+        params.update({f'kind_{i}': kind for i, kind in enumerate(kinds)})
+        statement = _SQLITE_SEARCH.format(kinds=', '.join(f':kind_{i}' for i in range(len(kinds))))
+    elif dialect == 'postgresql':
+        params['query'] = query
+        branches = '\n        UNION ALL\n        '.join(_POSTGRES_BRANCHES[kind] for kind in kinds)
+        statement = _POSTGRES_SEARCH.format(config=TS_CONFIG, branches=branches)
+    else:
+        raise NotImplementedError(f'Full-text search is not available on {dialect}')
+    rows = db.session.execute(text(statement), params).mappings()
+    return [dict(row) for row in rows]
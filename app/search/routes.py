@@ -0,0 +1,48 @@
+from flask import request, jsonify, url_for, current_app
+from app.search import search
+from app.search.queries import KINDS, search as run_search
+from app.pagination import parse_limit
+from app.serialization import json_response, parse_fields, row_dicts
+import logging
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = ('kind', 'id', 'title', 'text', 'score')
+
+@search.route('/', methods=['GET'])
+@search.route('', methods=['GET'])
+def search_all():
+    """Ranked full-text search across capture entries, tasks and projects.
+
+    ``q`` is the query, ``kind`` an optional comma-separated subset of
+    ``capture,task,project``; paging uses ``limit`` and ``offset``, and ``fields``
+    narrows each hit to a subset of ``kind,id,title,text,score``.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query parameter q is required!'}), 400
+    kinds = tuple(kind for kind in request.args.get('kind', ','.join(KINDS)).split(',') if kind)
+    unknown = [kind for kind in kinds if kind not in KINDS]
+    if unknown or not kinds:
+        return jsonify({'error': f"Invalid kind: {', '.join(unknown)} (expected {', '.join(KINDS)})"}), 400
+    try:
+        limit = parse_limit(request.args.get('limit'), current_app.config['SEARCH_PAGE_SIZE'],
+                            current_app.config['SEARCH_PAGE_SIZE_MAX'])
+        offset = max(0, int(request.args.get('offset', 0)))
+        fields = parse_fields(request.args.get('fields'), SEARCH_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        hits = run_search(query, kinds, limit=limit + 1, offset=offset)
+    except NotImplementedError as e:
+        return jsonify({'error': str(e)}), 501
+    except Exception:
+        logger.exception('Search failed')
+        return jsonify({'error': 'Search failed'}), 500
+
+    response = json_response(row_dicts(hits[:limit], fields))
+    if len(hits) > limit:
+        next_url = url_for('search.search_all', **dict(request.args, offset=offset + limit))
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
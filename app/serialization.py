@@ -0,0 +1,53 @@
+"""JSON responses built from plain rows.
+
+Read-only JSON views select just the columns they return and serialize the rows
+directly, skipping ORM hydration and ``jsonify``. Dates and datetimes are written as
+ISO-8601. ``orjson`` is used when it is installed and the standard library otherwise;
+both produce compact UTF-8 output.
+
+``?fields=a,b`` narrows every object of a list response to those keys (a sparse
+fieldset); unknown names are rejected with 400 by the views.
+"""
+
+import json
+
+from flask import current_app
+
+from app.export import json_default
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def dumps(data):
+    """Serialize ``data`` to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, default=json_default)
+    return json.dumps(data, default=json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(data, status=200):
+    return current_app.response_class(dumps(data), status=status, mimetype='application/json')
+
+
+def parse_fields(value, available, name='fields'):
+    """Parse a comma-separated ``fields`` argument against the keys a view can return.
+
+    Returns the requested keys in the order given, or all of ``available`` when the
+    argument is absent. Raises ``ValueError`` for unknown or empty selections.
+    """
+    if value is None:
+        return tuple(available)
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in available]
+    if unknown or not fields:
+        raise ValueError(f"Invalid {name}: {', '.join(unknown) or value!r} (expected some of {', '.join(available)})")
+    return fields
+
+
+def row_dicts(rows, fields):
+    """Turn result rows (or dicts) into dicts holding only ``fields``."""
+    mappings = (getattr(row, '_mapping', row) for row in rows)
+    return [{name: mapping[name] for name in fields} for mapping in mappings]
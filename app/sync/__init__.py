@@ -0,0 +1,10 @@
+from flask import Blueprint
+
+sync = Blueprint('sync', __name__)
+
+@sync.record_once
+def _init_feed(state):
+    from app.sync.feed import init_feed
+    init_feed(state.app)
+
+from . import routes
@@ -0,0 +1,146 @@
+"""Incremental sync from the change log.
+
+Triggers append a ``change_log`` row for every inserted, updated or deleted capture
+entry, project and task. A client keeps the cursor of the last row it has seen and
+asks for what came after it; the answer holds the current state of each touched
+record that still exists and a tombstone (its id) for each one that does not, so the
+cost of staying current is proportional to what changed rather than to the size of
+the lists.
+
+Cursors are ``(txid, id)`` positions. SQLite serializes writers, so ids are handed
+out in commit order and ``txid`` is always 0. On Postgres a transaction can commit
+after another one that took a later id; only rows written by transactions older than
+every transaction still running are served (``txid`` below the snapshot's xmin), and
+rows are walked in ``(txid, id)`` order, so nothing can commit behind a cursor that
+has already been handed out.
+
+Compaction removes rows superseded by a later row for the same record, then every row
+older than the retention period. The newest removed position is recorded as the
+horizon; a cursor before it has missed tombstones and must resync.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import delete, exists, func, select, tuple_
+
+from app import db
+from app.capture.models import CaptureEntry, CAPTURE_JSON_FIELDS
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor
+from app.projects.models import Project, Task, PROJECT_FIELDS, TASK_FIELDS
+from app.serialization import row_dicts
+from app.sync.models import ChangeLog, ChangeLogCompaction
+
+# kind -> (model, JSON fields); the kinds are the values the triggers write.
+SOURCES = {
+    'capture': (CaptureEntry, CAPTURE_JSON_FIELDS),
+    'project': (Project, PROJECT_FIELDS),
+    'task': (Task, TASK_FIELDS),
+}
+KINDS = tuple(SOURCES)
+POSITION = (ChangeLog.txid, ChangeLog.id)
+
+
+class CursorExpired(Exception):
+    """Raised when a cursor is older than the compaction horizon."""
+
+
+def _settled(query):
+    """Restrict ``query`` to change log rows no running transaction can precede."""
+    if db.engine.dialect.name == 'postgresql':
+        query = query.where(ChangeLog.txid < func.txid_snapshot_xmin(func.txid_current_snapshot()))
+    return query
+
+
+def horizon():
+    """The position compaction has removed everything up to, or ``None``."""
+    row = db.session.execute(
+        select(ChangeLogCompaction.horizon_txid, ChangeLogCompaction.horizon_id)
+        .order_by(ChangeLogCompaction.id.desc()).limit(1)
+    ).first()
+    return tuple(row) if row else None
+
+
+def head_cursor():
+    """A cursor positioned after every change that can currently be served."""
+    row = db.session.execute(
+        _settled(select(*POSITION)).order_by(ChangeLog.txid.desc(), ChangeLog.id.desc()).limit(1)
+    ).first()
+    return encode_cursor(list(row or horizon() or (0, 0)))
+
+
+def decode_position(cursor):
+    values = decode_cursor(cursor, POSITION)
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+        raise InvalidCursor('Invalid cursor: expected integer positions')
+    return tuple(values)
+
+
+def read_changes(cursor, kinds=KINDS, limit=500):
+    """Return the changes after ``cursor``, reading at most ``limit`` log rows.
+
+    Raises ``InvalidCursor`` for a malformed cursor and ``CursorExpired`` for one
+    older than the compaction horizon.
+    """
+    position = decode_position(cursor)
+    expired_before = horizon()
+    if expired_before is not None and position < expired_before:
+        raise CursorExpired(cursor)
+
+    entries = db.session.execute(
+        _settled(select(*POSITION, ChangeLog.kind, ChangeLog.record_id))
+        .where(tuple_(*POSITION) > tuple_(*position), ChangeLog.kind.in_(kinds))
+        .order_by(*POSITION).limit(limit + 1)
+    ).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    touched = {}
+    for entry in entries:
+        touched.setdefault(entry.kind, {})[entry.record_id] = None
+    upserted, deleted = {}, {}
+    for kind, ids in touched.items():
+        model, fields = SOURCES[kind]
+        rows = db.session.execute(
+            select(*(getattr(model, name) for name in fields)).where(model.id.in_(list(ids))).order_by(model.id)
+        ).all()
+        upserted[kind] = row_dicts(rows, fields)
+        found = {row['id'] for row in upserted[kind]}
+        deleted[kind] = sorted(record_id for record_id in ids if record_id not in found)
+
+    return {
+        'cursor': encode_cursor([entries[-1].txid, entries[-1].id]) if entries else cursor,
+        'has_more': has_more,
+        'upserted': {kind: rows for kind, rows in upserted.items() if rows},
+        'deleted': {kind: ids for kind, ids in deleted.items() if ids},
+    }
+
+
+def compact_change_log(retention, now=None):
+    """Drop superseded log rows and rows older than ``retention`` (a timedelta).
+
+    Returns counts of the removed and remaining rows.
+    """
+    now = now or datetime.utcnow()
+    newer = ChangeLog.__table__.alias('newer')
+    superseded = db.session.execute(
+        delete(ChangeLog).where(exists().where(
+            newer.c.kind == ChangeLog.kind,
+            newer.c.record_id == ChangeLog.record_id,
+            tuple_(newer.c.txid, newer.c.id) > tuple_(*POSITION),
+        ))
+    ).rowcount
+
+    expired = 0
+    newest_expired = db.session.execute(
+        select(*POSITION).where(ChangeLog.changed_at < now - retention)
+        .order_by(ChangeLog.txid.desc(), ChangeLog.id.desc()).limit(1)
+    ).first()
+    if newest_expired is not None:
+        expired = db.session.execute(
+            delete(ChangeLog).where(tuple_(*POSITION) <= tuple_(*newest_expired))
+        ).rowcount
+        db.session.add(ChangeLogCompaction(horizon_txid=newest_expired.txid, horizon_id=newest_expired.id,
+                                           removed=superseded + expired, compacted_at=now))
+    db.session.commit()
+    remaining = db.session.execute(select(func.count()).select_from(ChangeLog)).scalar_one()
+    return {'superseded': superseded, 'expired': expired, 'remaining': remaining}
@@ -0,0 +1,154 @@
+"""Live change feed for Server-Sent Events streams.
+
+Every write to capture entries, projects and tasks lands in the change log whatever
+worker made it, so the log is the bus between gunicorn workers: each process runs one
+poller thread that reads new rows every ``EVENTS_POLL_INTERVAL`` seconds and hands the
+batch to every stream connected to that process. The poller runs only while a stream
+is subscribed, so idle workers issue no queries.
+
+A subscriber that falls ``queue_size`` batches behind is dropped; its stream ends and
+the browser reconnects with ``Last-Event-ID``, catching up from the change log.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+
+from app.sync.changelog import CursorExpired, decode_position, head_cursor, read_changes
+
+logger = logging.getLogger(__name__)
+
+# Put in a subscriber's queue when it is dropped or the feed has to start over.
+CLOSED = object()
+RESET = object()
+
+
+class Subscription:
+    def __init__(self, kinds, queue_size):
+        self.kinds = kinds
+        self.queue = queue.Queue(maxsize=queue_size)
+
+    def get(self, timeout):
+        """The next batch, ``CLOSED``, ``RESET``, or ``None`` after ``timeout`` seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class ChangeFeed:
+    """The change log poller of one app in one process."""
+
+    def __init__(self, app, poll_interval=0.5, batch_size=500, queue_size=100):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self._pid = None
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, kinds):
+        """Register a stream; must run inside an app context.
+
+        Streams catch up from their own cursor after subscribing; a poller started
+        here begins at the current head, so no change falls between the two.
+        """
+        subscription = Subscription(frozenset(kinds), self.queue_size)
+        with self._lock:
+            if self._pid != os.getpid():
+                # Threads and subscribers do not survive a fork.
+                self._subscribers = set()
+                self._thread = None
+                self._pid = os.getpid()
+            self._subscribers.add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(head_cursor(),),
+                                                name='change-feed', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscribers(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _publish(self, item):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if item is not RESET:
+                batch = {
+                    'cursor': item['cursor'],
+                    'upserted': {kind: rows for kind, rows in item['upserted'].items() if kind in subscription.kinds},
+                    'deleted': {kind: ids for kind, ids in item['deleted'].items() if kind in subscription.kinds},
+                }
+                if not batch['upserted'] and not batch['deleted']:
+                    continue
+            else:
+                batch = RESET
+            try:
+                subscription.queue.put_nowait(batch)
+            except queue.Full:
+                self.unsubscribe(subscription)
+                self.dropped += 1
+                # Make room so the stream sees CLOSED instead of more stale batches.
+                while True:
+                    try:
+                        subscription.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                subscription.queue.put_nowait(CLOSED)
+        self.published += 1
+
+    def _poll(self, cursor):
+        with self.app.app_context():
+            while True:
+                changes = read_changes(cursor, limit=self.batch_size)
+                cursor = changes['cursor']
+                if changes['upserted'] or changes['deleted']:
+                    self._publish(changes)
+                if not changes['has_more']:
+                    return cursor
+
+    def _run(self, cursor):
+        while True:
+            with self._lock:
+                if not self._subscribers or self._pid != os.getpid():
+                    self._thread = None
+                    return
+            try:
+                if cursor is None:
+                    with self.app.app_context():
+                        cursor = head_cursor()
+                cursor = self._poll(cursor)
+            except CursorExpired:
+                cursor = None
+                self._publish(RESET)
+            except Exception:
+                logger.exception('Change feed poll failed; will retry')
+            time.sleep(self.poll_interval)
+
+
+def position_after(cursor, other):
+    """Whether ``cursor`` is past ``other`` in change log order."""
+    return decode_position(cursor) > decode_position(other)
+
+
+def init_feed(app):
+    feed = ChangeFeed(
+        app,
+        poll_interval=app.config.get('EVENTS_POLL_INTERVAL', 0.5),
+        batch_size=app.config.get('SYNC_PAGE_SIZE', 500),
+    )
+    app.extensions['change_feed'] = feed
+    return feed
@@ -0,0 +1,31 @@
+from app import db
+
+class ChangeLog(db.Model):
+    """One inserted, updated or deleted record; rows are written by database triggers
+    (see migration 9b4d2e7f1a63), never by the app."""
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        # /sync walks (txid, id) in order.
+        db.Index('ix_change_log_txid_id', 'txid', 'id'),
+        db.Index('ix_change_log_kind_record_id', 'kind', 'record_id'),
+        {'sqlite_autoincrement': True},
+    )
+    id = db.Column(db.BigInteger().with_variant(db.Integer(), 'sqlite'), primary_key=True)
+    # Id of the writing transaction on Postgres, 0 on SQLite (whose writes are serialized).
+    txid = db.Column(db.BigInteger, nullable=False)
+    kind = db.Column(db.String(16), nullable=False)
+    record_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(8), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<ChangeLog {self.kind} {self.record_id} {self.op}>'
+
+class ChangeLogCompaction(db.Model):
+    """A compaction run; cursors before the latest horizon must resync."""
+    __tablename__ = 'change_log_compaction'
+    id = db.Column(db.Integer, primary_key=True)
+    horizon_txid = db.Column(db.BigInteger, nullable=False)
+    horizon_id = db.Column(db.BigInteger, nullable=False)
+    removed = db.Column(db.Integer, nullable=False)
+    compacted_at = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,145 @@
+from flask import Response, current_app, request, jsonify, url_for
+from app.sync import sync
+from app.sync.changelog import KINDS, CursorExpired, compact_change_log, head_cursor, read_changes
+from app.sync.feed import CLOSED, RESET, position_after
+from app.pagination import InvalidCursor, parse_limit
+from app.serialization import dumps, json_response
+from datetime import timedelta
+import click
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def _parse_kinds():
+    kinds = tuple(kind for kind in request.args.get('kind', ','.join(KINDS)).split(',') if kind)
+    unknown = [kind for kind in kinds if kind not in KINDS]
+    if unknown or not kinds:
+        raise ValueError(f"Invalid kind: {', '.join(unknown)} (expected {', '.join(KINDS)})")
+    return kinds
+
+@sync.route('/', methods=['GET'])
+@sync.route('', methods=['GET'])
+def get_changes():
+    """Changes to capture entries, projects and tasks since ``since``.
+
+    Without ``since`` only the current cursor is returned: take it before loading the
+    lists, then pass it back. ``kind`` narrows the result to a comma-separated subset
+    of ``capture,project,task`` and ``limit`` caps the change log rows read per call;
+    keep following ``cursor`` while ``has_more`` is true. A cursor older than the last
+    compaction gets 410 and the client must reload its lists.
+    """
+    try:
+        kinds = _parse_kinds()
+        limit = parse_limit(request.args.get('limit'), current_app.config['SYNC_PAGE_SIZE'],
+                            current_app.config['SYNC_PAGE_SIZE_MAX'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    since = request.args.get('since')
+    if not since:
+        return json_response({'cursor': head_cursor(), 'has_more': False, 'upserted': {}, 'deleted': {}})
+    try:
+        changes = read_changes(since, kinds, limit)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except CursorExpired:
+        return jsonify({'error': 'Cursor is older than the change log; reload and start from a new cursor'}), 410
+
+    response = json_response(changes)
+    if changes['has_more']:
+        next_url = url_for('sync.get_changes', **dict(request.args, since=changes['cursor']))
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+def _sse(event, data, event_id=None):
+    lines = [f'event: {event}']
+    if event_id:
+        lines.append(f'id: {event_id}')
+    lines.append(f"data: {dumps(data).decode('utf-8')}")
+    return '\n'.join(lines) + '\n\n'
+
+@sync.route('/events', methods=['GET'])
+def stream_changes():
+    """Server-Sent Events stream of the changes ``GET /sync`` would return.
+
+    ``kind`` works as for ``/sync``. The stream resumes after ``Last-Event-ID`` (sent
+    by the browser on reconnect) or ``since``; every ``changes`` event carries its
+    cursor as the event id. A ``reset`` event means the client missed too much and
+    must reload. Streams end after ``EVENTS_STREAM_TIMEOUT`` seconds and browsers
+    reconnect on their own.
+    """
+    config = current_app.config
+    try:
+        kinds = _parse_kinds()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    feed = current_app.extensions['change_feed']
+    if feed.subscribers >= config['EVENTS_MAX_STREAMS']:
+        response = jsonify({'error': 'Too many live streams; retry later'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    subscription = feed.subscribe(kinds)
+    try:
+        if since:
+            catch_up = read_changes(since, kinds, config['SYNC_PAGE_SIZE_MAX'])
+            cursor = catch_up['cursor']
+        else:
+            catch_up, cursor = None, head_cursor()
+    except InvalidCursor as e:
+        feed.unsubscribe(subscription)
+        return jsonify({'error': str(e)}), 400
+    except CursorExpired:
+        catch_up, cursor = RESET, head_cursor()
+    except Exception:
+        feed.unsubscribe(subscription)
+        raise
+    heartbeat = config['EVENTS_HEARTBEAT_INTERVAL']
+    deadline = time.monotonic() + config['EVENTS_STREAM_TIMEOUT']
+    retry_ms = config['EVENTS_RETRY_MS']
+
+    def generate():
+        nonlocal cursor
+        try:
+            yield f'retry: {retry_ms}\n\n'
+            if catch_up is RESET or (catch_up and catch_up['has_more']):
+                yield _sse('reset', {}, cursor)
+                return
+            if catch_up and (catch_up['upserted'] or catch_up['deleted']):
+                yield _sse('changes', catch_up, cursor)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                batch = subscription.get(min(heartbeat, remaining))
+                if batch is None:
+                    # Keeps proxies (Heroku closes idle connections after 55 s) from
+                    # dropping the stream and lets a dead client be noticed.
+                    yield ': keepalive\n\n'
+                elif batch is CLOSED:
+                    return
+                elif batch is RESET:
+                    yield _sse('reset', {})
+                    return
+                elif position_after(batch['cursor'], cursor):
+                    cursor = batch['cursor']
+                    yield _sse('changes', batch, cursor)
+        finally:
+            feed.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@sync.cli.command('compact')
+@click.option('--retention-days', type=float, default=None,
+              help='Drop change log rows older than this (default: SYNC_RETENTION_DAYS).')
+def compact_command(retention_days):
+    """Compact the change log behind /sync."""
+    if retention_days is None:
+        retention_days = current_app.config['SYNC_RETENTION_DAYS']
+    result = compact_change_log(timedelta(days=retention_days))
+    logger.info('Change log compacted', extra=result)
+    click.echo(f"Removed {result['superseded']} superseded and {result['expired']} expired rows; "
+               f"{result['remaining']} remain.")
@@ -0,0 +1,115 @@
+"""Ordering of tasks into the next-actions queue.
+
+Tasks are grouped into buckets by ``(status, priority)`` and ordered inside a bucket
+by ``(rank, id)``, which is exactly the ``ix_task_next_actions`` index: reading the
+top of the queue, finding the end of a bucket and finding a task's neighbours are all
+index range scans. New tasks are appended to their bucket and a move rewrites only
+the moved task's rank (see ``app.ranking``).
+
+Set-based inserts (``triage_matching``) give all their tasks the same rank, so they
+tie and keep id order; the first move that lands inside such a tie spreads it out.
+"""
+
+import logging
+
+from sqlalchemy import select, tuple_, update
+
+from app import db
+from app.projects.models import Task
+from app.ranking import rank_between, ranks_after, ranks_between
+
+logger = logging.getLogger(__name__)
+
+QUEUE_ORDER = (Task.priority, Task.rank, Task.id)
+# Task listings: open tasks first in queue order, then the others by status.
+LIST_ORDER = (Task.status != 'open', Task.status, *QUEUE_ORDER)
+# Longest key a move may produce before its bucket is renumbered; below the column size.
+RANK_LENGTH = 200
+PLACES = ('before', 'after')
+
+
+def next_actions(columns, limit):
+    """The first ``limit`` open tasks across all projects, most urgent first."""
+    return select(*columns).where(Task.status == 'open').order_by(*QUEUE_ORDER).limit(limit)
+
+
+def _bucket(status, priority):
+    return (Task.status == status, Task.priority == priority)
+
+
+def append_ranks(status, priority, count=1, session=None):
+    """Ranks for ``count`` tasks added at the end of the ``(status, priority)`` bucket."""
+    if session is None:
+        session = db.session
+    last = session.execute(
+        select(Task.rank).where(*_bucket(status, priority)).order_by(Task.rank.desc()).limit(1)
+    ).scalar()
+    return ranks_after(last, count)
+
+
+def move_task(task, anchor, place, session=None):
+    """Give ``task`` the priority of ``anchor`` and a rank directly ``place`` it.
+
+    ``place`` is ``'before'`` or ``'after'``. Only ``task`` is updated, unless the
+    move lands inside a tie or the new key would be too long, in which case the
+    bucket's ranks are spread out first. The caller commits.
+    """
+    if session is None:
+        session = db.session
+    if place not in PLACES:
+        raise ValueError(f"Invalid place: {place!r} (expected {' or '.join(PLACES)})")
+    if anchor.id == task.id:
+        raise ValueError('A task cannot be moved relative to itself')
+    if anchor.status != task.status:
+        raise ValueError(f"Cannot move a {task.status!r} task next to a {anchor.status!r} one")
+
+    others = (*_bucket(anchor.status, anchor.priority), Task.id != task.id)
+    low, high = _neighbour_ranks(session, anchor, place, others)
+    if low is not None and low == high:
+        _spread_tie(session, others, low)
+        session.refresh(anchor, ['rank'])
+        low, high = _neighbour_ranks(session, anchor, place, others)
+    rank = rank_between(low, high)
+    if len(rank) > RANK_LENGTH:
+        _renumber(session, others)
+        session.refresh(anchor, ['rank'])
+        rank = rank_between(*_neighbour_ranks(session, anchor, place, others))
+    task.priority = anchor.priority
+    task.rank = rank
+    return rank
+
+
+def _neighbour_ranks(session, anchor, place, others):
+    position = tuple_(Task.rank, Task.id)
+    anchor_position = tuple_(anchor.rank, anchor.id)
+    if place == 'after':
+        following = session.execute(
+            select(Task.rank).where(*others, position > anchor_position).order_by(Task.rank, Task.id).limit(1)
+        ).scalar()
+        return anchor.rank, following
+    preceding = session.execute(
+        select(Task.rank).where(*others, position < anchor_position)
+        .order_by(Task.rank.desc(), Task.id.desc()).limit(1)
+    ).scalar()
+    return preceding, anchor.rank
+
+
+def _spread_tie(session, others, rank):
+    """Give the tasks sharing ``rank`` distinct ranks between it and the next one."""
+    ids = session.execute(select(Task.id).where(*others, Task.rank == rank).order_by(Task.id)).scalars().all()
+    following = session.execute(
+        select(Task.rank).where(*others, Task.rank > rank).order_by(Task.rank).limit(1)
+    ).scalar()
+    ranks = [rank, *ranks_between(rank, following, len(ids) - 1)]
+    _update_ranks(session, ids, ranks)
+    logger.info('Spread tied task ranks', extra={'tied_count': len(ids)})
+
+
+def _renumber(session, others):
+    ids = session.execute(select(Task.id).where(*others).order_by(Task.rank, Task.id)).scalars().all()
+    _update_ranks(session, ids, ranks_after(None, len(ids)))
+    logger.info('Renumbered task ranks', extra={'task_count': len(ids)})
+
+
+def _update_ranks(session, ids, ranks):
+    session.execute(update(Task), [{'id': task_id, 'rank': rank} for task_id, rank in zip(ids, ranks)])
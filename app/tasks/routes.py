@@ -1,66 +1,249 @@
-from flask import request, jsonify, render_template
+from flask import current_app, request, jsonify, render_template, url_for
 from app.tasks import tasks
-from app.projects.models import db, Task, Project
+from app.projects.models import db, Task, Project, TASK_FIELDS, TASK_STATUSES, TASK_PRIORITIES, DEFAULT_TASK_PRIORITY
+from app.projects.cache import TASKS_PAGE, invalidate_tasks
+from app.cache import cached
+from app.logging_setup import log_payload
+from app.export import export_response
+from app.conditional import conditional_list, list_version
+from app.pagination import keyset_page, parse_limit
+from app.serialization import json_response, parse_fields, row_dicts
+from app.tasks.queue import LIST_ORDER, PLACES, append_ranks, move_task, next_actions
+from app.bulk_delete import delete_matching, selection
+from sqlalchemy import select
 
-import os
 import json
+import logging
+from datetime import datetime
 
-print("Loading tasks routes...")  # Debug print statement
+logger = logging.getLogger(__name__)
+
+def _parse_status(value):
+    if value not in TASK_STATUSES:
+        raise ValueError(f"Invalid status: {value!r} (expected one of {', '.join(TASK_STATUSES)})")
+    return value
+
+def _parse_priority(value):
+    if isinstance(value, bool) or value not in TASK_PRIORITIES:
+        raise ValueError(f"Invalid priority: {value!r} (expected one of {', '.join(map(str, TASK_PRIORITIES))})")
+    return value
+
+def _parse_due_date(value):
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Error parsing due_date: {e}")
 
 @tasks.route('/', methods=['POST'])
 @tasks.route('', methods=['POST'])
 def add_task():
-    print("POST request received")  # Debug print statement
-    print(f"Request Content-Type: {request.content_type}")  # Debug print statement
-    print(f"Request data: {request.data}")  # Debug print statement
-    print(f"Request form data: {request.form}")  # Debug print statement
-
     if request.is_json:
         try:
             data = json.loads(request.data.decode('utf-8'))
-            print(f"Manually parsed JSON data: {data}")  # Debug print statement
+            log_payload(logger, 'Task payload', data)
         except Exception as e:
-            print(f"Error manually parsing JSON: {e}")  # Debug print statement
+            logger.info('Task rejected: invalid JSON', extra={'error': str(e)})
             return jsonify({'error': f"Error manually parsing JSON: {e}"}), 400
 
         content = data.get('content')
         project_id = data.get('project_id')
 
         if content:
-            task = Task(content=content)
+            try:
+                status = _parse_status(data.get('status', 'open'))
+                priority = _parse_priority(data.get('priority', DEFAULT_TASK_PRIORITY))
+                due_date = _parse_due_date(data.get('due_date'))
+            except ValueError as e:
+                logger.info('Task rejected', extra={'error': str(e)})
+                return jsonify({'error': str(e)}), 400
+            task = Task(content=content, status=status, priority=priority, due_date=due_date)
             if project_id:
-                project = Project.query.get(project_id)
+                project = db.session.get(Project, project_id)
                 if not project:
                     return jsonify({'error': 'Invalid project ID'}), 400
                 task.project_id = project_id
 
+            task.rank = append_ranks(status, priority)[0]
             db.session.add(task)
             db.session.commit()
-            print("Task added to database")  # Debug print statement
+            invalidate_tasks(task.project_id)
+            logger.info('Task added')
             return jsonify({'message': 'Task added successfully!'}), 201
-        print("Content is required")  # Debug print statement
+        logger.info('Task rejected: content is required')
         return jsonify({'error': 'Content is required!'}), 400
 
-    print("Request must be JSON")  # Debug print statement
+    logger.info('Task rejected: request must be JSON')
     return jsonify({'error': 'Request must be JSON'}), 400
 
 @tasks.route('/', methods=['GET'])
 @tasks.route('', methods=['GET'])
+@conditional_list(Task)
 def get_tasks():
     try:
-        print("GET request received")  # Debug print statement
-        tasks = Task.query.all()
-        print(f"Tasks retrieved: {[task.content for task in tasks]}")  # Debug print statement
+        tasks = cached(TASKS_PAGE, _load_tasks_page, version=list_version())
+        logger.debug('Tasks retrieved', extra={'count': len(tasks)})
         return render_template('tasks.html', tasks=tasks)
     except Exception as e:
-        print(f"Error retrieving tasks: {e}")  # Debug print statement
+        logger.exception('Error retrieving tasks')
         return str(e), 500
 
+def _load_tasks_page():
+    rows = db.session.execute(
+        select(*(getattr(Task, name) for name in TASK_FIELDS))
+        .order_by(*LIST_ORDER)
+    ).mappings()
+    return [dict(row) for row in rows]
+
+@tasks.route('/next', methods=['GET'])
+@conditional_list(Task)
+def get_next_actions():
+    """The ``limit`` most urgent open tasks across all projects, as JSON.
+
+    Tasks are ordered by priority (0 first), then by their position in the queue, and
+    are read with one range scan of the next-actions index however many tasks exist.
+    ``fields`` works as for ``/tasks/api``.
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'), TASK_FIELDS)
+        limit = parse_limit(request.args.get('limit'), current_app.config['NEXT_ACTIONS_SIZE'],
+                            current_app.config['TASKS_PAGE_SIZE_MAX'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    rows = db.session.execute(next_actions([getattr(Task, name) for name in fields], limit)).all()
+    return json_response(row_dicts(rows, fields))
+
+@tasks.route('/api', methods=['GET'])
+@conditional_list(Task)
+def get_tasks_api():
+    """List tasks as JSON, paginated by id.
+
+    ``project_id`` filters to one project, ``fields`` narrows each task to a subset of
+    ``id,content,project_id,status,priority,rank,due_date``; paging uses ``limit`` and
+    ``cursor``.
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'), TASK_FIELDS)
+        limit = parse_limit(request.args.get('limit'), current_app.config['TASKS_PAGE_SIZE'],
+                            current_app.config['TASKS_PAGE_SIZE_MAX'])
+        statement = select(*(getattr(Task, name) for name in TASK_FIELDS))
+        project_id = request.args.get('project_id')
+        if project_id is not None:
+            try:
+                statement = statement.where(Task.project_id == int(project_id))
+            except ValueError:
+                raise ValueError(f'Invalid project_id: {project_id!r}')
+        rows, next_cursor = keyset_page(statement, [Task.id], request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    response = json_response(row_dicts(rows, fields))
+    if next_cursor:
+        next_url = url_for('tasks.get_tasks_api', **dict(request.args, cursor=next_cursor))
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@tasks.route('/export', methods=['GET'])
+def export_tasks():
+    """Stream all tasks; ``format`` is ``json``, ``ndjson``, ``csv`` or ``csv.gz``."""
+    try:
+        statement = select(*(getattr(Task, name) for name in TASK_FIELDS)).order_by(Task.id)
+        return export_response(statement, request.args.get('format', 'json'), 'tasks')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@tasks.route('/<int:id>', methods=['PUT'])
+def edit_task(id):
+    """Update a task's ``content``, ``status``, ``priority`` or ``due_date`` (``null`` clears it).
+
+    A task whose status or priority changes goes to the end of its new bucket in the
+    queue; use ``/tasks/<id>/move`` to place it.
+    """
+    task = db.get_or_404(Task, id)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request must be a JSON object'}), 400
+    try:
+        status = _parse_status(data.get('status', task.status))
+        priority = _parse_priority(data.get('priority', task.priority))
+        due_date = _parse_due_date(data['due_date']) if 'due_date' in data else task.due_date
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not data.get('content', task.content):
+        return jsonify({'error': 'Content is required!'}), 400
+    task.content = data.get('content', task.content)
+    task.due_date = due_date
+    if (status, priority) != (task.status, task.priority):
+        task.rank = append_ranks(status, priority)[0]
+        task.status, task.priority = status, priority
+    db.session.commit()
+    invalidate_tasks(task.project_id)
+    logger.info('Task updated', extra={'task_id': id})
+    return jsonify({'message': 'Task updated successfully!'}), 200
+
+@tasks.route('/<int:id>/move', methods=['POST'])
+def reorder_task(id):
+    """Move a task directly ``before`` or ``after`` another task with the same status.
+
+    The task takes that task's priority and a rank between it and its neighbour, so
+    only the moved task is rewritten.
+    """
+    task = db.get_or_404(Task, id)
+    data = request.get_json(silent=True)
+    places = [place for place in PLACES if isinstance(data, dict) and data.get(place) is not None]
+    if len(places) != 1:
+        return jsonify({'error': 'Give exactly one of before or after'}), 400
+    anchor = db.session.get(Task, data[places[0]]) if type(data[places[0]]) is int else None
+    if anchor is None:
+        return jsonify({'error': 'Invalid task ID'}), 400
+    try:
+        rank = move_task(task, anchor, places[0])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+    invalidate_tasks(task.project_id)
+    logger.info('Task moved', extra={'task_id': id})
+    return jsonify({'message': 'Task moved successfully!', 'priority': task.priority, 'rank': rank}), 200
+
 @tasks.route('/<int:id>', methods=['DELETE'])
 def delete_task(id):
-    print("DELETE request received")  # Debug print statement
-    task = Task.query.get_or_404(id)
+    task = db.get_or_404(Task, id)
+    project_id = task.project_id
     db.session.delete(task)
     db.session.commit()
-    print("Task deleted from database")  # Debug print statement
+    invalidate_tasks(project_id)
+    logger.info('Task deleted', extra={'task_id': id})
     return jsonify({'message': 'Task deleted successfully!'}), 200
+
+def _task_filters(filters):
+    conditions = []
+    if 'project_id' in filters:
+        project_id = filters['project_id']
+        if project_id is not None and (isinstance(project_id, bool) or not isinstance(project_id, int)):
+            raise ValueError('Invalid project ID')
+        conditions.append(Task.project_id == project_id if project_id is not None else Task.project_id.is_(None))
+    if 'status' in filters:
+        conditions.append(Task.status == _parse_status(filters['status']))
+    return conditions
+
+@tasks.route('/delete', methods=['POST'])
+def bulk_delete_tasks():
+    """Delete many tasks with one statement.
+
+    The body is ``{"ids": [...]}`` or ``{"filter": {...}}`` matching on ``project_id``
+    (``null`` for tasks without a project) and/or ``status``. Returns the number of
+    tasks deleted.
+    """
+    try:
+        _, conditions = selection(Task, request.get_json(silent=True), current_app.config['BULK_DELETE_MAX_IDS'],
+                                  _task_filters)
+        project_ids = db.session.execute(select(Task.project_id).where(*conditions).distinct()).scalars().all()
+        deleted = delete_matching(Task, conditions)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    invalidate_tasks(*project_ids)
+    logger.info('Tasks deleted', extra={'deleted_count': deleted})
+    return jsonify({'deleted': deleted}), 200
@@ -0,0 +1,189 @@
+"""
+asgi_capture.py
+
+Compare the capture JSON API served by ``gunicorn wsgi:app`` (threaded workers) with
+``uvicorn asgi:app`` (async handlers) at increasing numbers of concurrent client
+connections.
+
+Usage:
+    python benchmarks/seed.py --rows 10000
+    python benchmarks/asgi_capture.py --rows 10000 [--connections 1,8,32,128] [--duration 5]
+
+Each run starts from a fresh copy of the seeded database. The client is a small
+asyncio HTTP/1.1 client with one keep-alive connection per simulated user; every user
+reads the first inbox page as JSON or, ``--write-ratio`` of the time, posts a capture
+entry. Throughput counts 2xx responses only.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+
+from seed import DATA_DIR, ROOT, default_database_url
+from run import RESULTS_DIR, _free_port, git_commit, percentile
+
+SERVERS = {
+    'wsgi': lambda port, workers, threads: [
+        sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+        '--bind', f'127.0.0.1:{port}', 'wsgi:app'],
+    'asgi': lambda port, workers, threads: [
+        sys.executable, '-m', 'uvicorn', '--workers', str(workers), '--no-access-log',
+        '--port', str(port), 'asgi:app'],
+}
+
+
+def _copy_database(source, target):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(target + suffix):
+            os.remove(target + suffix)
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+async def _request(reader, writer, method, path, body=None):
+    head = f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nAccept: application/json\r\n'
+    payload = b''
+    if body is not None:
+        payload = json.dumps(body).encode('utf-8')
+        head += f'Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n'
+    writer.write(head.encode('latin-1') + b'\r\n' + payload)
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('server closed the connection')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status
+
+
+async def _user(port, deadline, write_ratio, rng, latencies, counts):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            if rng.random() < write_ratio:
+                status = await _request(reader, writer, 'POST', '/capture/', {'content': f'asgi bench {rng.random()}'})
+            else:
+                status = await _request(reader, writer, 'GET', '/capture/?limit=50')
+            latencies.append(time.perf_counter() - started)
+            counts['ok' if status < 300 else 'errors'] += 1
+    except (ConnectionError, asyncio.IncompleteReadError):
+        counts['errors'] += 1
+    finally:
+        writer.close()
+
+
+async def _load(port, connections, duration, write_ratio):
+    latencies = []
+    counts = {'ok': 0, 'errors': 0}
+    deadline = time.monotonic() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _user(port, deadline, write_ratio, random.Random(index), latencies, counts)
+        for index in range(connections)
+    ))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'throughput_rps': round(counts['ok'] / elapsed, 1),
+        'errors': counts['errors'],
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def _wait_until_up(port, process):
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            await _request(reader, writer, 'GET', '/capture/?limit=1')
+            writer.close()
+            return
+        except (OSError, ConnectionError, asyncio.IncompleteReadError):
+            if time.monotonic() > deadline or process.poll() is not None:
+                raise RuntimeError('server did not start')
+            await asyncio.sleep(0.1)
+
+
+def run(server, database_path, connections, duration, write_ratio, workers, threads):
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL_DEV=f'sqlite:///{database_path}', LOG_LEVEL='WARNING',
+               METRICS_ENABLED='0', FLASK_CONFIG='development')
+    process = subprocess.Popen(SERVERS[server](port, workers, threads), cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        asyncio.run(_wait_until_up(port, process))
+        return asyncio.run(_load(port, connections, duration, write_ratio))
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Capture API throughput: gunicorn (WSGI) vs uvicorn (ASGI).')
+    parser.add_argument('--rows', type=int, default=10000, help='Seeded dataset to start from')
+    parser.add_argument('--connections', default='1,8,32,128', help='Comma-separated concurrent connections')
+    parser.add_argument('--servers', default='wsgi,asgi')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=1, help='Server processes')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    source = default_database_url(args.rows)[len('sqlite:///'):]
+    if not os.path.exists(source):
+        sys.exit(f'{source} does not exist; run benchmarks/seed.py --rows {args.rows} first')
+
+    results = {}
+    for server in args.servers.split(','):
+        for connections in (int(value) for value in args.connections.split(',')):
+            target = os.path.join(DATA_DIR, f'asgi-capture-{server}.db')
+            _copy_database(source, target)
+            result = run(server, target, connections, args.duration, args.write_ratio, args.workers, args.threads)
+            results[f'{server}-{connections}'] = result
+            print(f"{server:4} {connections:4} connections  {result['throughput_rps']:8.1f} req/s  "
+                  f"p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  errors {result['errors']}")
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f'asgi-capture-{args.rows}.json')
+        with open(path, 'w') as f:
+            json.dump({
+                'meta': {'commit': git_commit(), 'rows': args.rows, 'duration_s': args.duration,
+                         'write_ratio': args.write_ratio, 'workers': args.workers, 'threads': args.threads,
+                         'python': sys.version.split()[0]},
+                'runs': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'\nResults written to {os.path.relpath(path, ROOT)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+json_read_path.py
+
+Compare the CPU time and peak memory of building a JSON list response from ORM objects
+(``Model.query.all()`` + attribute copying + ``jsonify``) with the lean path the JSON
+views use (column rows + ``app.serialization``).
+
+Usage:
+    python benchmarks/seed.py --rows 10000
+    python benchmarks/json_read_path.py --rows 10000 [--sizes 50,500,5000] [--repeat 20]
+
+Peak memory is measured with tracemalloc in a separate pass, since tracing slows
+allocation down and would distort the CPU numbers.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from seed import ROOT, default_database_url
+
+FIELDS = ('id', 'content', 'handled', 'organized', 'created_at', 'processed_at')
+
+
+def orm_path(limit):
+    from flask import jsonify
+    from app.capture.models import CaptureEntry
+    entries = CaptureEntry.query.order_by(CaptureEntry.created_at, CaptureEntry.id).limit(limit).all()
+    data = [
+        {'id': entry.id, 'content': entry.content, 'handled': entry.handled, 'organized': entry.organized,
+         'created_at': entry.created_at, 'processed_at': entry.processed_at}
+        for entry in entries
+    ]
+    return jsonify(data).get_data()
+
+
+def lean_path(limit, fields=FIELDS):
+    from sqlalchemy import select
+    from app import db
+    from app.capture.models import CaptureEntry
+    from app.serialization import json_response, row_dicts
+    rows = db.session.execute(
+        select(*(getattr(CaptureEntry, name) for name in fields))
+        .order_by(CaptureEntry.created_at, CaptureEntry.id).limit(limit)
+    ).all()
+    return json_response(row_dicts(rows, fields)).get_data()
+
+
+def measure(app, func, repeat):
+    from app import db
+    cpu = []
+    for _ in range(repeat):
+        with app.test_request_context():
+            started = time.process_time()
+            func()
+            cpu.append(time.process_time() - started)
+            db.session.remove()
+    with app.test_request_context():
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        db.session.remove()
+    return statistics.median(cpu) * 1000, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CPU and memory of the ORM and lean JSON read paths.')
+    parser.add_argument('--rows', type=int, default=10000, help='Seeded dataset to read from')
+    parser.add_argument('--sizes', default='50,500,5000', help='Comma-separated row counts per response')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL_DEV'] = default_database_url(args.rows)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('METRICS_ENABLED', '0')
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    app = create_app()
+    # Compare against jsonify's production (compact) output rather than debug indentation.
+    app.json.compact = True
+
+    print(f"{'rows':>6}  {'path':14} {'cpu ms':>8} {'peak KiB':>9}")
+    for size in (int(value) for value in args.sizes.split(',')):
+        results = {
+            'orm+jsonify': measure(app, lambda: orm_path(size), args.repeat),
+            'rows': measure(app, lambda: lean_path(size), args.repeat),
+            'rows ?fields=2': measure(app, lambda: lean_path(size, ('id', 'content')), args.repeat),
+        }
+        for name, (cpu_ms, peak_kib) in results.items():
+            print(f'{size:>6}  {name:14} {cpu_ms:8.2f} {peak_kib:9.0f}')
+        base_cpu, base_peak = results['orm+jsonify']
+        cpu_ms, peak_kib = results['rows']
+        print(f'{"":>6}  rows vs orm: cpu {(cpu_ms - base_cpu) / base_cpu * 100:+.0f}%, '
+              f'peak memory {(peak_kib - base_peak) / base_peak * 100:+.0f}%')
+
+
+if __name__ == '__main__':
+    main()
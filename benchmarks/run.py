@@ -0,0 +1,275 @@
+"""
+run.py
+
+Drive the app's endpoints against a seeded benchmark database and record latency
+percentiles, throughput and SQL query counts.
+
+Usage:
+    python benchmarks/seed.py --rows 100000
+    python benchmarks/run.py --rows 100000 [--server test-client|gunicorn] [--requests 200]
+
+Results are written to benchmarks/results/<dataset>-<server>.json with stable key
+order, so committing them makes a regression between commits show up as a plain
+diff. ``--compare`` prints the change against the file already there before
+overwriting it.
+
+``test-client`` runs requests in-process through Flask's test client and counts the
+SQL statements each request issues. ``gunicorn`` starts ``gunicorn wsgi:app`` on the
+same database and drives it over HTTP with ``--concurrency`` threads.
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from seed import ROOT, default_database_url
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# (name, path, headers); {project_id} is replaced by the largest project's id.
+ENDPOINTS = [
+    ('capture_inbox_html', '/capture/', {}),
+    ('capture_inbox_json', '/capture/', {'Accept': 'application/json'}),
+    ('capture_handled_json', '/capture/?handled=true&limit=200', {'Accept': 'application/json'}),
+    ('projects_html', '/projects/', {}),
+    ('projects_api', '/projects/api', {}),
+    ('project_tasks', '/projects/{project_id}/tasks', {}),
+    ('tasks_html', '/tasks/', {}),
+    ('tasks_next', '/tasks/next', {}),
+    ('agenda', '/agenda/', {}),
+    ('search', '/search?q=passport', {}),
+    ('capture_export_ndjson', '/capture/export?format=ndjson', {}),
+    ('tasks_export_csv', '/tasks/export?format=csv', {}),
+]
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(samples) - 1, int(round(fraction * len(samples) + 0.5)) - 1))
+    return samples[index]
+
+
+def summarize(latencies, elapsed, queries=None, statuses=None):
+    ordered = sorted(latencies)
+    result = {
+        'requests': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'throughput_rps': round(len(ordered) / elapsed, 1),
+    }
+    if queries is not None:
+        result['queries_per_request'] = round(sum(queries) / len(queries), 2)
+    if statuses:
+        result['statuses'] = sorted(set(statuses))
+    return result
+
+
+def largest_project_id(app):
+    from sqlalchemy import func, select
+    from app import db
+    from app.projects.models import Task
+    with app.app_context():
+        row = db.session.execute(
+            select(Task.project_id).where(Task.project_id.isnot(None))
+            .group_by(Task.project_id).order_by(func.count().desc()).limit(1)
+        ).first()
+    return row[0] if row else 1
+
+
+def run_test_client(app, endpoints, requests, warmup):
+    from sqlalchemy import event
+    from app import db
+
+    with app.app_context():
+        engine = db.engine
+    counter = {'queries': 0}
+
+    def count(*args):
+        counter['queries'] += 1
+
+    event.listen(engine, 'before_cursor_execute', count)
+    client = app.test_client()
+    results = {}
+    try:
+        for name, path, headers in endpoints:
+            for _ in range(warmup):
+                client.get(path, headers=headers)
+            latencies, queries, statuses = [], [], []
+            started = time.perf_counter()
+            for _ in range(requests):
+                counter['queries'] = 0
+                request_started = time.perf_counter()
+                response = client.get(path, headers=headers)
+                response.get_data()
+                latencies.append(time.perf_counter() - request_started)
+                queries.append(counter['queries'])
+                statuses.append(response.status_code)
+            results[name] = summarize(latencies, time.perf_counter() - started, queries, statuses)
+            print(f"{name:24} p50 {results[name]['p50_ms']:9.2f} ms  p99 {results[name]['p99_ms']:9.2f} ms  "
+                  f"{results[name]['throughput_rps']:8.1f} req/s  {results[name]['queries_per_request']} queries")
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return results
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_gunicorn(endpoints, requests, warmup, workers, concurrency):
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', '1',
+         '--bind', f'127.0.0.1:{port}', 'wsgi:app'],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    def fetch(path, headers):
+        request = urllib.request.Request(base_url + path, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                fetch('/', {})
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if time.time() > deadline or process.poll() is not None:
+                    raise RuntimeError('gunicorn did not start')
+                time.sleep(0.05)
+
+        results = {}
+        for name, path, headers in endpoints:
+            for _ in range(warmup):
+                fetch(path, headers)
+            latencies, statuses = [], []
+            lock = threading.Lock()
+            per_thread = max(1, requests // concurrency)
+
+            def worker():
+                for _ in range(per_thread):
+                    request_started = time.perf_counter()
+                    status = fetch(path, headers)
+                    elapsed = time.perf_counter() - request_started
+                    with lock:
+                        latencies.append(elapsed)
+                        statuses.append(status)
+
+            threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            results[name] = summarize(latencies, time.perf_counter() - started, statuses=statuses)
+            print(f"{name:24} p50 {results[name]['p50_ms']:9.2f} ms  p99 {results[name]['p99_ms']:9.2f} ms  "
+                  f"{results[name]['throughput_rps']:8.1f} req/s")
+        return results
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def compare(previous, current):
+    """Print the relative change of p50/p99/throughput/query counts per endpoint."""
+    print('\nChange against previous results:')
+    for name, now in current['endpoints'].items():
+        before = previous.get('endpoints', {}).get(name)
+        if not before:
+            print(f'{name:24} (new)')
+            continue
+        parts = []
+        for key in ('p50_ms', 'p99_ms', 'throughput_rps', 'queries_per_request'):
+            if key in now and key in before and before[key]:
+                parts.append(f'{key} {(now[key] - before[key]) / before[key] * 100:+.1f}%')
+        print(f"{name:24} {'  '.join(parts)}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the app endpoints against a seeded database.')
+    parser.add_argument('--rows', type=int, default=10000, help='Dataset size used with benchmarks/seed.py')
+    parser.add_argument('--database-url', help='Defaults to the seeded SQLite file for --rows')
+    parser.add_argument('--label', help='Results file name (defaults to <dialect>-<rows>-<server>)')
+    parser.add_argument('--server', choices=('test-client', 'gunicorn'), default='test-client')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--concurrency', type=int, default=4, help='client threads against gunicorn')
+    parser.add_argument('--only', help='Comma-separated endpoint names to run')
+    parser.add_argument('--compare', action='store_true', help='Show the change against the stored results')
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    database_url = args.database_url or default_database_url(args.rows)
+    os.environ['DATABASE_URL_DEV'] = database_url
+    os.environ.setdefault('FLASK_CONFIG', 'development')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, ROOT)
+    from app import create_app
+
+    app = create_app()
+    project_id = largest_project_id(app)
+    endpoints = [(name, path.format(project_id=project_id), headers) for name, path, headers in ENDPOINTS]
+    if args.only:
+        wanted = set(args.only.split(','))
+        endpoints = [endpoint for endpoint in endpoints if endpoint[0] in wanted]
+
+    if args.server == 'test-client':
+        endpoint_results = run_test_client(app, endpoints, args.requests, args.warmup)
+    else:
+        endpoint_results = run_gunicorn(endpoints, args.requests, args.warmup, args.workers, args.concurrency)
+
+    dialect = database_url.split(':', 1)[0].split('+', 1)[0]
+    label = args.label or f'{dialect}-{args.rows}-{args.server}'
+    result = {
+        'meta': {
+            'commit': git_commit(),
+            'dialect': dialect,
+            'rows': args.rows,
+            'server': args.server,
+            'requests': args.requests,
+            'python': sys.version.split()[0],
+        },
+        'endpoints': endpoint_results,
+    }
+
+    path = os.path.join(RESULTS_DIR, f'{label}.json')
+    if args.compare and os.path.exists(path):
+        with open(path) as f:
+            compare(json.load(f), result)
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'\nResults written to {os.path.relpath(path, ROOT)}')
+
+
+if __name__ == '__main__':
+    main()
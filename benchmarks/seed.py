@@ -0,0 +1,181 @@
+"""
+seed.py
+
+Create a benchmark database and fill it with a deterministic, realistic dataset using
+bulk inserts.
+
+Usage:
+    python benchmarks/seed.py --rows 100000 [--database-url URL]
+
+``--rows`` is the number of capture entries; projects and tasks scale with it. Without
+``--database-url`` a SQLite file under benchmarks/data/ is used. The schema is created
+by running the Alembic migrations, so triggers and indexes match a real deployment.
+
+Distributions:
+    * capture entries: ~75% handled or organized, created over the last two years with
+      more recent entries being denser; content length is roughly log-normal.
+    * projects: one per 200 entries (at least 20), 60% with a due date within
+      +/- 180 days.
+    * tasks: one per 10 entries, assigned to projects with a skewed (Zipf-like)
+      distribution so a few projects are large; 10% have no project. 60% are open,
+      most at the default priority; 40% have a due date within -30/+90 days. Ranks
+      are appended per (status, priority) bucket, as the app does.
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, 'benchmarks', 'data')
+CHUNK_SIZE = 10000
+
+WORDS = (
+    'call email review plan buy book fix read write draft send schedule renew pay '
+    'check order clean update prepare organise research ask follow up meeting report '
+    'invoice passport dentist car garden tax insurance groceries birthday gift trip '
+    'project budget notes idea article slides backup laptop phone bank doctor school'
+).split()
+
+
+def default_database_url(rows):
+    return f"sqlite:///{os.path.join(DATA_DIR, f'bench-{rows}.db')}"
+
+
+def _sentence(rng, mean_words):
+    length = max(1, int(rng.lognormvariate(0, 0.6) * mean_words))
+    return ' '.join(rng.choice(WORDS) for _ in range(length)).capitalize()
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _capture_rows(rng, count, now):
+    span = timedelta(days=730).total_seconds()
+    for _ in range(count):
+        # Squaring a uniform sample skews creation times towards the present.
+        created_at = now - timedelta(seconds=span * rng.random() ** 2)
+        roll = rng.random()
+        handled = roll < 0.45
+        organized = 0.45 <= roll < 0.75
+        processed_at = created_at + timedelta(hours=rng.expovariate(1 / 48)) if handled or organized else None
+        yield {
+            'content': _sentence(rng, 8),
+            'handled': handled,
+            'organized': organized,
+            'created_at': created_at,
+            'processed_at': processed_at,
+            'updated_at': processed_at or created_at,
+        }
+
+
+def _project_rows(rng, count, now):
+    statuses = ('active', 'active', 'active', 'someday', 'waiting', 'done')
+    for i in range(count):
+        due_date = (now + timedelta(days=rng.randint(-180, 180))).date() if rng.random() < 0.6 else None
+        yield {
+            'name': f'{_sentence(rng, 3)} #{i}',
+            'description': _sentence(rng, 15) if rng.random() < 0.7 else None,
+            'status': rng.choice(statuses),
+            'due_date': due_date,
+            'updated_at': now,
+        }
+
+
+def _task_rows(rng, count, project_ids, now):
+    from app.ranking import rank_between
+
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(project_ids))))
+    statuses, status_weights = ('open', 'waiting', 'someday', 'done'), (60, 10, 10, 20)
+    priorities, priority_weights = (0, 1, 2, 3), (10, 25, 45, 20)
+    last_ranks = {}
+    for _ in range(count):
+        project_id = rng.choices(project_ids, cum_weights=cum_weights)[0] if rng.random() < 0.9 else None
+        status = rng.choices(statuses, weights=status_weights)[0]
+        priority = rng.choices(priorities, weights=priority_weights)[0]
+        bucket = (status, priority)
+        last_ranks[bucket] = rank_between(last_ranks.get(bucket))
+        due_date = (now + timedelta(days=rng.randint(-30, 90))).date() if rng.random() < 0.4 else None
+        yield {'content': _sentence(rng, 5), 'project_id': project_id, 'status': status, 'priority': priority,
+               'rank': last_ranks[bucket], 'due_date': due_date, 'updated_at': now}
+
+
+def seed(database_url, rows, seed_value=42):
+    """Migrate ``database_url`` to the latest schema and insert the dataset."""
+    os.environ['DATABASE_URL_DEV'] = database_url
+    os.environ.setdefault('FLASK_CONFIG', 'development')
+    os.environ['DB_MIGRATE_EAGER'] = '1'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, ROOT)
+
+    from flask_migrate import upgrade
+    from sqlalchemy import insert, select
+    from app import create_app, db
+    from app.capture.models import CaptureEntry
+    from app.projects.models import Project, Task
+
+    rng = random.Random(seed_value)
+    now = datetime.utcnow().replace(microsecond=0)
+    project_count = max(20, rows // 200)
+    task_count = rows // 10
+
+    app = create_app()
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+        timings = {}
+        for name, model, generated in (
+            ('capture_entries', CaptureEntry, _capture_rows(rng, rows, now)),
+            ('projects', Project, _project_rows(rng, project_count, now)),
+        ):
+            started = time.perf_counter()
+            for chunk in _chunks(generated):
+                db.session.execute(insert(model), chunk)
+                db.session.commit()
+            timings[name] = time.perf_counter() - started
+
+        project_ids = list(db.session.execute(select(Project.id).order_by(Project.id)).scalars())
+        started = time.perf_counter()
+        for chunk in _chunks(_task_rows(rng, task_count, project_ids, now)):
+            db.session.execute(insert(Task), chunk)
+            db.session.commit()
+        timings['tasks'] = time.perf_counter() - started
+    return {'capture_entries': rows, 'projects': project_count, 'tasks': task_count, 'seconds': timings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed a benchmark database.')
+    parser.add_argument('--rows', type=int, default=10000, help='Number of capture entries')
+    parser.add_argument('--database-url', help='Defaults to a SQLite file in benchmarks/data/')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--force', action='store_true', help='Delete an existing SQLite file first')
+    args = parser.parse_args()
+
+    database_url = args.database_url or default_database_url(args.rows)
+    if database_url.startswith('sqlite:///'):
+        path = database_url[len('sqlite:///'):]
+        if os.path.exists(path):
+            if not args.force:
+                sys.exit(f'{path} already exists; use --force to recreate it')
+            os.remove(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    result = seed(database_url, args.rows, args.seed)
+    print(f"Seeded {database_url}: {result['capture_entries']} capture entries, "
+          f"{result['projects']} projects, {result['tasks']} tasks "
+          f"({', '.join(f'{name} {seconds:.1f}s' for name, seconds in result['seconds'].items())})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+sqlite_concurrency.py
+
+Measure write and read throughput of one SQLite database shared by N worker processes,
+the way gunicorn runs the app on a single node, for each SQLite profile.
+
+Usage:
+    python benchmarks/seed.py --rows 10000
+    python benchmarks/sqlite_concurrency.py --rows 10000 [--workers 1,2,4,8] [--duration 5]
+
+Every run starts from a fresh copy of the seeded database. Each worker process creates
+the app with the given SQLITE_PROFILE and, until the deadline, either posts a capture
+entry (``--write-ratio`` of the time) or reads the first page of the inbox as JSON.
+Non-2xx responses (``database is locked`` surfaces as a 500) are counted as errors.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from seed import DATA_DIR, ROOT, default_database_url
+from run import RESULTS_DIR, git_commit, percentile
+
+
+def _copy_database(source, target, profile):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(target + suffix):
+            os.remove(target + suffix)
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+        # WAL mode is stored in the file; the default profile must start from SQLite's
+        # own rollback journal.
+        dst.execute('PRAGMA journal_mode=DELETE' if profile == 'default' else 'PRAGMA journal_mode=WAL')
+    finally:
+        src.close()
+        dst.close()
+
+
+def _worker(database_url, profile, start_at, deadline, write_ratio, seed_value, results):
+    os.environ.update({
+        'DATABASE_URL_DEV': database_url,
+        'SQLITE_PROFILE': profile,
+        'LOG_LEVEL': 'WARNING',
+        'METRICS_ENABLED': '0',
+    })
+    sys.path.insert(0, ROOT)
+    from app import create_app
+
+    counts = {'writes': 0, 'reads': 0, 'write_errors': 0, 'read_errors': 0}
+    write_latencies = []
+    read_latencies = []
+    try:
+        app = create_app()
+        client = app.test_client()
+        rng = random.Random(seed_value)
+        time.sleep(max(0.0, start_at - time.time()))
+        while time.time() < deadline:
+            started = time.perf_counter()
+            if rng.random() < write_ratio:
+                response = client.post('/capture/', json={'content': f'concurrency {seed_value} {counts["writes"]}'})
+                write_latencies.append(time.perf_counter() - started)
+                counts['writes' if response.status_code < 300 else 'write_errors'] += 1
+            else:
+                response = client.get('/capture/', headers={'Accept': 'application/json'})
+                response.get_data()
+                read_latencies.append(time.perf_counter() - started)
+                counts['reads' if response.status_code < 300 else 'read_errors'] += 1
+    except Exception as e:
+        results.put(repr(e))
+        raise
+    results.put((counts, write_latencies, read_latencies))
+
+
+def run(database_path, profile, workers, duration, write_ratio):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    # Leave time for every process to import and create the app before the clock starts.
+    start_at = time.time() + 2.0 + workers
+    processes = [
+        context.Process(target=_worker, args=(f'sqlite:///{database_path}', profile, start_at,
+                                              start_at + duration, write_ratio, index, results))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    for item in collected:
+        if isinstance(item, str):
+            raise RuntimeError(f'A worker failed: {item}')
+
+    totals = {key: sum(counts[key] for counts, _, _ in collected) for key in collected[0][0]}
+    writes = sorted(latency for _, latencies, _ in collected for latency in latencies)
+    reads = sorted(latency for _, _, latencies in collected for latency in latencies)
+    return {
+        'writes_per_s': round(totals['writes'] / duration, 1),
+        'reads_per_s': round(totals['reads'] / duration, 1),
+        'write_errors': totals['write_errors'],
+        'read_errors': totals['read_errors'],
+        'write_p99_ms': round(percentile(writes, 0.99) * 1000, 3) if writes else None,
+        'read_p99_ms': round(percentile(reads, 0.99) * 1000, 3) if reads else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite throughput with several worker processes.')
+    parser.add_argument('--rows', type=int, default=10000, help='Seeded dataset to start from')
+    parser.add_argument('--workers', default='1,2,4,8', help='Comma-separated worker counts')
+    parser.add_argument('--profiles', default='default,concurrent')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    source = default_database_url(args.rows)[len('sqlite:///'):]
+    if not os.path.exists(source):
+        sys.exit(f'{source} does not exist; run benchmarks/seed.py --rows {args.rows} first')
+
+    results = {}
+    for profile in args.profiles.split(','):
+        for workers in (int(value) for value in args.workers.split(',')):
+            target = os.path.join(DATA_DIR, f'concurrency-{profile}.db')
+            _copy_database(source, target, profile)
+            result = run(target, profile, workers, args.duration, args.write_ratio)
+            results[f'{profile}-{workers}'] = result
+            print(f"{profile:11} {workers:2} workers  {result['writes_per_s']:8.1f} writes/s  "
+                  f"{result['reads_per_s']:8.1f} reads/s  errors {result['write_errors']}/{result['read_errors']}  "
+                  f"write p99 {result['write_p99_ms']} ms")
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f'sqlite-concurrency-{args.rows}.json')
+        with open(path, 'w') as f:
+            json.dump({
+                'meta': {'commit': git_commit(), 'rows': args.rows, 'duration_s': args.duration,
+                         'write_ratio': args.write_ratio, 'python': sys.version.split()[0],
+                         'sqlite': sqlite3.sqlite_version},
+                'runs': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'\nResults written to {os.path.relpath(path, ROOT)}')
+
+
+if __name__ == '__main__':
+    main()
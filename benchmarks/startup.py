@@ -0,0 +1,97 @@
+"""
+startup.py
+
+Measure cold-start latency of the app: the time from spawning a server process for
+``wsgi:app`` to the first successfully served request.
+
+Usage:
+    python benchmarks/startup.py [--runs N] [--server gunicorn|werkzeug] [--path /] [--json]
+
+The server inherits the current environment, so point DATABASE_URL_DEV (or
+FLASK_CONFIG and the matching variable) at the database to start against.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WERKZEUG_SERVER = (
+    "import sys; from werkzeug.serving import run_simple; from wsgi import app; "
+    "run_simple('127.0.0.1', int(sys.argv[1]), app, use_reloader=False)"
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(server, port):
+    if server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '--workers', '1', '--bind', f'127.0.0.1:{port}', 'wsgi:app']
+    return [sys.executable, '-c', WERKZEUG_SERVER, str(port)]
+
+
+def measure_once(server, path, timeout):
+    """Start one server process and return seconds until ``path`` answered with a 2xx/3xx."""
+    port = free_port()
+    url = f'http://127.0.0.1:{port}{path}'
+    started = time.perf_counter()
+    process = subprocess.Popen(server_command(server, port), cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f'{server} exited with code {process.returncode} before serving a request')
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status < 400:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.005)
+        raise RuntimeError(f'No response from {url} within {timeout}s')
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure time from process start to first served request.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--server', choices=('gunicorn', 'werkzeug'), default='gunicorn')
+    parser.add_argument('--path', default='/')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--json', action='store_true', help='Print the result as one JSON object')
+    args = parser.parse_args()
+
+    samples = [measure_once(args.server, args.path, args.timeout) * 1000 for _ in range(args.runs)]
+    result = {
+        'server': args.server,
+        'path': args.path,
+        'runs': args.runs,
+        'min_ms': round(min(samples), 1),
+        'median_ms': round(statistics.median(samples), 1),
+        'max_ms': round(max(samples), 1),
+    }
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"{args.server} {args.path}: min {result['min_ms']} ms, median {result['median_ms']} ms, "
+              f"max {result['max_ms']} ms over {args.runs} runs")
+
+
+if __name__ == '__main__':
+    main()
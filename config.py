@@ -1,22 +1,169 @@
 import os
 
+def _env(name, default, cast=int):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    if cast is bool:
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return cast(value)
+
+def _is_memory_sqlite(database_uri):
+    return database_uri.startswith('sqlite') and (':memory:' in database_uri or database_uri.rstrip('/') == 'sqlite:')
+
+def engine_options(database_uri, pool_size, max_overflow, pool_timeout, pool_recycle, pool_pre_ping,
+                   statement_timeout_ms=None):
+    """Build SQLALCHEMY_ENGINE_OPTIONS from per-environment defaults.
+
+    Every value can be overridden from the environment (DB_POOL_SIZE, DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT_MS).
+    In-memory SQLite uses a single static connection, so no pool sizing applies.
+    """
+    if not database_uri or _is_memory_sqlite(database_uri):
+        return {}
+    options = {
+        'pool_size': _env('DB_POOL_SIZE', pool_size),
+        'max_overflow': _env('DB_MAX_OVERFLOW', max_overflow),
+        'pool_timeout': _env('DB_POOL_TIMEOUT', pool_timeout, float),
+        'pool_recycle': _env('DB_POOL_RECYCLE', pool_recycle),
+        'pool_pre_ping': _env('DB_POOL_PRE_PING', pool_pre_ping, bool),
+    }
+    statement_timeout_ms = _env('DB_STATEMENT_TIMEOUT_MS', statement_timeout_ms)
+    if statement_timeout_ms and database_uri.startswith('postgres'):
+        options['connect_args'] = {'options': f'-c statement_timeout={int(statement_timeout_ms)}'}
+    return options
+
+def _heroku_database_url():
+    url = os.environ.get('DATABASE_URL')
+    return url.replace("postgres://", "postgresql://") if url else None
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    CAPTURE_PAGE_SIZE = _env('CAPTURE_PAGE_SIZE', 50)
+    CAPTURE_PAGE_SIZE_MAX = _env('CAPTURE_PAGE_SIZE_MAX', 500)
+    CAPTURE_BULK_CHUNK_SIZE = _env('CAPTURE_BULK_CHUNK_SIZE', 1000)
+    # Largest single item of a bulk upload; a longer one ends the upload with an error.
+    CAPTURE_BULK_MAX_ITEM_BYTES = _env('CAPTURE_BULK_MAX_ITEM_BYTES', 1024 * 1024)
+    CAPTURE_TRIAGE_MAX_IDS = _env('CAPTURE_TRIAGE_MAX_IDS', 1000)
+    BULK_DELETE_MAX_IDS = _env('BULK_DELETE_MAX_IDS', 1000)
+    SEARCH_PAGE_SIZE = _env('SEARCH_PAGE_SIZE', 20)
+    SEARCH_PAGE_SIZE_MAX = _env('SEARCH_PAGE_SIZE_MAX', 100)
+    PROJECTS_PAGE_SIZE = _env('PROJECTS_PAGE_SIZE', 50)
+    PROJECTS_PAGE_SIZE_MAX = _env('PROJECTS_PAGE_SIZE_MAX', 500)
+    TASKS_PAGE_SIZE = _env('TASKS_PAGE_SIZE', 100)
+    TASKS_PAGE_SIZE_MAX = _env('TASKS_PAGE_SIZE_MAX', 1000)
+    NEXT_ACTIONS_SIZE = _env('NEXT_ACTIONS_SIZE', 20)
+    SYNC_PAGE_SIZE = _env('SYNC_PAGE_SIZE', 500)
+    SYNC_PAGE_SIZE_MAX = _env('SYNC_PAGE_SIZE_MAX', 5000)
+    LOG_LEVEL = _env('LOG_LEVEL', 'INFO', str)
+    LOG_FORMAT = _env('LOG_FORMAT', 'json', str)
+    LOG_PAYLOAD_SAMPLE_RATE = _env('LOG_PAYLOAD_SAMPLE_RATE', 0.01, float)
+    # Collect checkout/wait statistics on the connection pool (see /pool-stats).
+    DB_POOL_STATS = _env('DB_POOL_STATS', True, bool)
+    # Open a connection in create_app and exit if the database is unreachable.
+    DB_STARTUP_CHECK = _env('DB_STARTUP_CHECK', False, bool)
+    # Mixed into list ETags so a deploy that changes templates or serializers invalidates them.
+    ETAG_VERSION = _env('ETAG_VERSION', _env('HEROKU_SLUG_COMMIT', '', str), str)
+    # Load Flask-Migrate outside the flask CLI too (it is always loaded by `flask db`).
+    DB_MIGRATE_EAGER = _env('DB_MIGRATE_EAGER', False, bool)
+    # Log the resolved configuration and every URL rule when the app is created.
+    STARTUP_DIAGNOSTICS = _env('STARTUP_DIAGNOSTICS', False, bool)
+    # Per-endpoint latency and SQL metrics, served in Prometheus format at /metrics.
+    METRICS_ENABLED = _env('METRICS_ENABLED', True, bool)
+    # Log and count requests that run one statement shape more often than this (0 disables).
+    METRICS_REPEATED_STATEMENT_THRESHOLD = _env('METRICS_REPEATED_STATEMENT_THRESHOLD', 10, int)
+    # Add a Server-Timing header with total and SQL time to every response.
+    SERVER_TIMING = _env('SERVER_TIMING', False, bool)
+    # Read-through cache for the project and task listings (see app/cache.py).
+    CACHE_BACKEND = _env('CACHE_BACKEND', 'memory', str)
+    CACHE_DEFAULT_TTL = _env('CACHE_DEFAULT_TTL', 60)
+    CACHE_MAX_ENTRIES = _env('CACHE_MAX_ENTRIES', 1024)
+    CACHE_REDIS_URL = _env('CACHE_REDIS_URL', _env('REDIS_URL', None, str), str)
+    CACHE_KEY_PREFIX = _env('CACHE_KEY_PREFIX', 'make-life:', str)
+    # Accept POST /capture/ into a local fsync'd journal and write it to the database
+    # in the background (see app/capture/journal.py).
+    CAPTURE_JOURNAL = _env('CAPTURE_JOURNAL', False, bool)
+    CAPTURE_JOURNAL_DIR = _env('CAPTURE_JOURNAL_DIR', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'instance', 'capture-journal'), str)
+    CAPTURE_JOURNAL_FLUSH_INTERVAL = _env('CAPTURE_JOURNAL_FLUSH_INTERVAL', 0.2, float)
+    CAPTURE_JOURNAL_BATCH_SIZE = _env('CAPTURE_JOURNAL_BATCH_SIZE', 500)
+    # Move entries processed this many days ago to capture_archive, in batches of
+    # CAPTURE_ARCHIVE_BATCH_SIZE with CAPTURE_ARCHIVE_PAUSE seconds between them
+    # (see app/capture/archive.py). CAPTURE_ARCHIVE_INTERVAL > 0 also runs it every
+    # that many seconds in each process; otherwise schedule `flask capture archive`.
+    CAPTURE_ARCHIVE_AFTER_DAYS = _env('CAPTURE_ARCHIVE_AFTER_DAYS', 30.0, float)
+    CAPTURE_ARCHIVE_BATCH_SIZE = _env('CAPTURE_ARCHIVE_BATCH_SIZE', 500)
+    CAPTURE_ARCHIVE_PAUSE = _env('CAPTURE_ARCHIVE_PAUSE', 0.05, float)
+    CAPTURE_ARCHIVE_INTERVAL = _env('CAPTURE_ARCHIVE_INTERVAL', 0.0, float)
+    # Connection pragmas for SQLite databases: 'concurrent' (WAL, busy timeout, larger
+    # caches; see app/db_sqlite.py) or 'default' to leave SQLite's own settings. The
+    # development and testing configurations default to 'concurrent'.
+    SQLITE_PROFILE = _env('SQLITE_PROFILE', 'default', str)
+    SQLITE_BUSY_TIMEOUT_MS = _env('SQLITE_BUSY_TIMEOUT_MS', None)
+    # Seconds between WAL checkpoints run by each process (0 disables).
+    SQLITE_CHECKPOINT_INTERVAL = _env('SQLITE_CHECKPOINT_INTERVAL', 60.0, float)
+    SQLITE_CHECKPOINT_MODE = _env('SQLITE_CHECKPOINT_MODE', 'PASSIVE', str)
+    # Live updates (GET /sync/events): change log poll interval, keepalive
+    # interval and lifetime of one stream in seconds, and open streams per process.
+    # Each stream holds a gunicorn thread, so keep EVENTS_MAX_STREAMS below --threads.
+    EVENTS_POLL_INTERVAL = _env('EVENTS_POLL_INTERVAL', 0.5, float)
+    EVENTS_HEARTBEAT_INTERVAL = _env('EVENTS_HEARTBEAT_INTERVAL', 15.0, float)
+    EVENTS_STREAM_TIMEOUT = _env('EVENTS_STREAM_TIMEOUT', 300.0, float)
+    EVENTS_MAX_STREAMS = _env('EVENTS_MAX_STREAMS', 4)
+    EVENTS_RETRY_MS = _env('EVENTS_RETRY_MS', 2000)
+    # Threads of `uvicorn asgi:app` that run the Flask views not served by async handlers
+    # (a streamed response holds its thread until it ends), and the largest body the
+    # async handlers read; bodies for Flask are streamed to it and capped by MAX_CONTENT_LENGTH.
+    ASGI_WSGI_THREADS = _env('ASGI_WSGI_THREADS', 8)
+    ASGI_MAX_BODY_BYTES = _env('ASGI_MAX_BODY_BYTES', 1024 * 1024)
+    # Largest request body Flask accepts, in bytes (unset: no limit).
+    MAX_CONTENT_LENGTH = _env('MAX_CONTENT_LENGTH', None)
+    # Days of change log kept by `flask sync compact`; older /sync cursors get 410.
+    SYNC_RETENTION_DAYS = _env('SYNC_RETENTION_DAYS', 30.0, float)
+    # /agenda: default range length, longest range listing items, and the window of
+    # the "upcoming" count, all in days.
+    AGENDA_DAYS = _env('AGENDA_DAYS', 7)
+    AGENDA_MAX_DAYS = _env('AGENDA_MAX_DAYS', 366)
+    AGENDA_UPCOMING_DAYS = _env('AGENDA_UPCOMING_DAYS', 7)
+    # What deleting a project does to its tasks: 'set-null' detaches them, 'cascade'
+    # deletes them. Read by migration 7c1e4b9d2a58, which installs it as the database's
+    # ON DELETE rule; to change it later, run `flask projects delete-rule`.
+    PROJECT_DELETE_TASKS = _env('PROJECT_DELETE_TASKS', 'set-null', str)
+    # Rows per batch of a migration's data backfill, and seconds to wait between
+    # batches so live traffic keeps up (see app/backfill.py).
+    BACKFILL_BATCH_SIZE = _env('BACKFILL_BATCH_SIZE', 1000)
+    BACKFILL_PAUSE = _env('BACKFILL_PAUSE', 0.0, float)
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    LOG_LEVEL = _env('LOG_LEVEL', 'DEBUG', str)
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL_DEV')
+    SQLITE_PROFILE = _env('SQLITE_PROFILE', 'concurrent', str)
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, pool_size=5, max_overflow=10,
+                                               pool_timeout=30, pool_recycle=-1, pool_pre_ping=False)
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL_TEST')
+    SQLITE_PROFILE = _env('SQLITE_PROFILE', 'concurrent', str)
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, pool_size=2, max_overflow=2,
+                                               pool_timeout=10, pool_recycle=-1, pool_pre_ping=True,
+                                               statement_timeout_ms=30000)
 
 class StagingConfig(Config):
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL').replace("postgres://", "postgresql://") if os.environ.get('DATABASE_URL') else None
+    SQLALCHEMY_DATABASE_URI = _heroku_database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, pool_size=3, max_overflow=2,
+                                               pool_timeout=10, pool_recycle=1800, pool_pre_ping=True,
+                                               statement_timeout_ms=30000)
 
 class ProductionConfig(Config):
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL').replace("postgres://", "postgresql://") if os.environ.get('DATABASE_URL') else None
+    # Each gunicorn worker holds up to pool_size + max_overflow connections; keep
+    # WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) below the Postgres plan's limit.
+    SQLALCHEMY_DATABASE_URI = _heroku_database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, pool_size=5, max_overflow=5,
+                                               pool_timeout=10, pool_recycle=1800, pool_pre_ping=True,
+                                               statement_timeout_ms=15000)
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,26 @@
+"""Add (created_at, id) index to capture_entries for keyset pagination
+
+Revision ID: 3f1c2a7d9e41
+Revises: 4b4fcdfb761d
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d9e41'
+down_revision = '4b4fcdfb761d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows captured before the timestamp columns existed have a NULL created_at, which
+    # would fall out of the (created_at, id) cursor; a2f8c4e6b391 fills it in.
+    op.create_index('ix_capture_entries_created_at_id', 'capture_entries', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_capture_entries_created_at_id', table_name='capture_entries')
@@ -0,0 +1,30 @@
+"""Add idempotency_key to capture_entries
+
+Entries written from the capture journal carry the key they were accepted under, so
+replaying a journal segment never inserts an entry twice.
+
+Revision ID: 5e1f9b3d7a20
+Revises: c2e8d4a6f913
+Create Date: 2026-10-18 14:05:52.318440
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1f9b3d7a20'
+down_revision = 'c2e8d4a6f913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A plain ADD COLUMN: rebuilding the table on SQLite would drop the search triggers.
+    op.add_column('capture_entries', sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_capture_entries_idempotency_key'), 'capture_entries', ['idempotency_key'], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_capture_entries_idempotency_key'), table_name='capture_entries')
+    op.drop_column('capture_entries', 'idempotency_key')
@@ -0,0 +1,40 @@
+"""Detach or delete the tasks of a deleted project in the database
+
+PROJECT_DELETE_TASKS ('set-null' or 'cascade') picks the rule, installed by
+app/projects/delete_rule.py: on Postgres as the ON DELETE action of task.project_id's
+foreign key, on SQLite as an AFTER DELETE trigger on project. The foreign key is
+re-added NOT VALID in the migration's transaction and validated after that commits,
+in a transaction of its own, so the check of existing rows does not block writes.
+
+Revision ID: 7c1e4b9d2a58
+Revises: b5d8e3f7a046
+Create Date: 2026-10-18 22:02:37.115804
+
+"""
+from alembic import op
+from flask import current_app
+
+from app.projects.delete_rule import install_rule, remove_rule, validate_foreign_key
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e4b9d2a58'
+down_revision = 'b5d8e3f7a046'
+branch_labels = None
+depends_on = None
+
+
+def _validate():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            validate_foreign_key(op.get_bind())
+
+
+def upgrade():
+    install_rule(op.get_bind(), current_app.config.get('PROJECT_DELETE_TASKS', 'set-null'))
+    _validate()
+
+
+def downgrade():
+    remove_rule(op.get_bind())
+    _validate()
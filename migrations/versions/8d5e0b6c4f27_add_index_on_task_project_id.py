@@ -0,0 +1,24 @@
+"""Add index on task.project_id
+
+Revision ID: 8d5e0b6c4f27
+Revises: 3f1c2a7d9e41
+Create Date: 2026-10-18 10:02:15.493877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d5e0b6c4f27'
+down_revision = '3f1c2a7d9e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_task_project_id'), 'task', ['project_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_task_project_id'), table_name='task')
@@ -0,0 +1,104 @@
+"""Add change_log for incremental sync of capture entries, projects and tasks
+
+Triggers on each table append one row per inserted, updated or deleted record, so the
+Core bulk statements (ingest, triage, journal flush) are logged like ORM writes. On
+Postgres every row also records the writing transaction's id, which /sync uses to
+serve only changes no open transaction can still land behind.
+
+Revision ID: 9b4d2e7f1a63
+Revises: 5e1f9b3d7a20
+Create Date: 2026-10-18 16:12:08.541193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4d2e7f1a63'
+down_revision = '5e1f9b3d7a20'
+branch_labels = None
+depends_on = None
+
+# table -> kind stored in change_log.kind
+SOURCES = {
+    'capture_entries': 'capture',
+    'project': 'project',
+    'task': 'task',
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    postgres = dialect == 'postgresql'
+    op.create_table(
+        'change_log',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), primary_key=True),
+        sa.Column('txid', sa.BigInteger(), nullable=False,
+                  server_default=sa.text('txid_current()') if postgres else sa.text('0')),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('record_id', sa.Integer(), nullable=False),
+        sa.Column('op', sa.String(length=8), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=False,
+                  server_default=sa.text("(now() AT TIME ZONE 'utc')") if postgres else sa.text('CURRENT_TIMESTAMP')),
+        # Never reuse the id of a compacted row: cursors must keep increasing.
+        sqlite_autoincrement=True,
+    )
+    op.create_index('ix_change_log_txid_id', 'change_log', ['txid', 'id'])
+    op.create_index('ix_change_log_kind_record_id', 'change_log', ['kind', 'record_id'])
+    op.create_table(
+        'change_log_compaction',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('horizon_txid', sa.BigInteger(), nullable=False),
+        sa.Column('horizon_id', sa.BigInteger(), nullable=False),
+        sa.Column('removed', sa.Integer(), nullable=False),
+        sa.Column('compacted_at', sa.DateTime(), nullable=False),
+    )
+
+    if dialect == 'sqlite':
+        for table, kind in SOURCES.items():
+            op.execute(
+                f"CREATE TRIGGER {table}_change_log_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO change_log (kind, record_id, op) VALUES ('{kind}', new.id, 'upsert'); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_change_log_au AFTER UPDATE ON {table} BEGIN "
+                f"INSERT INTO change_log (kind, record_id, op) VALUES ('{kind}', new.id, 'upsert'); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_change_log_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO change_log (kind, record_id, op) VALUES ('{kind}', old.id, 'delete'); END"
+            )
+    elif postgres:
+        op.execute(
+            "CREATE FUNCTION change_log_record() RETURNS trigger AS $$ "
+            "BEGIN "
+            "IF TG_OP = 'DELETE' THEN "
+            "INSERT INTO change_log (kind, record_id, op) VALUES (TG_ARGV[0], OLD.id, 'delete'); "
+            "ELSE "
+            "INSERT INTO change_log (kind, record_id, op) VALUES (TG_ARGV[0], NEW.id, 'upsert'); "
+            "END IF; "
+            "RETURN NULL; "
+            "END $$ LANGUAGE plpgsql"
+        )
+        for table, kind in SOURCES.items():
+            op.execute(
+                f"CREATE TRIGGER {table}_change_log AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE PROCEDURE change_log_record('{kind}')"
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for table in SOURCES:
+            for suffix in ('ai', 'au', 'ad'):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_change_log_{suffix}")
+    elif dialect == 'postgresql':
+        for table in SOURCES:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_change_log ON {table}")
+        op.execute("DROP FUNCTION IF EXISTS change_log_record()")
+    op.drop_table('change_log_compaction')
+    op.drop_index('ix_change_log_kind_record_id', table_name='change_log')
+    op.drop_index('ix_change_log_txid_id', table_name='change_log')
+    op.drop_table('change_log')
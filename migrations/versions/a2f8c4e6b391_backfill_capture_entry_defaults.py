@@ -0,0 +1,50 @@
+"""Backfill the flags and created_at of capture entries from before b9d32c0a835d
+
+b9d32c0a835d added handled, organized and created_at as nullable columns without
+filling them, so entries captured before it have NULLs there. NULL flags fall out of
+every handled/organized filter, the inbox included, and a NULL created_at falls out
+of the (created_at, id) cursor of 3f1c2a7d9e41. The flags become false and
+created_at the time the entry was processed, or now; in batches, see app/backfill.py.
+Making the columns NOT NULL is left to a later revision, which should call
+ensure_backfilled first.
+
+Revision ID: a2f8c4e6b391
+Revises: 7c1e4b9d2a58
+Create Date: 2026-10-18 22:41:09.562371
+
+"""
+import sqlalchemy as sa
+
+from app.backfill import backfill_update, reset_backfill
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2f8c4e6b391'
+down_revision = '7c1e4b9d2a58'
+branch_labels = None
+depends_on = None
+
+capture_entries = sa.table(
+    'capture_entries',
+    sa.column('id', sa.Integer),
+    sa.column('handled', sa.Boolean),
+    sa.column('organized', sa.Boolean),
+    sa.column('created_at', sa.DateTime),
+    sa.column('processed_at', sa.DateTime),
+)
+
+
+def upgrade():
+    entries = capture_entries.c
+    backfill_update(
+        revision, capture_entries,
+        {'handled': sa.func.coalesce(entries.handled, sa.false()),
+         'organized': sa.func.coalesce(entries.organized, sa.false()),
+         'created_at': sa.func.coalesce(entries.created_at, entries.processed_at, sa.func.current_timestamp())},
+        where=sa.or_(entries.handled.is_(None), entries.organized.is_(None), entries.created_at.is_(None)),
+    )
+
+
+def downgrade():
+    # Which values were NULL is not recorded, so the backfilled values stay.
+    reset_backfill(revision)
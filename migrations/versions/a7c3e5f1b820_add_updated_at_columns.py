@@ -0,0 +1,46 @@
+"""Add updated_at to capture_entries, project and task
+
+Revision ID: a7c3e5f1b820
+Revises: 8d5e0b6c4f27
+Create Date: 2026-10-18 11:20:04.671532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e5f1b820'
+down_revision = '8d5e0b6c4f27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('capture_entries', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    with op.batch_alter_table('project', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE capture_entries SET updated_at = COALESCE(processed_at, created_at, CURRENT_TIMESTAMP)")
+    op.execute("UPDATE project SET updated_at = CURRENT_TIMESTAMP")
+    op.execute("UPDATE task SET updated_at = CURRENT_TIMESTAMP")
+
+    op.create_index(op.f('ix_capture_entries_updated_at'), 'capture_entries', ['updated_at'], unique=False)
+    op.create_index(op.f('ix_project_updated_at'), 'project', ['updated_at'], unique=False)
+    op.create_index(op.f('ix_task_updated_at'), 'task', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_task_updated_at'), table_name='task')
+    op.drop_index(op.f('ix_project_updated_at'), table_name='project')
+    op.drop_index(op.f('ix_capture_entries_updated_at'), table_name='capture_entries')
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+    with op.batch_alter_table('project', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+    with op.batch_alter_table('capture_entries', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
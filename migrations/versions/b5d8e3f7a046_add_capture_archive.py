@@ -0,0 +1,74 @@
+"""Add capture_archive for processed entries moved out of capture_entries
+
+Archived entries are full-text indexed like live ones: on SQLite they go into
+search_index with kind 'archive' (rowid id * 4, a code no other kind uses), on
+Postgres capture_archive gets its own generated tsvector column and GIN index. The
+index on capture_entries.processed_at lets the archiver find the oldest processed
+entries without a scan.
+
+Revision ID: b5d8e3f7a046
+Revises: f6c2a9e4b178
+Create Date: 2026-10-18 21:31:14.480652
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d8e3f7a046'
+down_revision = 'f6c2a9e4b178'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    op.create_index(op.f('ix_capture_entries_processed_at'), 'capture_entries', ['processed_at'], unique=False)
+    op.create_table(
+        'capture_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('handled', sa.Boolean(), nullable=True),
+        sa.Column('organized', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_capture_archive_archived_at'), 'capture_archive', ['archived_at'], unique=False)
+
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE TRIGGER capture_archive_search_ai AFTER INSERT ON capture_archive BEGIN "
+            "INSERT INTO search_index (rowid, title, body, kind, ref_id) "
+            "VALUES (new.id * 4, '', new.content, 'archive', new.id); END"
+        )
+        op.execute(
+            "CREATE TRIGGER capture_archive_search_au AFTER UPDATE OF content ON capture_archive BEGIN "
+            "UPDATE search_index SET body = new.content WHERE rowid = old.id * 4; END"
+        )
+        op.execute(
+            "CREATE TRIGGER capture_archive_search_ad AFTER DELETE ON capture_archive BEGIN "
+            "DELETE FROM search_index WHERE rowid = old.id * 4; END"
+        )
+    elif dialect == 'postgresql':
+        op.execute(
+            "ALTER TABLE capture_archive ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('english', COALESCE(content, ''))) STORED"
+        )
+        op.create_index('ix_capture_archive_search_vector', 'capture_archive', ['search_vector'],
+                        postgresql_using='gin')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for suffix in ('ai', 'au', 'ad'):
+            op.execute(f"DROP TRIGGER IF EXISTS capture_archive_search_{suffix}")
+        op.execute("DELETE FROM search_index WHERE kind = 'archive'")
+    elif dialect == 'postgresql':
+        op.drop_index('ix_capture_archive_search_vector', table_name='capture_archive')
+    op.drop_index(op.f('ix_capture_archive_archived_at'), table_name='capture_archive')
+    op.drop_table('capture_archive')
+    op.drop_index(op.f('ix_capture_entries_processed_at'), table_name='capture_entries')
@@ -0,0 +1,85 @@
+"""Add full-text search index for capture entries, tasks and projects
+
+SQLite gets a single FTS5 table maintained by triggers; Postgres gets a stored
+generated tsvector column with a GIN index on each table.
+
+Revision ID: c2e8d4a6f913
+Revises: a7c3e5f1b820
+Create Date: 2026-10-18 12:41:37.209816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2e8d4a6f913'
+down_revision = 'a7c3e5f1b820'
+branch_labels = None
+depends_on = None
+
+# (table, kind, kind code, title template, body template, watched columns); {row} is
+# replaced by the trigger's NEW row or by the table name for the backfill.
+SQLITE_SOURCES = [
+    ('capture_entries', 'capture', 1, "''", '{row}.content', 'content'),
+    ('task', 'task', 2, "''", '{row}.content', 'content'),
+    ('project', 'project', 3, '{row}.name', "COALESCE({row}.description, '')", 'name, description'),
+]
+
+POSTGRES_VECTORS = {
+    'capture_entries': "to_tsvector('english', COALESCE(content, ''))",
+    'task': "to_tsvector('english', COALESCE(content, ''))",
+    'project': "setweight(to_tsvector('english', COALESCE(name, '')), 'A') || "
+               "setweight(to_tsvector('english', COALESCE(description, '')), 'B')",
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE search_index USING fts5("
+            "title, body, kind UNINDEXED, ref_id UNINDEXED, "
+            "tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+        for table, kind, code, title, body, watched in SQLITE_SOURCES:
+            new_title, new_body = title.format(row='new'), body.format(row='new')
+            op.execute(
+                f"CREATE TRIGGER {table}_search_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO search_index (rowid, title, body, kind, ref_id) "
+                f"VALUES (new.id * 4 + {code}, {new_title}, {new_body}, '{kind}', new.id); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_search_au AFTER UPDATE OF {watched} ON {table} BEGIN "
+                f"UPDATE search_index SET title = {new_title}, body = {new_body} "
+                f"WHERE rowid = old.id * 4 + {code}; END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_search_ad AFTER DELETE ON {table} BEGIN "
+                f"DELETE FROM search_index WHERE rowid = old.id * 4 + {code}; END"
+            )
+            op.execute(
+                f"INSERT INTO search_index (rowid, title, body, kind, ref_id) "
+                f"SELECT id * 4 + {code}, {title.format(row=table)}, {body.format(row=table)}, '{kind}', id "
+                f"FROM {table}"
+            )
+    elif dialect == 'postgresql':
+        for table, vector in POSTGRES_VECTORS.items():
+            op.execute(
+                f"ALTER TABLE {table} ADD COLUMN search_vector tsvector "
+                f"GENERATED ALWAYS AS ({vector}) STORED"
+            )
+            op.create_index(f'ix_{table}_search_vector', table, ['search_vector'], postgresql_using='gin')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for table, _, _, _, _, _ in SQLITE_SOURCES:
+            for suffix in ('ai', 'au', 'ad'):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_search_{suffix}")
+        op.execute("DROP TABLE IF EXISTS search_index")
+    elif dialect == 'postgresql':
+        for table in POSTGRES_VECTORS:
+            op.drop_index(f'ix_{table}_search_vector', table_name=table)
+            op.drop_column(table, 'search_vector')
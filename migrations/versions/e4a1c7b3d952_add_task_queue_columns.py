@@ -0,0 +1,54 @@
+"""Add status, priority and rank to task for the next-actions queue
+
+Existing tasks become open, normal-priority tasks ranked in id order. The columns
+are added with plain ADD COLUMN: a batch rebuild of task on SQLite would drop its
+change_log triggers.
+
+Revision ID: e4a1c7b3d952
+Revises: 9b4d2e7f1a63
+Create Date: 2026-10-18 18:40:27.306118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.ranking import FIRST_KEY, ranks_after
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a1c7b3d952'
+down_revision = '9b4d2e7f1a63'
+branch_labels = None
+depends_on = None
+
+BACKFILL_CHUNK = 1000
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    # Ranks compare byte by byte; Postgres' default collation would not.
+    rank_type = sa.String(length=255, collation='C') if postgres else sa.String(length=255)
+    op.add_column('task', sa.Column('status', sa.String(length=16), nullable=False, server_default='open'))
+    op.add_column('task', sa.Column('priority', sa.SmallInteger(), nullable=False, server_default='2'))
+    op.add_column('task', sa.Column('rank', rank_type, nullable=False, server_default=FIRST_KEY))
+
+    task = sa.table('task', sa.column('id', sa.Integer), sa.column('rank', rank_type))
+    bind = op.get_bind()
+    ids = bind.execute(sa.select(task.c.id).order_by(task.c.id)).scalars().all()
+    ranks = ranks_after(None, len(ids))
+    statement = task.update().where(task.c.id == sa.bindparam('task_id')).values(rank=sa.bindparam('task_rank'))
+    for start in range(0, len(ids), BACKFILL_CHUNK):
+        bind.execute(statement, [{'task_id': task_id, 'task_rank': rank}
+                                 for task_id, rank in zip(ids[start:start + BACKFILL_CHUNK],
+                                                          ranks[start:start + BACKFILL_CHUNK])])
+    if postgres:
+        op.alter_column('task', 'rank', server_default=None)
+
+    op.create_index('ix_task_next_actions', 'task', ['status', 'priority', 'rank', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_task_next_actions', table_name='task')
+    op.drop_column('task', 'rank')
+    op.drop_column('task', 'priority')
+    op.drop_column('task', 'status')
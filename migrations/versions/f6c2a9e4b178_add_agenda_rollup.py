@@ -0,0 +1,112 @@
+"""Add task.due_date, due date indexes and the agenda_day rollup
+
+agenda_day counts the open projects and tasks due on each day. Triggers on project
+and task keep it current, including for Core bulk statements, and it is filled from
+the existing rows here. task.due_date is added with plain ADD COLUMN: a batch rebuild
+of task on SQLite would drop its triggers.
+
+Revision ID: f6c2a9e4b178
+Revises: e4a1c7b3d952
+Create Date: 2026-10-18 20:05:51.927340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6c2a9e4b178'
+down_revision = 'e4a1c7b3d952'
+branch_labels = None
+depends_on = None
+
+# table -> (kind stored in agenda_day.kind, SQL condition for an open row given its alias)
+SOURCES = {
+    'project': ('project', "({row}.status IS NULL OR lower({row}.status) NOT IN ('done', 'completed', 'cancelled'))"),
+    'task': ('task', "{row}.status <> 'done'"),
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    op.add_column('task', sa.Column('due_date', sa.Date(), nullable=True))
+    op.create_index(op.f('ix_task_due_date'), 'task', ['due_date'], unique=False)
+    op.create_index(op.f('ix_project_due_date'), 'project', ['due_date'], unique=False)
+    op.create_table(
+        'agenda_day',
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('open_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('kind', 'day'),
+    )
+
+    increment = ("INSERT INTO agenda_day (kind, day, open_count) {values} "
+                 "ON CONFLICT (kind, day) DO UPDATE SET open_count = agenda_day.open_count + 1")
+    decrement = "UPDATE agenda_day SET open_count = open_count - 1 WHERE kind = {kind} AND day = {row}.due_date"
+    if dialect == 'sqlite':
+        for table, (kind, is_open) in SOURCES.items():
+            literal = f"'{kind}'"
+            op.execute(
+                f"CREATE TRIGGER {table}_agenda_day_ai AFTER INSERT ON {table} "
+                f"WHEN new.due_date IS NOT NULL AND {is_open.format(row='new')} BEGIN "
+                f"{increment.format(values=f'VALUES ({literal}, new.due_date, 1)')}; END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_agenda_day_au AFTER UPDATE OF due_date, status ON {table} BEGIN "
+                f"{decrement.format(kind=literal, row='old')} AND {is_open.format(row='old')}; "
+                f"{increment.format(values=f'SELECT {literal}, new.due_date, 1 WHERE new.due_date IS NOT NULL AND ' + is_open.format(row='new'))}; "
+                f"END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_agenda_day_ad AFTER DELETE ON {table} "
+                f"WHEN old.due_date IS NOT NULL AND {is_open.format(row='old')} BEGIN "
+                f"{decrement.format(kind=literal, row='old')}; END"
+            )
+    elif dialect == 'postgresql':
+        def open_case(row):
+            return ' '.join(f"WHEN '{kind}' THEN {condition.format(row=row)}" for kind, condition in SOURCES.values())
+
+        op.execute(
+            "CREATE FUNCTION agenda_day_record() RETURNS trigger AS $$ "
+            "BEGIN "
+            "IF TG_OP <> 'INSERT' THEN "
+            f"IF OLD.due_date IS NOT NULL AND (CASE TG_ARGV[0] {open_case('OLD')} END) THEN "
+            f"{decrement.format(kind='TG_ARGV[0]', row='OLD')}; "
+            "END IF; "
+            "END IF; "
+            "IF TG_OP <> 'DELETE' THEN "
+            f"IF NEW.due_date IS NOT NULL AND (CASE TG_ARGV[0] {open_case('NEW')} END) THEN "
+            f"{increment.format(values='VALUES (TG_ARGV[0], NEW.due_date, 1)')}; "
+            "END IF; "
+            "END IF; "
+            "RETURN NULL; "
+            "END $$ LANGUAGE plpgsql"
+        )
+        for table, (kind, _) in SOURCES.items():
+            op.execute(
+                f"CREATE TRIGGER {table}_agenda_day AFTER INSERT OR DELETE OR UPDATE OF due_date, status ON {table} "
+                f"FOR EACH ROW EXECUTE PROCEDURE agenda_day_record('{kind}')"
+            )
+
+    for table, (kind, is_open) in SOURCES.items():
+        op.execute(
+            f"INSERT INTO agenda_day (kind, day, open_count) "
+            f"SELECT '{kind}', due_date, count(*) FROM {table} AS item "
+            f"WHERE due_date IS NOT NULL AND {is_open.format(row='item')} GROUP BY due_date"
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for table in SOURCES:
+            for suffix in ('ai', 'au', 'ad'):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_agenda_day_{suffix}")
+    elif dialect == 'postgresql':
+        for table in SOURCES:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_agenda_day ON {table}")
+        op.execute("DROP FUNCTION IF EXISTS agenda_day_record()")
+    op.drop_table('agenda_day')
+    op.drop_index(op.f('ix_project_due_date'), table_name='project')
+    op.drop_index(op.f('ix_task_due_date'), table_name='task')
+    op.drop_column('task', 'due_date')
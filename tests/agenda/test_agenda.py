@@ -0,0 +1,84 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from app import create_app
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def _add_task(client, content, **attributes):
+    assert client.post('/tasks/', json={'content': content, **attributes}).status_code == 201
+    return [task for task in client.get('/tasks/api?limit=1000').get_json() if task['content'] == content][-1]
+
+def _agenda(client, query='from=2040-01-09&to=2040-01-12'):
+    rv = client.get(f'/agenda?today=2040-01-10&{query}')
+    assert rv.status_code == 200
+    return rv.get_json()
+
+def _day_counts(client, kind='project,task'):
+    days = client.get(f'/agenda/days?from=2040-01-01&to=2040-12-31&kind={kind}').get_json()
+    return {(day['date'], name): count for day in days for name, count in day.items() if name != 'date'}
+
+def _changes(before, after):
+    return {key: after.get(key, 0) - before.get(key, 0) for key in set(before) | set(after)
+            if after.get(key, 0) != before.get(key, 0)}
+
+def _tagged(agenda, tag):
+    """``{date: {kind: [titles]}}`` of this run's items in ``agenda``."""
+    days = {}
+    for day in agenda['days']:
+        for kind in ('project', 'task'):
+            titles = [item.get('name') or item.get('content') for item in day.get(kind, [])]
+            titles = [title for title in titles if tag in title]
+            if titles:
+                days.setdefault(day['date'], {})[kind] = titles
+    return days
+
+def test_agenda_buckets_open_items_by_day_with_counts(client, tag):
+    before = _agenda(client)['counts']
+    days_before = _day_counts(client)
+    client.post('/projects/', json={'name': f'Agenda launch {tag}', 'due_date': '2040-01-11'})
+    overdue = _add_task(client, f'agenda overdue {tag}', due_date='2040-01-05')
+    today = _add_task(client, f'agenda today {tag}', due_date='2040-01-10')
+    _add_task(client, f'agenda done {tag}', due_date='2040-01-11', status='done')
+    _add_task(client, f'agenda undated {tag}')
+
+    agenda = _agenda(client)
+    assert agenda['from'] == '2040-01-09' and agenda['to'] == '2040-01-12'
+    assert _tagged(agenda, tag) == {'2040-01-10': {'task': [f'agenda today {tag}']},
+                                    '2040-01-11': {'project': [f'Agenda launch {tag}']}}
+
+    counts = agenda['counts']
+    assert counts['overdue']['task'] == before['overdue']['task'] + 1
+    assert counts['upcoming'] == {'project': before['upcoming']['project'] + 1, 'task': before['upcoming']['task'] + 1}
+
+    client.put(f"/tasks/{overdue['id']}", json={'status': 'done'})
+    client.put(f"/tasks/{today['id']}", json={'due_date': '2040-01-12'})
+    agenda = _agenda(client, 'from=2040-01-12&to=2040-01-12&kind=task')
+    assert agenda['counts']['overdue']['task'] == before['overdue']['task']
+    assert _tagged(agenda, tag) == {'2040-01-12': {'task': [f'agenda today {tag}']}}
+    assert all('project' not in day for day in agenda['days'])
+
+    assert _changes(days_before, _day_counts(client)) == {('2040-01-11', 'project'): 1, ('2040-01-12', 'task'): 1}
+    client.delete(f"/tasks/{today['id']}")
+    assert _changes(days_before, _day_counts(client)) == {('2040-01-11', 'project'): 1}
+
+def test_agenda_rebuild_matches_trigger_maintained_rollup(client):
+    _add_task(client, 'agenda rebuild', due_date='2040-02-01')
+    expected = client.get('/agenda/days?from=1900-01-01&to=2100-12-31').get_json()
+    result = client.application.test_cli_runner().invoke(args=['agenda', 'rebuild'])
+    assert result.exit_code == 0
+    assert client.get('/agenda/days?from=1900-01-01&to=2100-12-31').get_json() == expected
+
+def test_agenda_validation(client):
+    assert client.get('/agenda?from=2040-01-10&to=2040-01-09').status_code == 400
+    assert client.get('/agenda?from=2040-01-01&to=2042-01-01').status_code == 400
+    assert client.get('/agenda?from=tomorrow').status_code == 400
+    assert client.get('/agenda?kind=note').status_code == 400
+    assert client.post('/tasks/', json={'content': 'bad date', 'due_date': '2040-13-01'}).status_code == 400
@@ -2,6 +2,10 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import csv
+import gzip
+import io
+import json
 import pytest
 from app import create_app
 
@@ -24,3 +28,494 @@ def test_capture(client):
     assert b'Test Message' in rv.data
 
 
+def test_capture_listing_keyset_pagination(client):
+    for i in range(5):
+        client.post('/capture/', json={'content': f'Paged entry {i}'})
+
+    seen = []
+    url = '/capture/?limit=2'
+    while url:
+        rv = client.get(url, headers={'Accept': 'application/json'})
+        assert rv.status_code == 200
+        page = rv.get_json()
+        assert len(page) <= 2
+        seen.extend(entry['id'] for entry in page)
+        cursor = rv.headers.get('X-Next-Cursor')
+        url = f'/capture/?limit=2&cursor={cursor}' if cursor else None
+
+    assert len(seen) == len(set(seen))
+    assert len(seen) >= 5
+
+def test_capture_listing_filters(client):
+    client.post('/capture/', json={'content': 'Filtered entry'})
+    rv = client.get('/capture/?handled=false&limit=500', headers={'Accept': 'application/json'})
+    entry = [e for e in rv.get_json() if e['content'] == 'Filtered entry'][-1]
+    client.post(f"/capture/{entry['id']}/handled")
+
+    rv = client.get('/capture/?handled=true&limit=500', headers={'Accept': 'application/json'})
+    assert all(e['handled'] for e in rv.get_json())
+    assert entry['id'] in [e['id'] for e in rv.get_json()]
+
+    rv = client.get('/capture/')
+    assert f'data-id="{entry["id"]}"'.encode() not in rv.data
+
+def test_capture_listing_rejects_bad_parameters(client):
+    rv = client.get('/capture/?cursor=not-a-cursor', headers={'Accept': 'application/json'})
+    assert rv.status_code == 400
+    rv = client.get('/capture/?handled=maybe', headers={'Accept': 'application/json'})
+    assert rv.status_code == 400
+
+def test_capture_bulk_json_array(client):
+    items = [{'content': f'Bulk entry {i}'} for i in range(25)] + [{'content': ''}, 'not an object']
+    rv = client.post('/capture/bulk', json=items)
+    assert rv.status_code == 207
+    body = rv.get_json()
+    assert body['created'] == 25
+    assert body['failed'] == 2
+    assert [r['index'] for r in body['results']] == list(range(27))
+    assert all(r['id'] for r in body['results'][:25])
+    assert body['results'][25]['status'] == 'error'
+
+class _CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+def test_json_array_parsing_is_bounded():
+    from app.capture.ingest import MalformedInput, iter_json_array
+    items = [{'content': 'café "quoted" \\ 😀', 'n': -12.5e3}, True, None, float('-inf'), [[], {}], 'x']
+    document = json.dumps(items).encode('utf-8')
+    for read_size in range(1, 9):
+        assert list(iter_json_array(io.BytesIO(document), read_size=read_size)) == items
+
+    stream = _CountingStream(b'[{"content": x}, ' + b'{"content": "filler"}, ' * 10000 + b'1]')
+    with pytest.raises(MalformedInput, match='Malformed JSON'):
+        list(iter_json_array(stream, read_size=1024))
+    assert stream.reads == 1
+
+    stream = _CountingStream(b'[{"content": "' + b'a' * 100000 + b'"}]')
+    with pytest.raises(MalformedInput, match='larger than 1000 bytes'):
+        list(iter_json_array(stream, read_size=100, max_item_bytes=1000))
+    assert stream.reads <= 12
+
+def test_capture_bulk_rejects_oversized_items(client):
+    client.application.config['CAPTURE_BULK_MAX_ITEM_BYTES'] = 100
+    lines = '{"content": "Short line"}\n{"content": "%s"}\n' % ('a' * 200)
+    rv = client.post('/capture/bulk', data=lines, content_type='application/x-ndjson')
+    results = [json.loads(line) for line in rv.data.decode().splitlines()]
+    assert [r['status'] for r in results] == ['created', 'error']
+    assert 'longer than 100 bytes' in results[1]['error']
+
+    rv = client.post('/capture/bulk', json=[{'content': 'Short item'}, {'content': 'a' * 200}])
+    results = rv.get_json()['results']
+    assert [r['status'] for r in results] == ['created', 'error']
+
+def test_capture_bulk_ndjson_stream(client):
+    lines = '\n'.join('{"content": "NDJSON entry %d"}' % i for i in range(10)) + '\n{broken\n'
+    rv = client.post('/capture/bulk', data=lines, content_type='application/x-ndjson')
+    assert rv.status_code == 207
+    results = [line for line in rv.data.decode().splitlines() if line]
+    assert len(results) == 11
+    assert rv.headers['X-Created-Count'] == '10'
+
+    rv = client.get('/capture/?limit=500', headers={'Accept': 'application/json'})
+    assert 'NDJSON entry 9' in [e['content'] for e in rv.get_json()]
+
+def test_capture_export_formats(client):
+    client.post('/capture/', json={'content': 'Exported, with "quotes"'})
+
+    rv = client.get('/capture/export')
+    assert rv.status_code == 200
+    assert 'Exported, with "quotes"' in [e['content'] for e in rv.get_json()]
+
+    rv = client.get('/capture/export?format=csv.gz')
+    assert rv.mimetype == 'application/gzip'
+    rows = list(csv.reader(io.StringIO(gzip.decompress(rv.data).decode('utf-8'))))
+    assert rows[0] == ['id', 'content', 'handled', 'organized', 'created_at', 'processed_at']
+    assert 'Exported, with "quotes"' in [row[1] for row in rows[1:]]
+
+    rv = client.get('/capture/export?format=xml')
+    assert rv.status_code == 400
+
+def _new_entry_ids(client, prefix, count):
+    client.post('/capture/bulk', json=[{'content': f'{prefix} {i}'} for i in range(count)])
+    rv = client.get('/capture/export?format=json')
+    return [e['id'] for e in rv.get_json() if e['content'].startswith(prefix)]
+
+def test_capture_bulk_triage_by_ids(client, tag):
+    ids = _new_entry_ids(client, f'Triage ids {tag}', 3)
+    client.post(f'/capture/{ids[0]}/handled')
+
+    rv = client.post('/capture/handled', json={'ids': ids + [999999]})
+    assert rv.status_code == 200
+    outcomes = {r['id']: r['status'] for r in rv.get_json()['results']}
+    assert outcomes == {ids[0]: 'unchanged', ids[1]: 'updated', ids[2]: 'updated', 999999: 'not_found'}
+
+    rv = client.post('/capture/organized', json={'ids': ids[:2]})
+    results = rv.get_json()['results']
+    assert all('task_id' in r for r in results)
+    rv = client.get('/tasks/export?format=json')
+    assert {f'Triage ids {tag} 0', f'Triage ids {tag} 1'} <= {t['content'] for t in rv.get_json()}
+
+def test_capture_bulk_triage_by_filter(client, tag):
+    from datetime import datetime
+    since = datetime.utcnow().isoformat()
+    _new_entry_ids(client, f'Triage filter {tag}', 4)
+    window = {'created_from': since, 'created_to': datetime.utcnow().isoformat()}
+    rv = client.post('/capture/handled', json={'filter': dict(window, handled=False)})
+    assert rv.status_code == 200
+    assert rv.get_json() == {'updated': 4, 'more': False}
+    rv = client.get('/capture/?handled=false&limit=500', headers={'Accept': 'application/json'})
+    assert not [e for e in rv.get_json() if e['content'].startswith(f'Triage filter {tag}')]
+
+    assert client.post('/capture/handled', json={}).status_code == 400
+    assert client.post('/capture/handled', json={'ids': ['x']}).status_code == 400
+    assert client.post('/capture/organized', json={'filter': {}}).status_code == 400
+
+def test_capture_bulk_triage_by_filter_is_batched(client, tag):
+    from datetime import datetime
+    client.application.config['CAPTURE_TRIAGE_MAX_IDS'] = 2
+    since = datetime.utcnow().isoformat()
+    _new_entry_ids(client, f'Triage batch {tag}', 3)
+    window = {'created_from': since, 'created_to': datetime.utcnow().isoformat()}
+
+    rv = client.post('/capture/organized', json={'filter': window})
+    assert rv.get_json() == {'updated': 2, 'more': True}
+    rv = client.post('/capture/organized', json={'filter': window})
+    assert rv.get_json() == {'updated': 1, 'more': False}
+    tasks = [t['content'] for t in client.get('/tasks/export?format=json').get_json()
+             if t['content'].startswith(f'Triage batch {tag}')]
+    assert sorted(tasks) == [f'Triage batch {tag} {i}' for i in range(3)]
+
+def test_capture_organize_creates_task(client, tag):
+    ids = _new_entry_ids(client, f'Organize single {tag}', 1)
+    rv = client.post(f'/capture/{ids[0]}/organized')
+    assert rv.status_code == 200
+    assert 'task_id' in rv.get_json()
+    assert client.post('/capture/999999/organized').status_code == 404
+
+def test_concurrent_organize_creates_one_task_per_entry(client, tag):
+    import threading
+    from datetime import datetime
+    since = datetime.utcnow().isoformat()
+    ids = _new_entry_ids(client, f'Organize race {tag}', 2)
+    window = {'created_from': since, 'created_to': datetime.utcnow().isoformat()}
+    bodies = [{'ids': ids}, {'ids': ids[::-1]}, {'filter': window}, {'ids': ids}]
+    barrier = threading.Barrier(len(bodies))
+    results = []
+
+    def organize(body):
+        with client.application.test_client() as own_client:
+            barrier.wait()
+            results.append(own_client.post('/capture/organized', json=body))
+
+    threads = [threading.Thread(target=organize, args=(body,)) for body in bodies]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [rv.status_code for rv in results] == [200] * len(bodies)
+    tasks = [t['content'] for t in client.get('/tasks/export?format=json').get_json()
+             if t['content'].startswith(f'Organize race {tag}')]
+    assert sorted(tasks) == [f'Organize race {tag} 0', f'Organize race {tag} 1']
+    assert sum(rv.get_json()['updated'] for rv in results) == 2
+
+@pytest.fixture
+def journal_app(tmp_path):
+    from app.capture.journal import init_journal
+    app = create_app()
+    app.config.update(TESTING=True, CAPTURE_JOURNAL_DIR=str(tmp_path))
+    init_journal(app, start=False)
+    return app
+
+def _entries_with_content(app, content):
+    from sqlalchemy import select
+    from app import db
+    from app.capture.models import CaptureEntry
+    with app.app_context():
+        return db.session.execute(select(CaptureEntry).where(CaptureEntry.content == content)).scalars().all()
+
+def test_journalled_capture_is_flushed_idempotently(journal_app, tag):
+    journal = journal_app.extensions['capture_journal']
+    with journal_app.test_client() as client:
+        headers = {'Idempotency-Key': f'journal-test-{tag}'}
+        for _ in range(2):
+            rv = client.post('/capture/', json={'content': f'Journalled thought {tag}'}, headers=headers)
+            assert rv.status_code == 202
+            assert rv.get_json()['idempotency_key'] == headers['Idempotency-Key']
+        assert journal.stats()['backlog_records'] == 2
+
+        with journal_app.app_context():
+            assert journal.flush() == 1
+        assert journal.stats()['backlog_records'] == 0
+        assert journal.stats()['duplicates'] == 1
+        assert len(_entries_with_content(journal_app, f'Journalled thought {tag}')) == 1
+
+        rv = client.post('/capture/', json={'content': 'x'}, headers={'Idempotency-Key': 'k' * 65})
+        assert rv.status_code == 400
+
+def test_journal_replays_segments_of_dead_processes(journal_app, tmp_path, tag):
+    import json
+    import subprocess
+    import uuid
+    journal = journal_app.extensions['capture_journal']
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    record = {'key': uuid.uuid4().hex, 'content': f'Replayed thought {tag}', 'created_at': '2024-01-02T03:04:05'}
+    segment = tmp_path / f'{dead.pid}-1.open'
+    # The second, torn line is what a crash in the middle of a write leaves behind.
+    segment.write_text(json.dumps(record) + '\n{"key": "torn', encoding='utf-8')
+
+    with journal_app.app_context():
+        assert journal.flush() == 1
+        assert journal.flush() == 0
+    assert not segment.exists()
+    assert journal.stats()['corrupt'] == 1
+    entries = _entries_with_content(journal_app, f'Replayed thought {tag}')
+    assert [entry.idempotency_key for entry in entries] == [record['key']]
+
+def test_capture_listing_sparse_fieldsets(client):
+    client.post('/capture/', json={'content': 'Sparse entry'})
+    rv = client.get('/capture/?fields=id,content&limit=500', headers={'Accept': 'application/json'})
+    assert rv.status_code == 200
+    page = rv.get_json()
+    assert all(set(entry) == {'id', 'content'} for entry in page)
+
+    entry = client.get('/capture/?limit=1', headers={'Accept': 'application/json'}).get_json()[0]
+    assert list(entry) == ['id', 'content', 'handled', 'organized', 'created_at', 'processed_at']
+    # ISO-8601 rather than the RFC 822 dates of Flask's default JSON provider.
+    assert 'T' in entry['created_at']
+
+    rv = client.get('/capture/?fields=id,secret', headers={'Accept': 'application/json'})
+    assert rv.status_code == 400
+    assert 'secret' in rv.get_json()['error']
+
+def test_capture_page_embeds_live_update_cursor(client):
+    client.post('/capture/', json={'content': "It's <live>"})
+    rv = client.get('/capture/?limit=500')
+    html = rv.get_data(as_text=True)
+    cursor = html.split('data-sync-cursor="', 1)[1].split('"', 1)[0]
+    assert cursor and client.get(f'/sync?since={cursor}').status_code == 200
+    assert 'It&#39;s &lt;live&gt;' in html
+    assert '/sync/events?kind=capture' in html
+
+def _asgi_call(asgi_app, method, path, body=None, headers=(), chunks=None):
+    import asyncio
+    payload = json.dumps(body).encode('utf-8') if body is not None else b''
+    chunks = list(chunks) if chunks is not None else [payload]
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': query.encode('latin-1'),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+                   + ([(b'content-type', b'application/json')] if body is not None else []),
+        'scheme': 'http', 'server': ('localhost', 80), 'client': ('127.0.0.1', 1234),
+    }
+    messages = []
+
+    async def receive():
+        if len(messages) < len(chunks):
+            messages.append(None)
+            return {'type': 'http.request', 'body': chunks[len(messages) - 1], 'more_body': len(messages) < len(chunks)}
+        await asyncio.sleep(3600)
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def call():
+        await asgi_app(scope, receive, send)
+    return call, sent
+
+def test_asgi_capture_api_matches_wsgi_responses(client):
+    pytest.importorskip('aiosqlite')
+    import asyncio
+    from app.asgi import create_asgi_app
+    asgi_app = create_asgi_app(client.application)
+
+    def status_and_body(sent):
+        start = next(message for message in sent if message['type'] == 'http.response.start')
+        body = b''.join(message.get('body', b'') for message in sent if message['type'] == 'http.response.body')
+        return start['status'], dict(start['headers']), body
+
+    async def scenario():
+        results = {}
+        for name, method, path, body, headers in [
+            ('add', 'POST', '/capture/', {'content': 'Async thought'}, ()),
+            ('empty', 'POST', '/capture/', {'content': ''}, ()),
+            ('list', 'GET', '/capture/?limit=1&fields=id,content', None, [('Accept', 'application/json')]),
+            ('bad_fields', 'GET', '/capture/?fields=secret', None, [('Accept', 'application/json')]),
+            ('html', 'GET', '/capture/', None, ()),
+            ('bulk_bad', 'POST', '/capture/handled', {'ids': 'x'}, ()),
+            ('missing', 'DELETE', '/capture/999999999', None, ()),
+            ('edit_missing', 'PUT', '/capture/999999999', {'content': 'x'}, ()),
+            ('edit_not_json', 'PUT', '/capture/999999999', None, [('Content-Type', 'text/plain')]),
+            ('triage_missing', 'POST', '/capture/999999999/handled', None, ()),
+        ]:
+            call, sent = _asgi_call(asgi_app, method, path, body, headers)
+            await call()
+            results[name] = status_and_body(sent)
+        await asgi_app.engine.dispose()
+        return results
+
+    results = asyncio.run(scenario())
+    assert results['add'][0] == 201 and json.loads(results['add'][2]) == {'message': 'Entry added successfully!'}
+    assert results['empty'][0] == 400
+    status, headers, body = results['list']
+    assert status == 200 and list(json.loads(body)[0]) == ['id', 'content']
+    assert b'cursor=' in headers[b'link'] and headers[b'content-length'] == str(len(body)).encode()
+    assert results['bad_fields'][0] == 400
+    # HTML pages are served by the Flask app behind the ASGI one.
+    assert results['html'][0] == 200 and b'<h1>Capture</h1>' in results['html'][2]
+    assert json.loads(results['bulk_bad'][2]) == {'error': 'ids must be a list of integers'}
+    # Errors Flask answers with a page come from Flask itself, byte for byte.
+    for name, method, path, body, headers in [
+        ('missing', 'DELETE', '/capture/999999999', None, {}),
+        ('edit_missing', 'PUT', '/capture/999999999', {'content': 'x'}, {}),
+        ('edit_not_json', 'PUT', '/capture/999999999', None, {'Content-Type': 'text/plain'}),
+        ('triage_missing', 'POST', '/capture/999999999/handled', None, {}),
+    ]:
+        rv = client.open(path, method=method, json=body, headers=headers)
+        assert results[name][0] == rv.status_code and results[name][2] == rv.data, name
+    assert [results[name][0] for name in ('missing', 'edit_missing', 'edit_not_json', 'triage_missing')] == [404, 404, 415, 404]
+
+    assert _entries_with_content(client.application, 'Async thought')
+
+def test_asgi_streams_flask_requests_and_responses(client):
+    pytest.importorskip('aiosqlite')
+    import asyncio
+    from app.asgi import create_asgi_app
+    asgi_app = create_asgi_app(client.application)
+    lines = [json.dumps({'content': f'Streamed upload {i}'}).encode() + b'\n' for i in range(5)]
+
+    def status_and_body(sent):
+        start = next(message for message in sent if message['type'] == 'http.response.start')
+        return start['status'], b''.join(message.get('body', b'') for message in sent if message['type'] != 'http.response.start')
+
+    async def scenario():
+        results = {}
+        for name, method, path, chunks, headers in [
+            # Sent in several messages, as uvicorn passes a large upload on.
+            ('upload', 'POST', '/capture/bulk', lines, [('Content-Type', 'application/x-ndjson')]),
+            ('export', 'GET', '/capture/export?format=ndjson', None, ()),
+            ('too_large', 'POST', '/capture/bulk', [b'[]'], [('Content-Type', 'application/json'),
+                                                             ('Content-Length', str(10 ** 9))]),
+        ]:
+            call, sent = _asgi_call(asgi_app, method, path, headers=headers, chunks=chunks)
+            await call()
+            results[name] = status_and_body(sent)
+        await asgi_app.engine.dispose()
+        return results
+
+    client.application.config['MAX_CONTENT_LENGTH'] = 10 ** 6
+    results = asyncio.run(scenario())
+    assert results['upload'][0] == 201, results['upload']
+    status, body = results['export']
+    assert status == 200
+    exported = [json.loads(line)['content'] for line in body.decode().splitlines()]
+    assert {f'Streamed upload {i}' for i in range(5)} <= set(exported)
+    assert results['too_large'][0] == 413
+
+def test_asgi_cancelled_request_releases_its_wsgi_thread():
+    import asyncio
+    import threading
+    from flask import Flask
+    from app.asgi import AsgiApp
+    flask_app = Flask(__name__)
+    closed = threading.Event()
+
+    @flask_app.route('/endless')
+    def endless():
+        def chunks():
+            try:
+                while True:
+                    yield b'x' * 1024
+            finally:
+                closed.set()
+        return chunks()
+
+    asgi_app = AsgiApp(flask_app, [], engine=None, wsgi_threads=1)
+
+    async def scenario():
+        requested = []
+        reading = asyncio.Event()
+
+        async def receive():
+            if not requested:
+                requested.append(True)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            # A client that stops reading after the first chunk, so the thread fills the queue.
+            if message['type'] == 'http.response.body':
+                reading.set()
+                await asyncio.sleep(3600)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/endless', 'query_string': b'', 'headers': []}
+        call = asyncio.ensure_future(asgi_app(scope, receive, send))
+        await reading.wait()
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        # The loop keeps running, as in a server, and the thread still finishes the response.
+        return await asyncio.get_running_loop().run_in_executor(None, closed.wait, 5)
+
+    assert asyncio.run(scenario())
+    asgi_app.executor.shutdown(wait=True)
+
+def test_capture_archive_moves_old_processed_entries(client, tag):
+    from datetime import datetime
+    from sqlalchemy import update
+    from app import db
+    from app.capture.models import CaptureEntry
+
+    ids = _new_entry_ids(client, f'Archived zeppelin{tag}', 3)
+    client.post('/capture/handled', json={'ids': ids[:2]})
+    with client.application.app_context():
+        # Only entries processed before the cutoff move, so older entries of other tests stay put.
+        db.session.execute(update(CaptureEntry).where(CaptureEntry.id.in_(ids))
+                           .values(processed_at=datetime(2000, 1, 1)))
+        db.session.commit()
+
+    result = client.application.test_cli_runner().invoke(args=['capture', 'archive', '--older-than-days', '9000'])
+    assert result.exit_code == 0, result.output
+    remaining = {e['id'] for e in client.get('/capture/export?format=json').get_json()}
+    assert remaining & set(ids) == {ids[2]}
+
+    rv = client.get('/capture/archive?limit=1000')
+    assert rv.status_code == 200
+    archived = {e['id']: e for e in rv.get_json()}
+    assert set(ids[:2]) <= set(archived)
+    assert archived[ids[0]]['handled'] is True and archived[ids[0]]['archived_at']
+
+    rv = client.get(f'/capture/archive?q=zeppelin{tag}&fields=content')
+    assert rv.status_code == 200
+    assert sorted(e['content'] for e in rv.get_json()) == [f'Archived zeppelin{tag} 0', f'Archived zeppelin{tag} 1']
+    rv = client.get('/capture/archive/export?format=json')
+    assert set(ids[:2]) <= {e['id'] for e in rv.get_json()}
+
+    stats = client.get('/archive-stats').get_json()
+    assert stats['archive_rows'] >= 2
+    assert 'app_capture_archive_rows' in client.get('/metrics').get_data(as_text=True)
+
+def test_capture_bulk_delete(client, tag):
+    from datetime import datetime, timedelta
+    since = (datetime.utcnow() - timedelta(seconds=1)).isoformat()
+    ids = _new_entry_ids(client, f'Bulk delete entry {tag}', 3)
+    rv = client.post('/capture/delete', json={'ids': ids[:1]})
+    assert rv.status_code == 200 and rv.get_json() == {'deleted': 1}
+
+    client.post('/capture/handled', json={'ids': ids[1:2]})
+    rv = client.post('/capture/delete', json={'filter': {'handled': True, 'created_from': since}})
+    assert rv.get_json()['deleted'] >= 1
+    remaining = {e['id'] for e in client.get('/capture/export?format=json').get_json()}
+    assert remaining & set(ids) == {ids[2]}
+
+    assert client.post('/capture/delete', json={'filter': {}}).status_code == 400
+    assert client.post('/capture/delete', json={'ids': [True]}).status_code == 400
@@ -2,6 +2,7 @@ import pytest
 from dotenv import load_dotenv
 import os
 import sys
+import uuid
 
 # Load environment variables from .env file
 load_dotenv()
@@ -31,3 +32,9 @@ def client(app):
 @pytest.fixture(scope='module')
 def runner(app):
     return app.test_cli_runner()
+
+@pytest.fixture
+def tag():
+    """A word unique to this test run. Tests share a database that is not reset between
+    runs, so they put it in the rows they create and only look at rows carrying it."""
+    return uuid.uuid4().hex[:10]
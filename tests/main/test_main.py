@@ -15,3 +15,20 @@ def client():
 def test_index(client):
     rv = client.get('/')
     assert b'Welcome to Make-Life App' in rv.data
+
+def test_request_id_header(client):
+    rv = client.get('/', headers={'X-Request-ID': 'trace-123'})
+    assert rv.headers['X-Request-ID'] == 'trace-123'
+    rv = client.get('/')
+    assert len(rv.headers['X-Request-ID']) == 32
+
+def test_pool_stats(client):
+    client.get('/capture/', headers={'Accept': 'application/json'})
+    rv = client.get('/pool-stats')
+    assert rv.status_code == 200
+    stats = rv.get_json()
+    assert 'pool' in stats
+    if stats['pool'] == 'InstrumentedQueuePool':
+        assert stats['checkouts'] >= 1
+        assert stats['checked_out'] >= 0
+        assert stats['max_overflow'] == client.application.config['SQLALCHEMY_ENGINE_OPTIONS']['max_overflow']
@@ -0,0 +1,250 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from sqlalchemy import event
+from app import create_app, db
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture
+def client(app):
+    with app.test_client() as client:
+        yield client
+
+def count_queries(app, func):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return result, statements
+
+def add_project_with_tasks(client, name, task_count):
+    client.post('/projects/', json={'name': name})
+    project = [p for p in client.get('/projects/api').get_json() if p['name'] == name][-1]
+    for i in range(task_count):
+        client.post('/tasks/', json={'content': f'{name} task {i}', 'project_id': project['id']})
+    return project
+
+def test_projects_page_query_count_is_constant(app, client):
+    add_project_with_tasks(client, 'Constant A', 2)
+    rv, before = count_queries(app, lambda: client.get('/projects/'))
+    assert rv.status_code == 200
+
+    for i in range(5):
+        add_project_with_tasks(client, f'Constant B{i}', 3)
+    rv, after = count_queries(app, lambda: client.get('/projects/'))
+    assert rv.status_code == 200
+    assert len(after) == len(before)
+
+def test_project_tasks_endpoint(client):
+    project = add_project_with_tasks(client, 'Lazy tasks', 3)
+    rv = client.get(f"/projects/{project['id']}/tasks")
+    assert rv.status_code == 200
+    assert [task['content'] for task in rv.get_json()] == [f'Lazy tasks task {i}' for i in range(3)]
+
+    rv = client.get('/projects/')
+    assert b'Lazy tasks' in rv.data
+
+    rv = client.get('/projects/999999/tasks')
+    assert rv.status_code == 404
+
+def test_projects_api_conditional_get(client):
+    client.post('/projects/', json={'name': 'Conditional'})
+    rv = client.get('/projects/api')
+    assert rv.status_code == 200
+    etag = rv.headers['ETag']
+    last_modified = rv.headers['Last-Modified']
+
+    rv = client.get('/projects/api', headers={'If-None-Match': etag})
+    assert rv.status_code == 304
+    assert rv.data == b''
+    # A delete does not move Last-Modified, so If-Modified-Since alone never gets a 304.
+    rv = client.get('/projects/api', headers={'If-Modified-Since': last_modified})
+    assert rv.status_code == 200
+
+    client.post('/projects/', json={'name': 'Conditional 2'})
+    rv = client.get('/projects/api', headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert rv.headers['ETag'] != etag
+
+    etag = rv.headers['ETag']
+    project_id = [p['id'] for p in rv.get_json() if p['name'] == 'Conditional 2'][-1]
+    client.delete(f'/projects/{project_id}')
+    rv = client.get('/projects/api', headers={'If-None-Match': etag, 'If-Modified-Since': rv.headers['Last-Modified']})
+    assert rv.status_code == 200
+
+def test_projects_page_etag_tracks_task_changes(client):
+    project = add_project_with_tasks(client, 'Conditional page', 1)
+    etag = client.get('/projects/').headers['ETag']
+    task_id = client.get(f"/projects/{project['id']}/tasks").get_json()[0]['id']
+    client.delete(f'/tasks/{task_id}')
+    rv = client.get('/projects/', headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+
+def test_listings_are_cached_until_a_write(app, client):
+    from app.cache import get_cache
+    add_project_with_tasks(client, 'Cached', 1)
+    client.get('/projects/')
+    _, statements = count_queries(app, lambda: client.get('/projects/'))
+    # Only the conditional-GET state query; the listing itself came from the cache.
+    assert len(statements) == 1
+    with app.app_context():
+        assert get_cache().stats()['hits'] >= 1
+
+    project = add_project_with_tasks(client, 'Cached 2', 2)
+    assert b'Cached 2' in client.get('/projects/').data
+    assert len(client.get(f"/projects/{project['id']}/tasks").get_json()) == 2
+    client.post('/tasks/', json={'content': 'Cached 2 task extra', 'project_id': project['id']})
+    assert len(client.get(f"/projects/{project['id']}/tasks").get_json()) == 3
+    assert b'Cached 2 task extra' in client.get('/tasks/').data
+
+    client.delete(f"/projects/{project['id']}")
+    assert project['id'] not in [p['id'] for p in client.get('/projects/api').get_json()]
+
+def test_cached_listing_reloads_after_another_workers_write(app):
+    # Two app instances stand in for two gunicorn workers with their own memory cache.
+    other = create_app()
+    other.config['TESTING'] = True
+    reader, writer = app.test_client(), other.test_client()
+    etag = reader.get('/tasks/').headers['ETag']
+
+    writer.post('/tasks/', json={'content': 'Written by the other worker'})
+    rv = reader.get('/tasks/', headers={'If-None-Match': etag})
+    assert rv.status_code == 200 and rv.headers['ETag'] != etag
+    assert b'Written by the other worker' in rv.data
+
+def test_memory_backend_evicts_least_recently_used():
+    from app.cache import Cache, MemoryBackend
+    cache = Cache(MemoryBackend(max_entries=2), default_ttl=60)
+    cache.get_or_set('a', lambda: 1)
+    cache.get_or_set('b', lambda: 2)
+    cache.get_or_set('a', lambda: 0)
+    cache.get_or_set('c', lambda: 3)
+    assert cache.get_or_set('a', lambda: 0) == 1
+    assert cache.get_or_set('b', lambda: 'reloaded') == 'reloaded'
+    stats = cache.stats()
+    assert stats['evictions'] == 2
+    assert stats['hits'] == 2
+    assert stats['misses'] == 4
+
+def test_redis_backend_round_trips_and_invalidates():
+    fakeredis = pytest.importorskip('fakeredis')
+    from app.cache import Cache, RedisBackend
+    cache = Cache(RedisBackend(fakeredis.FakeRedis(), prefix='test:'), default_ttl=60)
+    assert cache.get_or_set('projects:page', lambda: [{'id': 1, 'due_date': None}]) == [{'id': 1, 'due_date': None}]
+    assert cache.get_or_set('projects:page', lambda: []) == [{'id': 1, 'due_date': None}]
+    cache.delete('projects:page')
+    assert cache.get_or_set('projects:page', lambda: []) == []
+    assert cache.stats()['hits'] == 1
+
+def test_projects_api_sparse_fieldsets_and_iso_dates(client):
+    client.post('/projects/', json={'name': 'Sparse', 'due_date': '2031-05-06'})
+    projects = client.get('/projects/api').get_json()
+    assert [p['due_date'] for p in projects if p['name'] == 'Sparse'][-1] == '2031-05-06'
+
+    rv = client.get('/projects/api?fields=name')
+    assert rv.status_code == 200
+    assert all(list(p) == ['name'] for p in rv.get_json())
+    assert client.get('/projects/api?fields=').status_code == 400
+
+    project = add_project_with_tasks(client, 'Sparse tasks', 2)
+    tasks = client.get(f"/projects/{project['id']}/tasks?fields=content").get_json()
+    assert tasks == [{'content': 'Sparse tasks task 0'}, {'content': 'Sparse tasks task 1'}]
+
+def test_projects_api_include_tasks_and_counts(app, client):
+    first = add_project_with_tasks(client, 'Tree A', 3)
+    add_project_with_tasks(client, 'Tree B', 0)
+    add_project_with_tasks(client, 'Tree C', 2)
+
+    seen = {}
+    url = '/projects/api?include=tasks,counts&limit=2'
+    while url:
+        rv, statements = count_queries(app, lambda: client.get(url))
+        # Conditional-GET state, the project page and one batched task query.
+        assert len(statements) <= 3
+        for project in rv.get_json():
+            assert project['task_count'] == len(project['tasks'])
+            seen[project['name']] = [task['content'] for task in project['tasks']]
+        link = rv.headers.get('Link')
+        url = link[1:link.index('>')] if link else None
+    assert seen['Tree A'] == [f'Tree A task {i}' for i in range(3)]
+    assert seen['Tree B'] == []
+    assert len(seen['Tree C']) == 2
+
+    rv = client.get('/projects/api?include=counts&fields=name&limit=500')
+    assert all(set(project) == {'name', 'task_count'} for project in rv.get_json())
+    rv = client.get('/projects/api?include=everything')
+    assert rv.status_code == 400
+    assert 'include' in rv.get_json()['error']
+
+    tasks = client.get(f"/tasks/api?project_id={first['id']}&fields=content").get_json()
+    assert tasks == [{'content': f'Tree A task {i}'} for i in range(3)]
+    rv = client.get('/tasks/api?limit=1')
+    assert len(rv.get_json()) == 1 and 'X-Next-Cursor' in rv.headers
+
+def test_bulk_delete_projects_leaves_tasks_to_the_database(app, client, tag):
+    projects = [add_project_with_tasks(client, f'Bulk delete {tag} {i}', 3) for i in range(2)]
+    ids = [project['id'] for project in projects]
+
+    rv, statements = count_queries(app, lambda: client.post('/projects/delete', json={'ids': ids + [999999]}))
+    assert rv.status_code == 200
+    assert rv.get_json() == {'deleted': 2}
+    writes = [s for s in statements if s.lstrip().upper().startswith(('DELETE', 'UPDATE'))]
+    assert len(writes) == 1 and writes[0].lstrip().upper().startswith('DELETE FROM PROJECT')
+
+    assert not {p['id'] for p in client.get('/projects/api').get_json()} & set(ids)
+    tasks = [t for t in client.get('/tasks/export?format=json').get_json() if t['content'].startswith(f'Bulk delete {tag}')]
+    if app.config['PROJECT_DELETE_TASKS'] == 'cascade':
+        assert tasks == []
+    else:
+        assert len(tasks) == 6 and all(t['project_id'] is None for t in tasks)
+
+    # Detached tasks count as changed for the task lists' ETags.
+    project = add_project_with_tasks(client, f'Bulk delete etag {tag}', 1)
+    etag = client.get('/tasks/api?limit=1000').headers['ETag']
+    client.delete(f"/projects/{project['id']}")
+    rv = client.get('/tasks/api?limit=1000', headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert [t['project_id'] for t in rv.get_json() if t['content'].startswith(f'Bulk delete etag {tag}')] in ([None], [])
+
+    assert client.post('/projects/delete', json={'filter': {}}).status_code == 400
+    assert client.post('/projects/delete', json={'ids': 'all'}).status_code == 400
+
+def test_delete_rule_command_switches_the_rule(app, client, tag):
+    configured = app.config['PROJECT_DELETE_TASKS']
+    other = 'cascade' if configured == 'set-null' else 'set-null'
+    runner = app.test_cli_runner()
+    try:
+        app.config['PROJECT_DELETE_TASKS'] = other
+        result = runner.invoke(args=['projects', 'delete-rule'])
+        assert result.exit_code == 0, result.output
+        project = add_project_with_tasks(client, f'Rule switch {tag}', 2)
+        client.delete(f"/projects/{project['id']}")
+        tasks = [t for t in client.get('/tasks/export?format=json').get_json()
+                 if t['content'].startswith(f'Rule switch {tag}')]
+        if other == 'cascade':
+            assert tasks == []
+        else:
+            assert len(tasks) == 2 and all(t['project_id'] is None for t in tasks)
+    finally:
+        app.config['PROJECT_DELETE_TASKS'] = configured
+        assert runner.invoke(args=['projects', 'delete-rule']).exit_code == 0
+
+    app.config['PROJECT_DELETE_TASKS'] = 'orphan'
+    result = runner.invoke(args=['projects', 'delete-rule'])
+    assert result.exit_code != 0 and 'Invalid PROJECT_DELETE_TASKS' in str(result.exception)
+    app.config['PROJECT_DELETE_TASKS'] = configured
@@ -0,0 +1,44 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from app import create_app
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def test_search_tracks_inserts_updates_and_deletes(client, tag):
+    word = f'zanzibar{tag}'
+    client.post('/capture/', json={'content': f'Renew the {word} passport'})
+    client.post('/capture/bulk', json=[{'content': f'{word.title()} ferry timetable'}])
+    client.post('/projects/', json={'name': f'{word.title()} trip', 'description': 'Plan the holiday'})
+
+    rv = client.get(f'/search?q={word}')
+    assert rv.status_code == 200
+    hits = rv.get_json()
+    assert {hit['kind'] for hit in hits} == {'capture', 'project'}
+    assert len(hits) == 3
+
+    capture_id = next(hit['id'] for hit in hits if hit['text'] == f'Renew the {word} passport')
+    client.put(f'/capture/{capture_id}', json={'content': 'Renew the passport'})
+    client.delete(f"/capture/{next(hit['id'] for hit in hits if hit['text'] == f'{word.title()} ferry timetable')}")
+    hits = client.get(f'/search?q={word}').get_json()
+    assert [hit['kind'] for hit in hits] == ['project']
+
+    hits = client.get('/search?q=passport&kind=capture').get_json()
+    assert capture_id in [hit['id'] for hit in hits]
+
+def test_search_pagination_and_validation(client):
+    client.post('/capture/bulk', json=[{'content': f'quokka note {i}'} for i in range(5)])
+    rv = client.get('/search?q=quokka&limit=2')
+    assert len(rv.get_json()) == 2
+    assert 'offset=2' in rv.headers['Link']
+
+    assert client.get('/search?q=').status_code == 400
+    assert client.get('/search?q=x&kind=email').status_code == 400
+    assert client.get('/search?q=%22unbalanced AND (').status_code == 200
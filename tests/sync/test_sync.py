@@ -0,0 +1,142 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.sync.changelog import compact_change_log
+from app.sync.models import ChangeLog
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def _cursor(client):
+    rv = client.get('/sync')
+    assert rv.status_code == 200
+    return rv.get_json()['cursor']
+
+def test_sync_returns_upserts_and_tombstones_since_cursor(client):
+    cursor = _cursor(client)
+    client.post('/capture/bulk', json=[{'content': 'sync keep'}, {'content': 'sync drop'}])
+    client.post('/projects/', json={'name': 'Sync project'})
+
+    changes = client.get(f'/sync?since={cursor}').get_json()
+    assert changes['has_more'] is False and changes['deleted'] == {}
+    entries = {entry['content']: entry for entry in changes['upserted']['capture']}
+    assert set(entries) == {'sync keep', 'sync drop'}
+    assert set(entries['sync keep']) == {'id', 'content', 'handled', 'organized', 'created_at', 'processed_at'}
+    project = changes['upserted']['project'][0]
+    assert project['name'] == 'Sync project'
+
+    cursor = changes['cursor']
+    client.put(f"/capture/{entries['sync keep']['id']}", json={'content': 'sync kept'})
+    client.delete(f"/capture/{entries['sync drop']['id']}")
+    client.post('/tasks/', json={'content': 'Sync task', 'project_id': project['id']})
+
+    changes = client.get(f'/sync?since={cursor}').get_json()
+    assert [entry['content'] for entry in changes['upserted']['capture']] == ['sync kept']
+    assert changes['deleted'] == {'capture': [entries['sync drop']['id']]}
+    assert [task['content'] for task in changes['upserted']['task']] == ['Sync task']
+
+    changes = client.get(f"/sync?since={changes['cursor']}").get_json()
+    assert changes['upserted'] == {} and changes['deleted'] == {}
+
+def test_sync_paging_kind_filter_and_validation(client):
+    cursor = _cursor(client)
+    client.post('/capture/bulk', json=[{'content': f'sync page {i}'} for i in range(5)])
+    client.post('/projects/', json={'name': 'Sync filtered out'})
+
+    seen = []
+    while True:
+        rv = client.get(f'/sync?since={cursor}&kind=capture&limit=2')
+        changes = rv.get_json()
+        seen += [entry['content'] for entry in changes['upserted'].get('capture', [])]
+        assert 'project' not in changes['upserted']
+        cursor = changes['cursor']
+        if not changes['has_more']:
+            break
+        assert 'since=' in rv.headers['Link']
+    assert seen == [f'sync page {i}' for i in range(5)]
+
+    assert client.get('/sync?since=not-a-cursor').status_code == 400
+    assert client.get(f'/sync?since={cursor}&kind=note').status_code == 400
+
+def test_compaction_keeps_latest_change_and_expires_old_cursors(client):
+    old_cursor = _cursor(client)
+    client.post('/capture/', json={'content': 'sync compacted'})
+    changes = client.get(f'/sync?since={old_cursor}').get_json()
+    entry_id = changes['upserted']['capture'][0]['id']
+    for i in range(3):
+        client.put(f'/capture/{entry_id}', json={'content': f'sync compacted {i}'})
+
+    with client.application.app_context():
+        compact_change_log(timedelta(days=30))
+        rows = ChangeLog.query.filter_by(kind='capture', record_id=entry_id).all()
+        assert len(rows) == 1 and rows[0].op == 'upsert'
+    changes = client.get(f'/sync?since={old_cursor}').get_json()
+    assert [entry['content'] for entry in changes['upserted']['capture']] == ['sync compacted 2']
+
+    with client.application.app_context():
+        compact_change_log(timedelta(0), now=datetime.utcnow() + timedelta(minutes=1))
+        assert db.session.query(ChangeLog).count() == 0
+    assert client.get(f'/sync?since={old_cursor}').status_code == 410
+
+    cursor = _cursor(client)
+    client.delete(f'/capture/{entry_id}')
+    assert client.get(f'/sync?since={cursor}').get_json()['deleted'] == {'capture': [entry_id]}
+
+def test_compact_command(client):
+    runner = client.application.test_cli_runner()
+    result = runner.invoke(args=['sync', 'compact', '--retention-days', '30'])
+    assert result.exit_code == 0
+    assert 'superseded' in result.output
+
+def _events(chunks):
+    events = []
+    for chunk in chunks:
+        for block in chunk.decode('utf-8').split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':') and ': ' in line)
+            if 'event' in fields:
+                events.append(fields)
+    return events
+
+def test_event_stream_replays_since_cursor_then_pushes_live_changes(client):
+    app = client.application
+    app.config.update(EVENTS_STREAM_TIMEOUT=5, EVENTS_POLL_INTERVAL=0.05)
+    app.extensions['change_feed'].poll_interval = 0.05
+    cursor = _cursor(client)
+    client.post('/capture/', json={'content': 'sse replayed'})
+    client.post('/projects/', json={'name': 'Not on the capture stream'})
+
+    stream = app.test_client().get(f'/sync/events?kind=capture&since={cursor}', buffered=False)
+    assert stream.status_code == 200 and stream.mimetype == 'text/event-stream'
+    chunks = iter(stream.response)
+    assert next(chunks).startswith(b'retry:')
+    replayed = _events([next(chunks)])[0]
+    assert replayed['event'] == 'changes' and 'sse replayed' in replayed['data'] and 'project' not in replayed['data']
+
+    client.post('/capture/bulk', json=[{'content': 'sse live'}])
+    live = _events([next(chunks)])[0]
+    assert 'sse live' in live['data'] and 'sse replayed' not in live['data']
+    assert live['id'] != replayed['id']
+    stream.close()
+    assert app.extensions['change_feed'].subscribers == 0
+
+    resumed = app.test_client().get('/sync/events?kind=capture', headers={'Last-Event-ID': replayed['id']},
+                                    buffered=False)
+    chunks = iter(resumed.response)
+    next(chunks)
+    assert 'sse live' in _events([next(chunks)])[0]['data']
+    resumed.close()
+
+def test_event_stream_limits(client):
+    client.application.config['EVENTS_MAX_STREAMS'] = 0
+    rv = client.get('/sync/events')
+    assert rv.status_code == 503 and rv.headers['Retry-After']
+    client.application.config['EVENTS_MAX_STREAMS'] = 4
+    assert client.get('/sync/events?since=bogus').status_code == 400
@@ -0,0 +1,117 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+from datetime import datetime, timedelta
+import pytest
+from app import create_app
+from app.projects.models import TASK_FIELDS
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def test_tasks_page(client):
+    rv = client.post('/tasks/', json={'content': 'Standalone task'})
+    assert rv.status_code == 201
+    rv = client.get('/tasks/')
+    assert rv.status_code == 200
+    assert b'Standalone task' in rv.data
+
+def test_tasks_export_ndjson(client, tag):
+    client.post('/tasks/', json={'content': f'Exported task {tag}', 'priority': 1, 'due_date': '2030-01-02'})
+    rv = client.get('/tasks/export?format=ndjson')
+    assert rv.status_code == 200
+    tasks = [json.loads(line) for line in rv.data.decode().splitlines()]
+    exported = [task for task in tasks if task['content'] == f'Exported task {tag}']
+    assert set(exported[0]) == set(TASK_FIELDS)
+    assert exported[0]['status'] == 'open'
+    assert exported[0]['priority'] == 1
+    assert exported[0]['due_date'] == '2030-01-02'
+    assert exported[0]['rank']
+
+def _queue(client, prefix):
+    rv = client.get('/tasks/next?limit=1000')
+    assert rv.status_code == 200
+    return [task for task in rv.get_json() if task['content'].startswith(prefix)]
+
+def _names(tasks, prefix):
+    return [task['content'][len(prefix):] for task in tasks]
+
+def _add(client, content, **attributes):
+    assert client.post('/tasks/', json={'content': content, **attributes}).status_code == 201
+    return [task for task in client.get('/tasks/api?limit=1000').get_json() if task['content'] == content][-1]
+
+def test_next_actions_ordered_by_priority_then_rank(client, tag):
+    prefix = f'next {tag} '
+    _add(client, prefix + 'low', priority=3)
+    _add(client, prefix + 'urgent', priority=0)
+    _add(client, prefix + 'urgent later', priority=0)
+    _add(client, prefix + 'done', priority=0, status='done')
+    assert _names(_queue(client, prefix), prefix) == ['urgent', 'urgent later', 'low']
+
+    assert client.get('/tasks/next?limit=1&fields=id,priority').get_json()[0].keys() == {'id', 'priority'}
+    assert client.post('/tasks/', json={'content': 'bad', 'priority': 9}).status_code == 400
+    assert client.post('/tasks/', json={'content': 'bad', 'status': 'later'}).status_code == 400
+
+def test_move_task_rewrites_only_the_moved_task(client, tag):
+    prefix = f'move {tag} '
+    first = _add(client, prefix + 'a', priority=1)
+    _add(client, prefix + 'b', priority=1)
+    last = _add(client, prefix + 'c', priority=1)
+    urgent = _add(client, prefix + 'z', priority=0)
+
+    cursor = client.get('/sync').get_json()['cursor']
+    rv = client.post(f"/tasks/{last['id']}/move", json={'before': first['id']})
+    assert rv.status_code == 200
+    changed = client.get(f'/sync?since={cursor}&kind=task').get_json()['upserted']['task']
+    assert [task['id'] for task in changed] == [last['id']]
+    assert _names(_queue(client, prefix), prefix) == ['z', 'c', 'a', 'b']
+
+    client.post(f"/tasks/{first['id']}/move", json={'after': urgent['id']})
+    queue = _queue(client, prefix)
+    assert _names(queue, prefix) == ['z', 'a', 'c', 'b']
+    assert queue[1]['priority'] == 0
+
+    assert client.post(f"/tasks/{first['id']}/move", json={'after': first['id']}).status_code == 400
+    assert client.post(f"/tasks/{first['id']}/move", json={'after': last['id'], 'before': urgent['id']}).status_code == 400
+    assert client.put(f"/tasks/{first['id']}", json={'status': 'done'}).status_code == 200
+    assert 'a' not in _names(_queue(client, prefix), prefix)
+
+def test_tasks_organized_by_filter_tie_until_moved(client, tag):
+    prefix = f'tied {tag} '
+    client.post('/capture/bulk', json=[{'content': f'{prefix}{i}'} for i in range(3)])
+    since = (datetime.utcnow() - timedelta(seconds=5)).isoformat()
+    assert client.post('/capture/organized', json={'filter': {'created_from': since}}).status_code == 200
+    tied = _queue(client, prefix)
+    assert _names(tied, prefix) == ['0', '1', '2']
+    assert len({task['rank'] for task in tied}) == 1
+
+    client.post(f"/tasks/{tied[2]['id']}/move", json={'after': tied[0]['id']})
+    moved = _queue(client, prefix)
+    assert _names(moved, prefix) == ['0', '2', '1']
+    assert len({task['rank'] for task in moved}) == 3
+
+def test_bulk_delete_tasks_by_ids_and_filter(client, tag):
+    client.post('/projects/', json={'name': f'Bulk task delete {tag}'})
+    project_id = [p for p in client.get('/projects/api').get_json() if p['name'] == f'Bulk task delete {tag}'][-1]['id']
+    prefix = f'bulk delete {tag} '
+    by_ids = [_add(client, f'{prefix}id {i}')['id'] for i in range(2)]
+    for i in range(3):
+        _add(client, f'{prefix}filter {i}', project_id=project_id, status='done' if i else 'open')
+
+    rv = client.post('/tasks/delete', json={'ids': by_ids})
+    assert rv.status_code == 200 and rv.get_json() == {'deleted': 2}
+    rv = client.post('/tasks/delete', json={'filter': {'project_id': project_id, 'status': 'done'}})
+    assert rv.get_json() == {'deleted': 2}
+    left = [t['content'] for t in client.get('/tasks/export?format=json').get_json()
+            if t['content'].startswith(prefix)]
+    assert left == [f'{prefix}filter 0']
+
+    assert client.post('/tasks/delete', json={'filter': {}}).status_code == 400
+    assert client.post('/tasks/delete', json={'filter': {'status': 'gone'}}).status_code == 400
+    assert client.post('/tasks/delete', json={'ids': [1], 'filter': {'status': 'done'}}).status_code == 400
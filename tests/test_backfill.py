@@ -0,0 +1,35 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+def test_backfill_resumes_from_its_checkpoint():
+    import sqlalchemy as sa
+    from app.backfill import backfill, backfill_update, ensure_backfilled
+
+    metadata = sa.MetaData()
+    items = sa.Table('items', metadata, sa.Column('id', sa.Integer, primary_key=True), sa.Column('flag', sa.Boolean))
+    engine = sa.create_engine('sqlite://', poolclass=sa.pool.StaticPool)
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as bind:
+        metadata.create_all(bind)
+        bind.execute(items.insert(), [{'id': i} for i in range(1, 26)])
+        pending = items.c.flag.is_(None)
+        batches = []
+
+        def interrupted(bind, in_range):
+            if batches:
+                raise RuntimeError('deploy interrupted')
+            batches.append(in_range)
+            return bind.execute(items.update().where(in_range).values(flag=True)).rowcount
+
+        with pytest.raises(RuntimeError):
+            backfill('items.flag', items, interrupted, where=pending, batch_size=10, pause=0, bind=bind)
+        with pytest.raises(RuntimeError, match='15 rows'):
+            ensure_backfilled(items, pending, bind=bind)
+
+        options = {'where': pending, 'batch_size': 10, 'pause': 0, 'bind': bind}
+        assert backfill_update('items.flag', items, {'flag': True}, **options) == 15
+        assert backfill_update('items.flag', items, {'flag': False}, **options) == 0
+        ensure_backfilled(items, pending, bind=bind)
+        assert bind.execute(sa.select(sa.func.count()).where(items.c.flag)).scalar() == 25
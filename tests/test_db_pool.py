@@ -0,0 +1,26 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+def test_instrumented_pool_counts_waits_timeouts_and_holds(tmp_path):
+    import sqlalchemy as sa
+    from app.db_pool import InstrumentedQueuePool, pool_stats
+
+    engine = sa.create_engine(f'sqlite:///{tmp_path / "pool.db"}', poolclass=InstrumentedQueuePool,
+                              pool_size=1, max_overflow=0, pool_timeout=0.05)
+    with engine.connect() as connection:
+        connection.exec_driver_sql('SELECT 1')
+    stats = engine.pool.stats
+    # dispose() recreates the pool; the new one counts into the same stats, once.
+    engine.dispose()
+    assert engine.pool.stats is stats
+    with engine.connect():
+        with pytest.raises(sa.exc.TimeoutError):
+            engine.connect()
+
+    data = pool_stats(engine, {'max_overflow': 0})
+    assert (data['checkouts'], data['timeouts'], data['max_overflow']) == (2, 1, 0)
+    assert data['wait_ms_max'] >= 50
+    assert data['hold_ms_max'] >= 50
@@ -0,0 +1,26 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from app import create_app
+
+def test_sqlite_profile_pragmas():
+    from app import db
+    app = create_app()
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            pytest.skip('SQLite only')
+        with db.engine.connect() as connection:
+            pragma = lambda name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+            if app.config['SQLITE_PROFILE'] == 'concurrent':
+                assert pragma('busy_timeout') == 5000
+                assert pragma('synchronous') == 1  # NORMAL
+                if db.engine.url.database not in (None, '', ':memory:'):
+                    assert pragma('journal_mode') == 'wal'
+
+def test_sqlite_profile_rejects_unknown_names():
+    from app.db_sqlite import sqlite_pragmas
+    with pytest.raises(RuntimeError):
+        sqlite_pragmas('fastest')
+    assert sqlite_pragmas('concurrent', busy_timeout_ms=100)['busy_timeout'] == 100
@@ -0,0 +1,31 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import logging
+import queue
+
+def test_queued_exceptions_keep_their_own_key():
+    from app.logging_setup import JsonFormatter, StructuredQueueHandler
+
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger('tests.logging_setup')
+    logger.propagate = False
+    handler = StructuredQueueHandler(log_queue)
+    logger.addHandler(handler)
+    try:
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.exception('Division failed for %s', 'entry 7', extra={'entry_id': 7})
+    finally:
+        logger.removeHandler(handler)
+
+    record = log_queue.get_nowait()
+    assert record.exc_info is None
+    data = json.loads(JsonFormatter().format(record))
+    assert data['message'] == 'Division failed for entry 7'
+    assert data['entry_id'] == 7
+    assert data['exc_info'].startswith('Traceback') and 'ZeroDivisionError' in data['exc_info']
+    assert logging.Formatter().format(record) == 'Division failed for entry 7\n' + data['exc_info']
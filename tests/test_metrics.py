@@ -0,0 +1,69 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from app import create_app
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def test_metrics_endpoint(client):
+    client.get('/capture/', headers={'Accept': 'application/json'})
+    rv = client.get('/metrics')
+    assert rv.status_code == 200
+    assert rv.mimetype == 'text/plain'
+    body = rv.get_data(as_text=True)
+    assert '# TYPE app_request_duration_seconds histogram' in body
+    assert 'app_request_duration_seconds_bucket{endpoint="capture.get_capture_entries",method="GET",le="+Inf"}' in body
+    assert 'app_request_queries_count{endpoint="capture.get_capture_entries",method="GET"}' in body
+
+def test_statement_shape_collapses_in_lists():
+    from app.metrics import statement_shape
+    one = statement_shape('SELECT id FROM task\n WHERE id IN (?)')
+    many = statement_shape('SELECT id FROM task WHERE id IN (?, ?, ?)')
+    assert one == many == 'SELECT id FROM task WHERE id IN (?)'
+
+def test_repeated_statements_are_flagged():
+    from sqlalchemy import text
+    from app import db
+    from app.metrics import registry
+
+    app = create_app()
+    app.config.update(TESTING=True, SERVER_TIMING=True, METRICS_REPEATED_STATEMENT_THRESHOLD=2)
+
+    @app.route('/metrics-loop')
+    def loop():
+        for _ in range(3):
+            db.session.execute(text('SELECT 1')).scalar()
+        return 'ok'
+
+    with app.test_client() as client:
+        rv = client.get('/metrics-loop')
+    assert 'db;dur=' in rv.headers['Server-Timing']
+    assert registry.repeated[('loop', 'GET')] >= 1
+
+def test_failed_statements_are_not_left_pending():
+    from sqlalchemy import text
+    from sqlalchemy.exc import DBAPIError
+    from app import db
+
+    app = create_app()
+    app.config['TESTING'] = True
+
+    @app.route('/metrics-failing')
+    def failing():
+        info = db.session.connection().info
+        for _ in range(3):
+            with pytest.raises(DBAPIError):
+                db.session.execute(text('SELECT * FROM no_such_table'))
+            db.session.rollback()
+        db.session.execute(text('SELECT 1')).scalar()
+        return str(len(info.get('query_started', [])))
+
+    with app.test_client() as client:
+        assert client.get('/metrics-failing').data == b'0'